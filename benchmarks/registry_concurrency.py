@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput of registry fan-outs at high concurrency.
+
+A local registry answers every request after a fixed delay. Several
+clients (request threads of one worker) load the summaries of their own
+tags at once: "threads" uses the thread pool of the synchronous client,
+"async" the event loop of the asynchronous client (requires httpx).
+
+The concurrency of both clients is set by the max_concurrency and
+async_concurrency options (DRUI_REGISTRY_* environment variables).
+
+Usage: python benchmarks/registry_concurrency.py [--clients N]
+       [--tags N] [--delay SECONDS]
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter
+from time import sleep
+
+from drui.common.config import ConfigParser
+from drui.registry import Registry
+
+
+def digest(data: bytes) -> str:
+    return f'sha256:{sha256(data).hexdigest()}'
+
+
+class SlowRegistry(BaseHTTPRequestHandler):
+    """
+    Registry with a unique manifest and configuration of every tag.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 0.05
+
+    def do_GET(self) -> None:
+        sleep(self.delay)
+        name = self.path.rsplit('/', 1)[-1]
+        if '/blobs/' in self.path:
+            body = json.dumps({'created': name, 'os': 'linux',
+                               'architecture': 'amd64'}).encode()
+        else:
+            config = json.dumps({'created': name}).encode()
+            body = json.dumps({
+                'schemaVersion': 2,
+                'config': {'digest': digest(config)},
+                'layers': [{'size': len(name)}],
+            }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Docker-Content-Digest', digest(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def run(client, clients: int, tags: int) -> float:
+    """
+    Return the number of tag summaries per second.
+    """
+    def load(number: int) -> None:
+        names = [f'c{number}-{i}-{client.__class__.__name__}'
+                 for i in range(tags)]
+        for _, future in client.as_completed(client.summary, names, 'image'):
+            assert future.result()
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(load, range(clients)))
+    return clients * tags / (perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of concurrent page requests')
+    parser.add_argument('--tags', type=int, default=100,
+                        help='number of tags per page')
+    parser.add_argument('--delay', type=float, default=0.05,
+                        help='registry response time (seconds)')
+    args = parser.parse_args()
+
+    SlowRegistry.delay = args.delay
+    # listen backlog must not limit the concurrency of clients
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowRegistry)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DRUI_REGISTRY_ENDPOINT'] = \
+        f'http://127.0.0.1:{server.server_address[1]}'
+
+    registry = Registry(ConfigParser())
+    print(f'{args.clients} clients x {args.tags} tags,'
+          f' {args.delay * 1000:.0f} ms per registry request')
+    print(f'threads {run(registry, args.clients, args.tags):10.1f} tags/s')
+
+    try:
+        from drui.aio import AsyncRegistry
+        async_registry = AsyncRegistry(registry)
+    except RuntimeError as error:
+        print(f'async   skipped: {error}')
+        return
+    print(f'async   {run(async_registry, args.clients, args.tags):10.1f}'
+          f' tags/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request overhead of the application (no registry calls).
+
+"full" is a request through the WSGI stack (test client), "dispatch" is
+Flask dispatching only (request hooks, routing, view and error handlers).
+
+Usage: python benchmarks/request_overhead.py [-n REQUESTS]
+"""
+
+import argparse
+import os
+from time import perf_counter
+
+os.environ.setdefault('DRUI_REGISTRY_ENDPOINT', 'http://127.0.0.1:1')
+os.environ.setdefault('DRUI_COMPRESSION_ENABLED', 'false')
+
+from drui.app import init_app  # noqa: E402
+from drui.common.config import ConfigParser  # noqa: E402
+
+# URI -> expected status code
+CASES = {
+    '/logout': 302,
+    '/non-exist/page': 404,
+}
+
+
+def measure(func, n: int) -> float:
+    """
+    Return mean time of the function call (microseconds).
+    """
+    for _ in range(100):
+        func()
+
+    start = perf_counter()
+    for _ in range(n):
+        func()
+    return (perf_counter() - start) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=20000,
+                        help='number of requests per URI')
+    args = parser.parse_args()
+
+    app = init_app(ConfigParser())
+    client = app.test_client()
+
+    for uri, status_code in CASES.items():
+        def full():
+            assert client.get(uri).status_code == status_code
+
+        with app.test_request_context(uri):
+            dispatch = measure(app.full_dispatch_request, args.n)
+        print(f'{uri:20} full {measure(full, args.n):8.1f} us/request,'
+              f' dispatch {dispatch:8.1f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+import asyncio
+import os
+import typing as t
+from concurrent.futures import Future
+from contextvars import ContextVar
+from http.cookiejar import DefaultCookiePolicy
+from importlib.util import find_spec
+from threading import Lock
+from threading import Thread
+from weakref import WeakKeyDictionary
+
+from requests.structures import CaseInsensitiveDict
+from werkzeug.exceptions import default_exceptions
+
+from drui.common.logging import get_logger
+from drui.metrics import METRICS
+from drui.metrics import call_type
+from drui.metrics import header_size
+from drui.registry import CACHED_STATUSES
+from drui.registry import Blocking
+from drui.registry import Call
+from drui.registry import Operation
+from drui.registry import Prefetch
+from drui.registry import Registry
+from drui.registry import USER_AGENT
+from drui.registry import completed_in_window
+from drui.registry import get_image
+from drui.registry import get_summary
+from drui.registry import get_tags
+from drui.registry import prefetch
+from drui.tracing import TRACER
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+log = get_logger(__name__)
+
+T = t.TypeVar('T')
+
+# connection-specific headers (not allowed in HTTP/2)
+HOP_BY_HOP = ('Connection', 'Keep-Alive', 'Proxy-Connection', 'TE',
+              'Transfer-Encoding', 'Upgrade')
+
+# user headers, credentials and trace of the request that submitted
+# a coroutine
+_options: ContextVar[t.Optional[t.Dict[str, t.Any]]] = \
+    ContextVar('drui_registry_options', default=None)
+
+
+def check_status(resp: 'httpx.Response') -> None:
+    """
+    Check response status code and raise exception at error.
+    """
+    if resp.status_code in default_exceptions:
+        raise default_exceptions[resp.status_code](
+            description=resp.reason_phrase)
+    if resp.is_error:
+        resp.raise_for_status()
+
+
+class AsyncEngine:
+    """
+    Event loop of the worker process running in a background thread.
+
+    Request threads submit coroutines and wait for their futures, so the
+    registry I/O of all requests of the worker is multiplexed by one
+    thread instead of a thread per upstream call.
+    """
+
+    def __init__(self) -> None:
+        self._loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self._pid: t.Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Return event loop of the current process (started on first use).
+        """
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    Thread(target=loop.run_forever, name='drui-aio',
+                           daemon=True).start()
+                    self._loop = loop
+                    self._pid = os.getpid()
+        return self._loop
+
+    def submit(self, coro: t.Coroutine) -> Future:
+        """
+        Run coroutine in the event loop.
+
+        :param coro: coroutine
+        :return: future result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+class AsyncRegistry:
+    """
+    Asynchronous registry client (httpx, HTTP/2 if the registry supports it).
+
+    Shares configuration, caches and registry operations with the
+    synchronous client, only the I/O differs: requests are sent by httpx
+    and blocking cache reads run in threads. Methods are coroutines; sync
+    views run them in the engine with submit() and as_completed(), which
+    have the same signatures as in Registry.
+    Coroutines may also be awaited in other event loops (e.g. ASGI),
+    the HTTP client is created per event loop.
+    """
+
+    def __init__(self, registry: Registry) -> None:
+        """
+        :param registry: synchronous client
+        """
+        if httpx is None:
+            raise RuntimeError('Asynchronous registry client requires httpx:'
+                               ' pip install drui[async]')
+
+        conf = registry.conf
+        self.registry = registry
+        self.http2 = conf.getboolean('http2', 'registry', default=True) and \
+            find_spec('h2') is not None
+        self.concurrency = conf.getint('async_concurrency', 'registry',
+                                       default=16)
+        self.engine = AsyncEngine()
+        self._clients: 'WeakKeyDictionary[asyncio.AbstractEventLoop, ' \
+                       't.Tuple[httpx.AsyncClient, asyncio.Semaphore]]' = \
+            WeakKeyDictionary()
+        self._tasks: t.Set[asyncio.Task] = set()
+
+    def _client(self) -> t.Tuple['httpx.AsyncClient', asyncio.Semaphore]:
+        """
+        Return HTTP client and concurrency limit of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            registry = self.registry
+            connect_timeout, read_timeout = registry.timeout
+            transport = httpx.AsyncHTTPTransport(
+                http2=self.http2,
+                retries=registry.retries,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency
+                    if registry.keep_alive else 0),
+            )
+            http = httpx.AsyncClient(
+                base_url=registry.registry_endpoint,
+                headers={'User-Agent': USER_AGENT},
+                transport=transport,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+            # client is shared between users: never store registry cookies
+            http.cookies.jar.set_policy(
+                DefaultCookiePolicy(allowed_domains=[]))
+            client = self._clients[loop] = \
+                (http, asyncio.Semaphore(self.concurrency))
+        return client
+
+    def submit(self, func: t.Callable[..., t.Awaitable], *args: t.Any
+               ) -> Future:
+        """
+        Run coroutine function in the engine with user headers and
+        credentials of the current request.
+
+        :param func: coroutine function
+        :param args: function arguments
+        :return: future result
+        """
+        options = self.registry.request_options({})
+        options['trace'] = TRACER.current()
+
+        async def run() -> t.Any:
+            _options.set(options)
+            return await func(*args)
+
+        return self.engine.submit(run())
+
+    def as_completed(self, func: t.Callable[..., t.Awaitable],
+                     items: t.Iterable, *args: t.Any
+                     ) -> t.Iterator[t.Tuple[t.Any, Future]]:
+        """
+        Call func(*args, item) for each item concurrently and yield items
+        with their futures as soon as they are completed.
+
+        At most a half of the concurrency limit is used, so a large batch
+        never starves other requests.
+
+        :param func: coroutine function
+        :param items: function last argument values
+        :param args: function first arguments
+        :return: item, completed future
+        """
+        return completed_in_window(
+            lambda item: self.submit(func, *args, item), items,
+            max(self.concurrency // 2, 1))
+
+    async def request(self, method: str, uri: str,
+                      headers: t.Optional[t.Dict[str, str]] = None,
+                      **kwargs: t.Any) -> 'httpx.Response':
+        """
+        Send HTTP request and return result.
+
+        GET responses are cached as responses of the synchronous client
+        (see Registry.request).
+
+        :param method: HTTP method
+        :param uri: URI
+        :param headers: additional request headers
+        :param kwargs: additional request parameters (params)
+        :return: result of request
+        """
+        options = _options.get() or self.registry.request_options({})
+        request_headers = CaseInsensitiveDict(options['headers'])
+        request_headers.update(headers or {})
+        for name in HOP_BY_HOP:
+            request_headers.pop(name, None)
+
+        registry = self.registry
+        ttl = registry.response_ttl.get(call_type(method, uri)) \
+            if method == 'GET' else None
+        if not ttl:
+            if method not in ('GET', 'HEAD'):
+                registry.invalidate(uri)
+            return await self._request(method, uri, request_headers, options,
+                                       **kwargs)
+
+        key = registry.response_key(
+            method, uri, dict(kwargs, headers=request_headers,
+                              auth=options.get('auth')), client='httpx')
+        return await registry.responses.get_async(
+            key,
+            lambda: self._request(method, uri, request_headers, options,
+                                  **kwargs),
+            ttl, registry.stale_ttl,
+            size=lambda x: len(x.content) + 1024,
+            cacheable=lambda x: x.status_code in CACHED_STATUSES,
+        )
+
+    async def _request(self, method: str, uri: str,
+                       headers: CaseInsensitiveDict,
+                       options: t.Dict[str, t.Any],
+                       **kwargs: t.Any) -> 'httpx.Response':
+        """
+        Send HTTP request with the user credentials (see Registry._request).
+
+        :param method: HTTP method
+        :param uri: URI
+        :param headers: request headers
+        :param options: user credentials and trace of the request
+        :param kwargs: additional request parameters
+        :return: result of request
+        """
+        # Bearer tokens are cached, a token request runs in a thread
+        loop = asyncio.get_running_loop()
+        auth = options.get('auth')
+        trace = options.get('trace')
+        header = None
+        if auth and self.registry.token_auth:
+            header = await loop.run_in_executor(
+                None, self.registry.authorization, method, uri, auth)
+
+        http, semaphore = self._client()
+        async with semaphore:
+            resp = await self._send(http, method, uri, headers, header, auth,
+                                    trace, **kwargs)
+            if resp.status_code == 401 and auth:
+                header = await loop.run_in_executor(
+                    None, self.registry.authorization, method, uri, auth,
+                    resp.headers.get('Www-Authenticate', ''))
+                if header is not None:
+                    resp = await self._send(http, method, uri, headers,
+                                            header, auth, trace, **kwargs)
+        return resp
+
+    @staticmethod
+    async def _send(http: 'httpx.AsyncClient', method: str, uri: str,
+                    headers: CaseInsensitiveDict,
+                    authorization: t.Optional[str],
+                    auth: t.Optional[t.Tuple[str, str]],
+                    trace: t.Any = None,
+                    **kwargs: t.Any) -> 'httpx.Response':
+        """
+        Send HTTP request to registry (measured and traced if enabled).
+
+        :param http: HTTP client
+        :param method: HTTP method
+        :param uri: URI
+        :param headers: request headers
+        :param authorization: Authorization header with a Bearer token
+        :param auth: user credentials (if there is no token)
+        :param trace: trace of the user request
+        :param kwargs: additional request parameters
+        :return: result of request
+        """
+        headers = dict(headers)
+        if authorization is not None:
+            headers['Authorization'] = authorization
+            auth = None
+        auth = tuple(auth) if auth else None
+
+        if not METRICS.enabled and not TRACER.enabled:
+            return await http.request(method, uri, headers=headers,
+                                      auth=auth, **kwargs)
+
+        with METRICS.registry_call(method, uri) as call, \
+                TRACER.span(call_type(method, uri), 'client', trace,
+                            **{'http.request.method': method,
+                               'url.path': uri.split('?', 1)[0]}) as span:
+            resp = await http.request(method, uri, headers=headers,
+                                      auth=auth, **kwargs)
+            call.status = resp.status_code
+            call.header_bytes = header_size(resp.request.headers)
+            span.attributes['http.response.status_code'] = resp.status_code
+        return resp
+
+    async def run(self, operation: Operation[T]) -> T:
+        """
+        Run registry operation (see Registry.run) in the event loop.
+
+        :param operation: operation
+        :return: result of the operation
+        """
+        value, error = None, None
+        while True:
+            try:
+                effect = operation.send(value) if error is None \
+                    else operation.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = await self._perform(effect), None
+            except Exception as exc:
+                value, error = None, exc
+
+    async def _perform(self, effect: t.Union[Call, Blocking, Prefetch]
+                       ) -> t.Any:
+        """
+        Perform effect of an operation and return its result.
+
+        :param effect: registry request, blocking call or prefetch
+        :return: result
+        """
+        if isinstance(effect, Call):
+            resp = await self.request(effect.method, effect.uri,
+                                      headers=effect.headers,
+                                      params=effect.params)
+            if resp.status_code not in effect.allow:
+                check_status(resp)
+            return resp
+        if isinstance(effect, Prefetch):
+            for digest in effect.digests:
+                task = asyncio.ensure_future(
+                    self.run(prefetch(self.registry, effect.image, digest)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return None
+        return await asyncio.get_running_loop().run_in_executor(
+            None, effect.func, *effect.args)
+
+    async def tags(self, image: str) -> t.Optional[t.List[str]]:
+        """
+        Return sorted image tag list (all pages).
+
+        :param image: image name
+        :return: tags
+        """
+        return await self.run(get_tags(self.registry, image))
+
+    async def manifest(self, image: str, tag: str,
+                       digest: t.Optional[str] = None) -> t.Optional[t.Dict]:
+        """
+        Return image tag manifest (see Registry.manifest).
+
+        :param image: image name
+        :param tag: image tag
+        :param digest: platform manifest digest (for multi-arch images)
+        :return: manifest
+        """
+        return await self.run(get_image(self.registry, image, tag, digest))
+
+    async def summary(self, image: str, tag: str) -> t.Optional[t.Dict]:
+        """
+        Return short information about image tag (see Registry.summary).
+
+        :param image: image name
+        :param tag: image tag
+        :return: tag summary
+        """
+        return await self.run(get_summary(self.registry, image, tag))
@@ -1,5 +1,5 @@
-import os
 import typing as t
+from json import dumps
 from re import match
 from re import sub
 
@@ -10,19 +10,34 @@ from werkzeug.exceptions import Unauthorized
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from drui import __version__
+from drui.aio import AsyncRegistry
+from drui.broadcast import Broadcast
 from drui.common.config import ConfigParser
-from drui.common.logging import RequestFormatter
 from drui.common.logging import disable_wsgi_logging
 from drui.common.logging import get_logger
-from drui.common.utils import RequestParams
+from drui.common.logging import setup_logging
+from drui.common.utils import cache_headers
+from drui.common.utils import get_params
 from drui.common.utils import json_answer
+from drui.common.utils import make_etag
+from drui.common.utils import not_modified
 from drui.common.utils import to_json
+from drui.index import SORT_KEYS
+from drui.index import CatalogIndex
+from drui.metrics import METRICS
 from drui.middleware import check_response
+from drui.middleware.compress import MIMETYPES
+from drui.middleware.compress import Compress
+from drui.middleware.static import StaticFiles
 from drui.registry import Registry
+from drui.tracing import TRACER
 
 app = flask.Flask(__name__)
 log = get_logger(__name__)
 
+# maximum number of rows of a repository table window
+MAX_WINDOW = 1000
+
 
 def get_registry() -> Registry:
     """
@@ -31,6 +46,20 @@ def get_registry() -> Registry:
     return getattr(flask.current_app, 'registry')
 
 
+def get_async_registry() -> t.Optional[AsyncRegistry]:
+    """
+    Return AsyncRegistry instance (None if the async client is disabled).
+    """
+    return getattr(flask.current_app, 'async_registry')
+
+
+def get_index() -> CatalogIndex:
+    """
+    Return CatalogIndex instance.
+    """
+    return getattr(flask.current_app, 'index')
+
+
 def get_conf() -> ConfigParser:
     """
     Return ConfigParser instance.
@@ -38,18 +67,124 @@ def get_conf() -> ConfigParser:
     return getattr(flask.current_app, 'conf')
 
 
+def conditional(view: t.Callable[[], t.Any], *parts: t.Any) -> Response:
+    """
+    Return the view response, or "304 Not Modified" without calling the view
+    if the client already has it.
+
+    The ETag depends on the application version and configuration,
+    the request parameters, the user and the given parts of the data.
+
+    :param view: function that builds the response
+    :param parts: data of the response (digests, lists of names)
+    :return: response
+    """
+    auth = flask.session.get('auth')
+    etag = make_etag(getattr(flask.current_app, 'etag_salt'),
+                     get_conf().digest(),
+                     flask.request.path,
+                     get_params().params,
+                     to_json(),
+                     auth[0] if auth else None,
+                     *parts)
+    response = not_modified(etag) or flask.make_response(view())
+    return cache_headers(response, etag, private=auth is not None)
+
+
+def page_url(page: t.Optional[int]) -> t.Optional[str]:
+    """
+    Return URL of the specified page of the current view.
+
+    :param page: page number
+    :return: URL or None
+    """
+    if not page:
+        return None
+
+    params = get_params()
+    return flask.url_for(flask.request.endpoint,
+                         **(flask.request.view_args or {}),
+                         page=page,
+                         limit=params.get('limit'),
+                         q=params.get('q'),
+                         format=params.get('format'))
+
+
+def repositories_page(prefix: str = '') -> t.Union[Response, str]:
+    """
+    Return a page of the image list, filtered by repository name.
+
+    Page size is set by the "limit" parameter or "images_per_page" option,
+    the "q" parameter filters images by substring of the name.
+    Images are taken from the catalog index if it is available,
+    otherwise from the registry.
+
+    :param prefix: repository name
+    :return: image list
+    """
+    index = get_index()
+    params = get_params()
+    query = params.get('q')
+
+    # virtual table: the page has no image list, rows are loaded by
+    # the browser from /catalog (served from the index only, the paged
+    # table is shown while the index is not available)
+    if get_conf().getboolean('virtual_table', default=False) and \
+            not to_json() and index.available():
+        total = index.count(prefix)
+        return conditional(lambda: flask.render_template(
+            'repositories.html', repository=prefix, repositories=None,
+            total=total, page=1), total)
+
+    limit = params.getint('limit', default=get_conf().getint('images_per_page'))
+    page = max(params.getint('page', default=1), 1)
+
+    total = None
+    if index.available():
+        find = index.find
+        if not query:
+            total = index.count(prefix)
+    else:
+        find = get_registry().repositories
+
+    next_page = None
+    if not limit or limit < 1:
+        page = 1
+        repository_list = find(prefix, query)
+    else:
+        # request one extra repository to find out if the next page exists
+        repository_list = find(prefix, query, offset=(page - 1) * limit,
+                               limit=limit + 1)
+        if len(repository_list) > limit:
+            repository_list = repository_list[:limit]
+            next_page = page + 1
+
+    def render() -> t.Union[Response, str]:
+        if to_json():
+            response = json_answer(repository_list)
+            if next_page:
+                response.headers['Link'] = \
+                    f'<{page_url(next_page)}>; rel="next"'
+            if total is not None:
+                response.headers['X-Total-Count'] = str(total)
+            return response
+        return flask.render_template('repositories.html',
+                                     repository=prefix,
+                                     repositories=repository_list,
+                                     total=total,
+                                     page=page,
+                                     prev_page_url=page_url(page - 1),
+                                     next_page_url=page_url(next_page))
+
+    return conditional(render, repository_list, total, next_page)
+
+
 @app.route('/')
 def catalog() -> t.Union[Response, str]:
     """
     Return image list.
     """
-    registry = get_registry()
-    repository_list = registry.repositories()
-
-    if to_json():
-        return json_answer(repository_list)
-    return flask.render_template('repositories.html',
-                                 repositories=repository_list)
+    return repositories_page()
 
 
 @app.route('/r/<path:name>')
@@ -60,15 +195,69 @@ def repository(name) -> t.Union[Response, str]:
     :param name: repository name
     :return: image list
     """
-    registry = get_registry()
-    rl = registry.repositories()
-    repository_list = list(filter(lambda x: x.startswith(name), rl))
+    return repositories_page(name)
 
-    if to_json():
-        return json_answer(repository_list)
-    return flask.render_template('repositories.html',
-                                 repository=name,
-                                 repositories=repository_list)
+
+@app.route('/catalog')
+def catalog_window() -> Response:
+    """
+    Return a window of the repository table: the number of matching
+    repositories and repository names from "offset" (at most "limit").
+
+    Repositories are filtered by the "repository" name prefix and the "q"
+    substring, and ordered by "sort" (name or application, "-" prefix for
+    descending order). Windows are served from the catalog index only
+    (503 if it is not available), the whole catalog is never read per
+    window.
+    """
+    params = get_params()
+    prefix = params.get('repository') or ''
+    query = params.get('q')
+    sort = params.get('sort') or 'name'
+    offset = max(params.getint('offset', default=0), 0)
+    limit = min(max(params.getint('limit', default=100), 1), MAX_WINDOW)
+
+    if sort.lstrip('-') not in SORT_KEYS:
+        flask.abort(400, f'Invalid sort: {sort}')
+
+    index = get_index()
+    if not index.available():
+        flask.abort(503, 'Catalog index is not available')
+    total, names = index.window(prefix, query, sort, offset, limit)
+
+    return conditional(lambda: json_answer({
+        'total': total,
+        'offset': offset,
+        'repositories': names,
+    }), total, names)
+
+
+def tags_window(tags: t.List[str], limit: t.Optional[int],
+                cursor: t.Optional[str] = None
+                ) -> t.Tuple[t.List[str], t.Optional[str]]:
+    """
+    Return a window of the newest tags.
+
+    Windows go from the newest tags to the oldest ones, the cursor is
+    the oldest tag of the previous window.
+
+    :param tags: sorted tags (oldest first)
+    :param limit: window size (all tags if not set)
+    :param cursor: cursor of the window
+    :return: tags of the window and cursor of the next window
+    """
+    end = len(tags)
+    if cursor:
+        try:
+            end = tags.index(cursor)
+        except ValueError:
+            flask.abort(400, f'Invalid cursor: {cursor}')
+
+    if not limit or limit < 1:
+        return tags[:end], None
+
+    start = max(end - limit, 0)
+    return tags[start:end], tags[start] if start > 0 else None
 
 
 @app.route('/_/<path:image>')
@@ -84,7 +273,10 @@ def image_ref(image: str) -> t.Union[Response, str]:
         return flask.render_template('empty.html', image=image)
     tag = 'latest' if (not tags or 'latest' in tags) else tags[-1]
 
-    return flask.redirect(f'/_/{image}/tags/{tag}')
+    # keep the tags window of the tag page
+    limit = get_params().getint('limit')
+    query = f'?limit={limit}' if limit else ''
+    return flask.redirect(f'/_/{image}/tags/{tag}{query}')
 
 
 @app.route('/_/<path:image>/tags/<tag>')
@@ -97,25 +289,90 @@ def image_tag(image: str, tag: str) -> t.Union[Response, str]:
     :return: information about image tag
     """
     registry = getattr(flask.current_app, 'registry')
-    endpoint = registry.conf.get('endpoint', 'registry')
-    pull_endpoint = registry.conf.get('pull_endpoint', 'registry',
-                                      default=endpoint)
-
-    # get image manifest
-    manifest = registry.manifest(image, tag)
+    params = get_params()
+    limit = params.getint('limit',
+                          default=get_conf().getint('tags_per_page'))
+
+    # get image tags and manifest concurrently
+    async_registry = get_async_registry()
+    if async_registry:
+        tags_future = async_registry.submit(async_registry.tags, image)
+        manifest = async_registry.submit(async_registry.manifest, image, tag,
+                                         params.get('digest')).result()
+    else:
+        tags_future = registry.submit(registry.tags, image)
+        manifest = registry.manifest(image, tag, digest=params.get('digest'))
+    tags = tags_future.result()
     if not manifest:
         return flask.render_template('empty.html', image=image)
 
-    # get image tags
-    tags = registry.tags(image)
+    tags, next_cursor = tags_window(tags or [], limit, params.get('cursor'))
 
-    if to_json():
-        return json_answer({'tags': tags, 'manifest': manifest})
-    return flask.render_template('image.html',
-                                 image=image,
-                                 tags=tags,
-                                 tag=tag,
-                                 manifest=manifest)
+    def render() -> t.Union[Response, str]:
+        if to_json():
+            return json_answer({'tags': tags, 'next': next_cursor,
+                                'manifest': manifest})
+        return flask.render_template('image.html',
+                                     image=image,
+                                     tags=tags,
+                                     next_cursor=next_cursor,
+                                     tag=tag,
+                                     manifest=manifest)
+
+    # manifest and config digests identify the image content
+    digests = [manifest.get('digest'), manifest.get('id')] + \
+        [x.get('digest') for x in manifest.get('manifests') or []]
+    return conditional(render, digests, tags, next_cursor)
+
+
+@app.route('/_/<path:image>/tags')
+def image_tags(image: str) -> Response:
+    """
+    Return a window of image tags.
+
+    The "limit" parameter sets the window size, the "cursor" parameter
+    selects the window (the "next" value of the previous answer).
+
+    :param image: image name
+    :return: tags and cursor of the next window
+    """
+    params = get_params()
+    limit = params.getint('limit',
+                          default=get_conf().getint('tags_per_page'))
+
+    tags = get_registry().tags(image)
+    if tags is None:
+        return json_answer(f'{image} not found', status_code=404)
+
+    tags, next_cursor = tags_window(tags, limit, params.get('cursor'))
+    return json_answer({'tags': tags, 'next': next_cursor})
+
+
+@app.route('/_/<path:image>/summary', methods=['GET', 'POST'])
+def image_summary(image: str) -> Response:
+    """
+    Return short information about image tags as NDJSON.
+
+    Tags are resolved concurrently, each line is sent as soon as
+    the tag is resolved (the order of lines is not preserved).
+
+    :param image: image name
+    :return: stream of tag summaries
+    """
+    # both clients have the same interface
+    registry = get_async_registry() or get_registry()
+    tags = get_params().getlist('tags')
+
+    def generate() -> t.Iterator[str]:
+        for tag, future in registry.as_completed(registry.summary, tags, image):
+            try:
+                result = future.result() or {'tag': tag, 'error': 'not found'}
+            except Exception as error:
+                result = {'tag': tag, 'error': str(error)}
+            yield dumps(result) + '\n'
+
+    return flask.Response(flask.stream_with_context(generate()),
+                          mimetype='application/x-ndjson')
 
 
 @app.route('/_/<path:image>/tags/<tag>', methods=['DELETE'])
@@ -138,6 +395,39 @@ def image_tag_delete(image: str, tag: str) -> Response:
     return json_answer(f'{image}:{tag} successfully deleted')
 
 
+@app.route('/_/<path:image>/tags', methods=['DELETE'])
+def image_tags_delete(image: str) -> Response:
+    """
+    Delete many image tags.
+
+    Tags are selected by the "tags" list and/or filtered by the "pattern"
+    (shell-style pattern of tag names) and "older_than" (days) parameters.
+    With "dry_run" tags are resolved, but not deleted.
+
+    :param image: image name
+    :return: report: tag -> digest, status, error
+    """
+    conf = get_conf()
+    if conf.getboolean('disable_delete'):
+        flask.abort(405)
+
+    registry = get_registry()
+    params = get_params()
+
+    tags = params.getlist('tags')
+    pattern = params.get('pattern')
+    older_than = params.getint('older_than')
+    if not tags and not pattern and older_than is None:
+        return json_answer('Tags not selected.', status_code=400)
+    # a negative age would select every tag of the image
+    if older_than is not None and older_than < 0:
+        return json_answer('Invalid older_than.', status_code=400)
+
+    tags = registry.select_tags(image, tags, pattern, older_than)
+    dry_run = str(params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    return json_answer(registry.delete_many(image, tags, dry_run=dry_run))
+
+
 def error_page(error: HTTPException) -> t.Union[Response, t.Tuple[str, int]]:
     """
     Error page.
@@ -160,7 +450,7 @@ def login() -> t.Union[Response, t.Tuple[str, int]]:
     """
     User authorization.
     """
-    params = RequestParams()
+    params = get_params()
     username = params.get('username')
     password = params.get('password')
     if not username or not password:
@@ -184,21 +474,25 @@ def logout() -> flask.Response:
 @app.route('/broadcast')
 def get_broadcast() -> t.Union[Response, str]:
     """
-    Return broadcast message.
+    Return broadcast message (Markdown and pre-rendered HTML).
     """
     conf = get_conf()
     path = conf.get('path', 'broadcast')
 
-    if not path or not os.path.exists(path):
-        return flask.make_response('Broadcast file not found.', 404)
-
     try:
-        with open(path, 'r') as f:
-            broadcast = f.read()
-        return json_answer(broadcast)
+        message = getattr(flask.current_app, 'broadcast').get(path) \
+            if path else None
     except Exception as error:
         return json_answer(str(error), status_code=500)
 
+    if message is None:
+        return flask.make_response('Broadcast file not found.', 404)
+
+    response = flask.Response(message.body, mimetype='application/json')
+    response.last_modified = message.modified
+    cache_headers(response, message.etag)
+    return response.make_conditional(flask.request)
+
 
 @app.template_global('get_repository')
 def get_repository(image: str) -> t.Optional[str]:
@@ -235,6 +529,105 @@ def get_endpoint():
     return sub(r'^http[s]?://', '', endpoint)
 
 
+@app.route('/metrics')
+def metrics() -> Response:
+    """
+    Return metrics of all worker processes in Prometheus text format.
+    """
+    if not METRICS.enabled:
+        flask.abort(404)
+    return Response(METRICS.collect(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app.before_request
+def metrics_before_request() -> None:
+    """
+    Count request in progress.
+    """
+    if METRICS.enabled:
+        flask.request.environ['drui.metrics.start'] = \
+            METRICS.request_started()
+
+
+@app.after_request
+def metrics_after_request(response: flask.Response) -> flask.Response:
+    """
+    Count finished request (when the response is sent).
+
+    :param response: HTTP response
+    :return: HTTP response
+    """
+    start = flask.request.environ.get('drui.metrics.start')
+    if start is None:
+        return response
+
+    rule = flask.request.url_rule
+    route = rule.rule if rule else '<unmatched>'
+    method = flask.request.method
+    response.call_on_close(lambda: METRICS.request_finished(
+        route, method, response.status_code, start))
+    return response
+
+
+@app.before_request
+def tracing_before_request() -> None:
+    """
+    Start trace of the request.
+    """
+    if TRACER.enabled:
+        TRACER.start()
+
+
+@flask.before_render_template.connect_via(app)
+def tracing_render_started(sender: flask.Flask, template: t.Any,
+                           context: t.Dict[str, t.Any], **extra) -> None:
+    """
+    Start span of template rendering.
+    """
+    if TRACER.enabled and flask.has_request_context():
+        flask.request.environ['drui.trace.render'] = TRACER.start_span(
+            'render', template=template.name)
+
+
+@flask.template_rendered.connect_via(app)
+def tracing_render_finished(sender: flask.Flask, template: t.Any,
+                            context: t.Dict[str, t.Any], **extra) -> None:
+    """
+    Finish span of template rendering.
+    """
+    if TRACER.enabled and flask.has_request_context():
+        span = flask.request.environ.pop('drui.trace.render', None)
+        if span is not None:
+            span.finish()
+
+
+@app.after_request
+def tracing_after_request(response: flask.Response) -> flask.Response:
+    """
+    Finish trace of the request: add the Server-Timing header, return
+    the trace instead of the answer (debug) and export it.
+
+    :param response: HTTP response
+    :return: HTTP response
+    """
+    trace = TRACER.current()
+    if trace is None:
+        return response
+
+    trace.root.attributes['http.response.status_code'] = response.status_code
+    trace.root.error = response.status_code >= 500
+    trace.root.finish()
+
+    if TRACER.debug and 'trace' in get_params():
+        response = json_answer(trace.to_dict())
+    if TRACER.server_timing:
+        response.headers['Server-Timing'] = trace.server_timing()
+    if TRACER.path:
+        response.call_on_close(lambda: TRACER.export(trace))
+    return response
+
+
 @app.after_request
 def log_after_request(response: flask.Response) -> flask.Response:
     """
@@ -277,6 +670,35 @@ def app_version() -> str:
     return __version__
 
 
+def static_url_defaults(static_files: StaticFiles) -> t.Callable:
+    """
+    Return URL defaults function: url_for('static') returns
+    fingerprinted file names.
+
+    :param static_files: fingerprinted static files
+    """
+
+    def url_defaults(endpoint: str, values: t.Dict[str, t.Any]) -> None:
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = static_files.url(values['filename'])
+
+    return url_defaults
+
+
+def reload_config() -> None:
+    """
+    Read the configuration files again and replace the settings.
+
+    The settings are swapped atomically. Options read by requests
+    (page sizes, templates, ETags) take effect at once, options of
+    components created by init_app() take effect after a restart.
+    """
+    parser = getattr(app, 'config_parser')
+    parser.reload()
+    setattr(app, 'conf', parser.snapshot())
+    log.info('Configuration reloaded')
+
+
 def init_app(conf: ConfigParser) -> flask.Flask:
     """
     Prepare Flask app for running.
@@ -284,16 +706,37 @@ def init_app(conf: ConfigParser) -> flask.Flask:
     :param conf: instance of configuration file
     :return: instance of Flask app
     """
+    # options are read from an immutable snapshot, the parser is kept
+    # for reload_config()
+    setattr(app, 'config_parser', conf)
+    conf = conf.snapshot()
+
     setattr(app, 'conf', conf)
     setattr(app, 'registry', Registry(conf))
+    setattr(app, 'async_registry',
+            AsyncRegistry(app.registry)
+            if conf.getboolean('async', 'registry', default=False) else None)
+    setattr(app, 'index', CatalogIndex(app.registry, conf))
+    if conf.getboolean('virtual_table', default=False) and \
+            not app.index.enabled:
+        log.warning('virtual_table requires the catalog index'
+                    ' ([index] enabled), the paged image list is shown')
+    setattr(app, 'broadcast', Broadcast())
     app.secret_key = conf.get('secret_key', default='secret_key')
 
-    # error codes registration
-    for code in [400, 401, 403, 404, 405, 500, 503]:
-        app.register_error_handler(code, error_page)
+    # metrics of requests and caches
+    METRICS.configure(conf)
+    METRICS.register_cache('content', app.registry.cache)
+    METRICS.register_cache('tag_digests', app.registry.tag_digests)
+    METRICS.register_cache('sorted_tags', app.registry.sorted_tags)
+    METRICS.register_cache('responses', app.registry.responses)
+    METRICS.register_cache('tokens', app.registry.tokens)
+
+    # request spans (Server-Timing header, trace export)
+    TRACER.configure(conf)
 
-    # middlewares registration
-    app.before_request_funcs = {None: [check_response.middleware]}
+    # error handlers registration
+    check_response.init_app(app, fallback=error_page)
 
     # add drui version to template
     app.add_template_global(app_version, 'app_version')
@@ -304,12 +747,41 @@ def init_app(conf: ConfigParser) -> flask.Flask:
     # disable Flask logging
     disable_wsgi_logging(app)
 
-    # set logging format
-    log_format = conf.get('format', section='logging')
-    if log_format:
-        for handler in log.handlers:
-            formatter = RequestFormatter(log_format)
-            handler.setFormatter(formatter)
+    # set logging format and output
+    setup_logging(conf)
+
+    # compress HTML and JSON responses
+    if conf.getboolean('enabled', 'compression', default=True):
+        app.wsgi_app = Compress(
+            app.wsgi_app,
+            level=conf.getint('level', 'compression', default=6),
+            brotli_quality=conf.getint('brotli_quality', 'compression',
+                                       default=4),
+            min_size=conf.getint('min_size', 'compression', default=1024),
+            mimetypes=conf.getlist('mimetypes', 'compression',
+                                   default=MIMETYPES),
+            use_brotli=conf.getboolean('brotli', 'compression',
+                                       default=True),
+            cache_size=conf.getint('cache_size', 'compression',
+                                   default=16 * 1024 * 1024),
+        )
+
+    # serve fingerprinted static files with far-future cache headers
+    static_names = None
+    if conf.getboolean('fingerprint', 'static', default=True):
+        static_files = StaticFiles(
+            app.wsgi_app,
+            app.static_folder,
+            prefix=f'{app.static_url_path}/',
+            max_age=conf.getint('max_age', 'static', default=31536000),
+        )
+        app.wsgi_app = static_files
+        app.url_defaults(static_url_defaults(static_files))
+        static_names = static_files.names
+
+    # ETags of pages change with the version and static file names
+    # (and the configuration, see conditional())
+    setattr(app, 'etag_salt', make_etag(__version__, static_names))
 
     # add ProxyFix module for reverse proxy support
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1,
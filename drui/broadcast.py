@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import os
+import typing as t
+from datetime import datetime
+from datetime import timezone
+from json import dumps
+from threading import Lock
+
+from drui.common.utils import make_etag
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+# Markdown extensions of the server-side renderer
+EXTENSIONS = ('tables', 'fenced_code', 'sane_lists')
+
+
+class Message(t.NamedTuple):
+    """
+    Broadcast message ready to be sent.
+    """
+    text: str
+    html: t.Optional[str]
+    etag: str
+    modified: datetime
+    body: bytes
+
+
+def render(text: str) -> t.Optional[str]:
+    """
+    Return HTML of the Markdown text, or None if the optional markdown
+    package is not installed (the browser renders the message then).
+
+    :param text: Markdown text
+    :return: HTML
+    """
+    if markdown is None:
+        return None
+    return markdown.markdown(text, extensions=list(EXTENSIONS))
+
+
+class Broadcast:
+    """
+    Broadcast message file cached in memory.
+
+    The file is checked with one stat() per request; it is read and
+    rendered again only when its inode, modification time or size change
+    (the file is edited in place or replaced).
+    """
+
+    def __init__(self) -> None:
+        self._key: t.Optional[t.Tuple] = None
+        self._message: t.Optional[Message] = None
+        self._lock = Lock()
+
+    def get(self, path: str) -> t.Optional[Message]:
+        """
+        Return the current message of the file.
+
+        :param path: path to the message file
+        :return: message or None if the file does not exist
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._message = self._load(path, stat.st_mtime)
+                    self._key = key
+        return self._message
+
+    @staticmethod
+    def _load(path: str, mtime: float) -> Message:
+        """
+        Read and render the message file.
+
+        :param path: path to the message file
+        :param mtime: modification time of the file
+        :return: message
+        """
+        with open(path, 'r') as f:
+            text = f.read()
+        html = render(text)
+        return Message(
+            text=text,
+            html=html,
+            etag=make_etag(text, html),
+            modified=datetime.fromtimestamp(int(mtime), timezone.utc),
+            body=dumps({'markdown': text, 'html': html}).encode('utf-8'),
+        )
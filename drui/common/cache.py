@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import Future
+from hashlib import sha256
+from tempfile import mkstemp
+from threading import Lock
+from time import monotonic
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache bounded by the total size of its values.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        :param max_size: maximum total size of values (bytes by default)
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: 'OrderedDict[t.Hashable, t.Tuple[t.Any, int]]' = \
+            OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        """
+        Return the value by key or default.
+
+        :param key: key
+        :param default: default value if key does not exist
+        :return: value or default
+        """
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: t.Hashable, value: t.Any,
+            size: t.Optional[int] = None) -> None:
+        """
+        Save the value, evicting the least recently used values if needed.
+
+        :param key: key
+        :param value: value
+        :param size: value size (default: len(value))
+        """
+        size = len(value) if size is None else size
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old:
+                self.size -= old[1]
+
+            self._data[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: t.Hashable) -> None:
+        """
+        Delete the value by key.
+
+        :param key: key
+        """
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old:
+                self.size -= old[1]
+
+    def delete_matching(self, match: t.Callable[[t.Hashable], bool]) -> int:
+        """
+        Delete the values of matching keys.
+
+        :param match: function that checks a key
+        :return: number of deleted values
+        """
+        with self._lock:
+            keys = [key for key in self._data if match(key)]
+            for key in keys:
+                _, size = self._data.pop(key)
+                self.size -= size
+        return len(keys)
+
+    def clear(self) -> None:
+        """
+        Delete all values.
+        """
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Return cache counters.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': self.size,
+            'items': len(self._data),
+        }
+
+
+class DiskCache:
+    """
+    File system cache, may be shared between processes.
+
+    Values are written to a temporary file and atomically renamed,
+    so readers never see a partially written value.
+
+    The size is bounded approximately: after each tenth of max_size written
+    by the process, the directory is scanned and the least recently used
+    values (by modification time, updated on reads) are removed until the
+    total size fits. Other processes may write meanwhile, so the directory
+    may exceed the limit by the values written since their last scan.
+    """
+
+    def __init__(self, path: str, max_size: int = 0) -> None:
+        """
+        :param path: cache directory
+        :param max_size: maximum total size of values (bytes, 0 - no limit)
+        """
+        self.path = path
+        self.max_size = max_size
+        self.evictions = 0
+        # bytes written since the last scan (scanned on the first write)
+        self._written = max_size
+        self._lock = Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        name = sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, name[:2], name)
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        """
+        Return the value by key or None.
+
+        :param key: key
+        :return: value
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except OSError:
+            return None
+        if self.max_size:
+            # mark as recently used (access time is not reliable: noatime)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Save the value.
+
+        :param key: key
+        :param value: value
+        """
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        if self.max_size:
+            with self._lock:
+                self._written += len(value)
+                if self._written < self.max_size // 10:
+                    return
+                self._written = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used values until the total size
+        of the directory does not exceed max_size.
+
+        :return: number of removed values
+        """
+        files = []
+        size = 0
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                # skip temporary files of values being written
+                if len(entry.name) != 64:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                size += stat.st_size
+
+        removed = 0
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+
+class ContentCache:
+    """
+    Two-tier cache of immutable content addressed by digest.
+
+    The first tier is a per-process LRU cache, the optional second tier is
+    a directory shared between all worker processes.
+    """
+
+    def __init__(self, max_size: int, path: t.Optional[str] = None,
+                 disk_size: int = 0) -> None:
+        """
+        :param max_size: maximum size of in-memory cache (bytes)
+        :param path: directory of on-disk cache
+        :param disk_size: maximum size of on-disk cache (bytes, 0 - no limit)
+        """
+        self.memory = LRUCache(max_size)
+        self.disk = DiskCache(path, disk_size) if path else None
+        self.disk_hits = 0
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        """
+        Return the content by key or None.
+
+        :param key: key
+        :return: content
+        """
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = self.read_disk(key)
+        return value
+
+    def read_disk(self, key: str) -> t.Optional[bytes]:
+        """
+        Return the content from the on-disk cache (also saved in memory),
+        or None.
+
+        :param key: key
+        :return: content
+        """
+        value = self.disk.get(key) if self.disk else None
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Save the content.
+
+        :param key: key
+        :param value: content
+        """
+        self.memory.set(key, value)
+        if self.disk:
+            self.disk.set(key, value)
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Return cache counters.
+        """
+        stats = self.memory.stats()
+        stats['hits'] += self.disk_hits
+        stats['misses'] -= self.disk_hits
+        stats['disk_hits'] = self.disk_hits
+        return stats
+
+
+class ResponseCache:
+    """
+    Per-process cache of mutable responses with stale-while-revalidate
+    semantics and coalescing of concurrent loads.
+
+    Fresh values are returned as is; stale values (up to "stale" seconds
+    after expiration) are returned immediately and refreshed in background;
+    concurrent loads of the same key wait for a single load.
+    """
+
+    def __init__(self, max_size: int,
+                 submit: t.Callable[[t.Callable], t.Any],
+                 on_error: t.Optional[t.Callable[[Exception], None]] = None
+                 ) -> None:
+        """
+        :param max_size: maximum total size of values
+        :param submit: function that runs a background refresh
+        :param on_error: callback of failed background refreshes
+        """
+        self.memory = LRUCache(max_size)
+        self.submit = submit
+        self.on_error = on_error
+        self.stale_hits = 0
+        self.coalesced = 0
+        self._loading: t.Dict[t.Hashable, t.Tuple[Future, bool]] = {}
+        self._tasks: t.Set[asyncio.Task] = set()
+        self._lock = Lock()
+
+    def get(self, key: t.Hashable, load: t.Callable[[], t.Any],
+            ttl: t.Union[float, t.Callable[[t.Any], float]],
+            stale: float = 0,
+            size: t.Callable[[t.Any], int] = len,
+            cacheable: t.Callable[[t.Any], bool] = lambda x: True) -> t.Any:
+        """
+        Return the value by key, loading it if needed.
+
+        :param key: key
+        :param load: function that returns a new value
+        :param ttl: lifetime of a value (seconds) or function of the value
+            that returns it
+        :param stale: time a value is served stale after expiration (seconds)
+        :param size: function that returns the size of a value
+        :param cacheable: function that checks if a value may be saved
+        :return: value
+        """
+        entry = self._lookup(key, stale)
+        if entry is not None:
+            value, expired = entry
+            if expired:
+                self._load(key, load, ttl, size, cacheable, background=True)
+            return value
+        return self._load(key, load, ttl, size, cacheable).result()
+
+    async def get_async(self, key: t.Hashable,
+                        load: t.Callable[[], t.Awaitable],
+                        ttl: t.Union[float, t.Callable[[t.Any], float]],
+                        stale: float = 0,
+                        size: t.Callable[[t.Any], int] = len,
+                        cacheable: t.Callable[[t.Any], bool] = lambda x: True
+                        ) -> t.Any:
+        """
+        Return the value by key, loading it with a coroutine if needed
+        (see get()). Loads are coalesced with loads of other threads.
+
+        :param key: key
+        :param load: coroutine function that returns a new value
+        :param ttl: lifetime of a value (seconds) or function of the value
+            that returns it
+        :param stale: time a value is served stale after expiration (seconds)
+        :param size: function that returns the size of a value
+        :param cacheable: function that checks if a value may be saved
+        :return: value
+        """
+        entry = self._lookup(key, stale)
+        if entry is not None:
+            value, expired = entry
+            if expired:
+                self._load_async(key, load, ttl, size, cacheable,
+                                 background=True)
+            return value
+        future = self._load_async(key, load, ttl, size, cacheable)
+        return await asyncio.wrap_future(future)
+
+    def _lookup(self, key: t.Hashable,
+                stale: float) -> t.Optional[t.Tuple[t.Any, bool]]:
+        """
+        Return the saved value and True if it must be refreshed, or None
+        if the value must be loaded.
+        """
+        entry = self.memory.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        now = monotonic()
+        if now < expires:
+            return value, False
+        if now < expires + stale:
+            self.stale_hits += 1
+            return value, True
+        return None
+
+    def _join(self, key: t.Hashable,
+              background: bool) -> t.Tuple[Future, bool]:
+        """
+        Return the future of a running load of the value and False, or
+        the future of a new load and True.
+        """
+        with self._lock:
+            future, queued = self._loading.get(key, (None, False))
+            # a background refresh that has not started yet is taken over,
+            # so a request never waits for a free thread of the pool
+            if future is not None and not (queued and not background and
+                                           future.cancel()):
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._loading[key] = (future, background)
+            return future, True
+
+    def _save(self, key: t.Hashable, future: Future, value: t.Any,
+              ttl: t.Union[float, t.Callable[[t.Any], float]],
+              size: t.Callable[[t.Any], int],
+              cacheable: t.Callable[[t.Any], bool]) -> None:
+        """
+        Save the loaded value and set the result of its load.
+        """
+        if cacheable(value):
+            lifetime = ttl(value) if callable(ttl) else ttl
+            self.memory.set(key, (value, monotonic() + lifetime),
+                            size=size(value))
+        future.set_result(value)
+
+    def _done(self, key: t.Hashable, future: Future) -> None:
+        """
+        Forget the finished load.
+        """
+        with self._lock:
+            if self._loading.get(key, (None,))[0] is future:
+                del self._loading[key]
+
+    def _load(self, key: t.Hashable, load: t.Callable[[], t.Any],
+              ttl: t.Union[float, t.Callable[[t.Any], float]],
+              size: t.Callable[[t.Any], int],
+              cacheable: t.Callable[[t.Any], bool],
+              background: bool = False) -> Future:
+        """
+        Start or join the load of a value.
+        """
+        future, new = self._join(key, background)
+        if not new:
+            return future
+
+        def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                self._save(key, future, load(), ttl, size, cacheable)
+            except Exception as error:
+                future.set_exception(error)
+                if background and self.on_error:
+                    self.on_error(error)
+            finally:
+                self._done(key, future)
+
+        if background:
+            self.submit(run)
+        else:
+            run()
+        return future
+
+    def _load_async(self, key: t.Hashable, load: t.Callable[[], t.Awaitable],
+                    ttl: t.Union[float, t.Callable[[t.Any], float]],
+                    size: t.Callable[[t.Any], int],
+                    cacheable: t.Callable[[t.Any], bool],
+                    background: bool = False) -> Future:
+        """
+        Start or join the load of a value by a coroutine (a task of the
+        running event loop).
+        """
+        future, new = self._join(key, background)
+        if not new:
+            return future
+
+        async def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                self._save(key, future, await load(), ttl, size, cacheable)
+            except Exception as error:
+                future.set_exception(error)
+                if background and self.on_error:
+                    self.on_error(error)
+            except BaseException as error:
+                # cancelled: other waiters of the load must not hang
+                future.set_exception(error)
+                raise
+            finally:
+                self._done(key, future)
+
+        task = asyncio.ensure_future(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return future
+
+    def delete(self, key: t.Hashable) -> None:
+        """
+        Delete the value by key.
+
+        :param key: key
+        """
+        self.memory.delete(key)
+
+    def delete_matching(self, match: t.Callable[[t.Hashable], bool]) -> int:
+        """
+        Delete the values of matching keys.
+
+        :param match: function that checks a key
+        :return: number of deleted values
+        """
+        return self.memory.delete_matching(match)
+
+    def clear(self) -> None:
+        """
+        Delete all values.
+        """
+        self.memory.clear()
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Return cache counters.
+        """
+        stats = self.memory.stats()
+        stats['stale_hits'] = self.stale_hits
+        stats['coalesced'] = self.coalesced
+        return stats
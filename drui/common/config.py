@@ -6,28 +6,34 @@ from configparser import DEFAULTSECT
 from configparser import NoOptionError
 from configparser import NoSectionError
 from functools import wraps
+from hashlib import sha256
 from os import PathLike
 from os import environ
+from types import MappingProxyType
 
+# marker of missing or invalid option values
+_MISSING = object()
 
-def get_env(func: t.Callable) -> t.Callable:
+
+def env_key(option: str, section: str = DEFAULTSECT) -> str:
     """
-    Decorator: return variable from environment.
+     Converts the name of the requested variable to the corresponding
+     environment variable name.
+
+    :param option: option name
+    :param section: section
+    :return: environment variable name
     """
+    prefix = 'drui'
+    if section != DEFAULTSECT:
+        return f'{prefix}_{section}_{option}'.upper()
+    return f'{prefix}_{option}'.upper()
 
-    def env_key(option: str, section: str = DEFAULTSECT) -> str:
-        """
-         Converts the name of the requested variable to the corresponding
-         environment variable name.
 
-        :param option: option name
-        :param section: section
-        :return: environment variable name
-        """
-        prefix = 'drui'
-        if section != DEFAULTSECT:
-            return f'{prefix}_{section}_{option}'.upper()
-        return f'{prefix}_{option}'.upper()
+def get_env(func: t.Callable) -> t.Callable:
+    """
+    Decorator: return variable from environment.
+    """
 
     @wraps(func)
     def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
@@ -36,9 +42,9 @@ def get_env(func: t.Callable) -> t.Callable:
         if not section and 'section' in kwargs:
             section = [kwargs.get('section', '')]
 
-        key = env_key(option, *section)
+        key = env_key(option, *section[:1])
         if key in environ:
-            self.set(option, environ.get(key), *section)
+            self.set(option, environ.get(key), *section[:1])
 
         return func(*args, **kwargs)
 
@@ -47,10 +53,39 @@ def get_env(func: t.Callable) -> t.Callable:
 
 class ConfigParser:
     def __init__(self, **kwargs: t.Any) -> None:
+        self._kwargs = kwargs
         self._config = _ConfigParser(**kwargs)
+        self._paths: t.List[str] = []
 
     def read(self, config_file: t.Union[PathLike]) -> t.List[str]:
-        return self._config.read(config_file, encoding='utf-8')
+        paths = self._config.read(config_file, encoding='utf-8')
+        self._paths.extend(paths)
+        return paths
+
+    def reload(self) -> t.List[str]:
+        """
+        Read the configuration files again (values of set() are lost).
+
+        :return: paths of the read files
+        """
+        config = _ConfigParser(**self._kwargs)
+        paths = config.read(self._paths, encoding='utf-8')
+        self._config = config
+        return paths
+
+    def snapshot(self) -> 'Settings':
+        """
+        Return immutable settings: current values of the configuration
+        files with environment variables applied.
+        """
+        values = {
+            (section, option): value
+            for section in [DEFAULTSECT] + self._config.sections()
+            for option, value in self._config.items(section, raw=True)
+        }
+        env = {key: value for key, value in environ.items()
+               if key.startswith('DRUI_')}
+        return Settings(values, env, self.digest())
 
     def add_section(self, section: str) -> None:
         return self._config.add_section(section)
@@ -70,6 +105,19 @@ class ConfigParser:
             self.add_section(section)
             return self._config.set(section, option, value)
 
+    def digest(self) -> str:
+        """
+        Return digest of the configuration (file and DRUI_* variables).
+        """
+        items = [
+            (section, option, value)
+            for section in [DEFAULTSECT] + self._config.sections()
+            for option, value in self._config.items(section, raw=True)
+        ]
+        items += sorted((key, value) for key, value in environ.items()
+                        if key.startswith('DRUI_'))
+        return sha256(repr(items).encode('utf-8')).hexdigest()
+
     @get_env
     def get(
             self,
@@ -107,6 +155,18 @@ class ConfigParser:
         except (NoOptionError, NoSectionError, ValueError):
             return default
 
+    @get_env
+    def getfloat(
+            self,
+            option: str,
+            section: str = DEFAULTSECT,
+            default: t.Optional[float] = None
+    ) -> t.Optional[float]:
+        try:
+            return self._config.getfloat(section, option)
+        except (NoOptionError, NoSectionError, ValueError):
+            return default
+
     @get_env
     def getlist(
             self,
@@ -123,4 +183,116 @@ class ConfigParser:
             return default
 
 
+class Settings(ConfigParser):
+    """
+    Immutable configuration snapshot.
+
+    Has the reading interface of ConfigParser: each option is resolved
+    (environment variable or file value) and converted once, the result
+    is memoized, so reading options on hot paths is a dictionary lookup.
+    """
+
+    def __init__(self, values: t.Dict[t.Tuple[str, str], t.Optional[str]],
+                 env: t.Dict[str, str], digest: str) -> None:
+        """
+        :param values: option values by section and option
+        :param env: DRUI_* environment variables
+        :param digest: digest of the configuration
+        """
+        self._values = MappingProxyType(dict(values))
+        self._env = MappingProxyType(dict(env))
+        self._digest = digest
+        self._sections = frozenset(x for x, _ in values)
+        self._cache: t.Dict[t.Tuple[str, str, str], t.Any] = {}
+
+    def read(self, config_file: t.Union[PathLike]) -> t.List[str]:
+        raise TypeError('Settings are immutable')
+
+    def reload(self) -> t.List[str]:
+        raise TypeError('Settings are immutable')
+
+    def add_section(self, section: str) -> None:
+        raise TypeError('Settings are immutable')
+
+    def set(self, option: str, value: str,
+            section: str = DEFAULTSECT) -> None:
+        raise TypeError('Settings are immutable')
+
+    def has_section(self, section: str) -> bool:
+        return section != DEFAULTSECT and section in self._sections
+
+    def snapshot(self) -> 'Settings':
+        return self
+
+    def digest(self) -> str:
+        return self._digest
+
+    def _resolve(self, kind: str, option: str, section: str,
+                 convert: t.Callable[[str], t.Any]) -> t.Any:
+        """
+        Return converted option value or _MISSING (memoized).
+
+        :param kind: conversion name
+        :param option: option name
+        :param section: section
+        :param convert: conversion, raises ValueError for invalid values
+        """
+        key = (kind, section, option)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        value = self._env.get(env_key(option, section), _MISSING)
+        if value is _MISSING:
+            value = self._values.get((section, option), _MISSING)
+
+        if value is not _MISSING:
+            try:
+                value = convert(value)
+            except (AttributeError, TypeError, ValueError):
+                value = _MISSING
+        self._cache[key] = value
+        return value
+
+    @staticmethod
+    def _boolean(value: str) -> bool:
+        if value.lower() not in _ConfigParser.BOOLEAN_STATES:
+            raise ValueError(f'Not a boolean: {value}')
+        return _ConfigParser.BOOLEAN_STATES[value.lower()]
+
+    @staticmethod
+    def _list(value: str) -> t.Optional[t.List[str]]:
+        if not value.strip():
+            return None
+        return [x.strip() for x in value.replace(' ', '').split(',')]
+
+    def get(self, option: str, section: str = DEFAULTSECT,
+            default: t.Optional[str] = None) -> t.Optional[str]:
+        value = self._resolve('str', option, section, lambda x: x)
+        return value if value is not _MISSING and value else default
+
+    def getboolean(self, option: str, section: str = DEFAULTSECT,
+                   default: t.Optional[bool] = None) -> t.Optional[bool]:
+        value = self._resolve('bool', option, section, self._boolean)
+        return default if value is _MISSING else value
+
+    def getint(self, option: str, section: str = DEFAULTSECT,
+               default: t.Optional[int] = None) -> t.Optional[int]:
+        value = self._resolve('int', option, section, int)
+        return default if value is _MISSING else value
+
+    def getfloat(self, option: str, section: str = DEFAULTSECT,
+                 default: t.Optional[float] = None) -> t.Optional[float]:
+        value = self._resolve('float', option, section, float)
+        return default if value is _MISSING else value
+
+    def getlist(self, option: str, section: str = DEFAULTSECT,
+                default: t.Optional[t.List] = None) -> t.Optional[t.List]:
+        value = self._resolve('list', option, section, self._list)
+        if value is _MISSING or value is None:
+            return default
+        return list(value)
+
+
 CONF = ConfigParser(allow_no_value=True)
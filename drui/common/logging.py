@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
+import os
+import queue
 import sys
 import typing as t
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from logging.handlers import RotatingFileHandler
+from logging.handlers import WatchedFileHandler
+from threading import Lock
 
 from flask import Flask
 from flask import has_request_context
@@ -13,18 +21,34 @@ from . import config
 NOTSET = logging.NOTSET
 conf = config.CONF
 
+DEFAULT_FORMAT = ('[%(asctime)s] %(levelname)s %(method)s'
+                  ' %(status_code)s %(url)s %(message)s')
 
-class RequestFormatter(logging.Formatter):
-    def __init__(self, *args, **kwargs):
-        self.default_value = '-'
-        datefmt = conf.get('date_format', section='logging',
-                           default='%Y-%m-%d %H:%M:%S')
-        super().__init__(*args, datefmt=datefmt, **kwargs)
+# request fields of log records
+REQUEST_FIELDS = ('url', 'method', 'remote_addr', 'status_code',
+                  'user_agent', 'referer', 'x_forwarded_for',
+                  'content_length')
+
+
+class RequestFilter(logging.Filter):
+    """
+    Add request fields to log records.
+
+    Fields are captured in the thread that logs the record, so records
+    may be formatted later in another thread (queued logging).
+    """
+
+    def __init__(self, default_value: str = '-') -> None:
+        super().__init__()
+        self.default_value = default_value
 
     def _get_header(self, key: str) -> t.Optional[str]:
         return request.headers.get(key, default=self.default_value)
 
-    def format(self, record):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if hasattr(record, 'url'):
+            return True
+
         if has_request_context():
             url = request.full_path if request.query_string else request.path
 
@@ -37,18 +61,184 @@ class RequestFormatter(logging.Formatter):
             record.x_forwarded_for = self._get_header('X-Forwarded-For')
             record.content_length = request.environ.get('content_length')
         else:
-            record.url = self.default_value
-            record.method = self.default_value
-            record.remote_addr = self.default_value
-            record.status_code = self.default_value
-            record.user_agent = self.default_value
-            record.referer = self.default_value
-            record.x_forwarded_for = self.default_value
-            record.content_length = self.default_value
+            for field in REQUEST_FIELDS:
+                setattr(record, field, self.default_value)
+        return True
 
+
+class RequestFormatter(logging.Formatter):
+    def __init__(self, *args, **kwargs):
+        self.default_value = '-'
+        self.request_filter = RequestFilter(self.default_value)
+        datefmt = conf.get('date_format', section='logging',
+                           default='%Y-%m-%d %H:%M:%S')
+        super().__init__(*args, datefmt=datefmt, **kwargs)
+
+    def format(self, record):
+        self.request_filter.filter(record)
         return super().format(record)
 
 
+class JSONFormatter(RequestFormatter):
+    """
+    Format log records as JSON lines.
+    """
+
+    def format(self, record):
+        self.request_filter.filter(record)
+        data = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update({
+            field: getattr(record, field) for field in REQUEST_FIELDS
+            if getattr(record, field) not in (None, self.default_value)
+        })
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records if the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SharedHandler(logging.Handler):
+    """
+    The handler of all DRUI loggers.
+
+    Records are written by the target handler, either directly or
+    through a queue by a background thread (started in each worker
+    process), so request threads never wait for the log output.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.addFilter(RequestFilter())
+        self.target: logging.Handler = logging.StreamHandler()
+        self.queue_size: t.Optional[int] = None
+        self._queue_handler: t.Optional[_NonBlockingQueueHandler] = None
+        self._listener: t.Optional[QueueListener] = None
+        self._pid: t.Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def dropped(self) -> int:
+        """
+        Return the number of records dropped because the queue was full.
+        """
+        return self._queue_handler.dropped if self._queue_handler else 0
+
+    def configure(self, target: logging.Handler,
+                  queue_size: t.Optional[int] = None) -> None:
+        """
+        Replace the target handler.
+
+        :param target: handler that writes records
+        :param queue_size: size of the queue (None - write directly,
+                           0 - unbounded queue)
+        """
+        with self._lock:
+            self._stop()
+            old, self.target = self.target, target
+            self.queue_size = queue_size
+        if old is not target:
+            old.close()
+
+    def _start(self) -> None:
+        """
+        Start the queue listener (once per process).
+        """
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            log_queue = queue.Queue(self.queue_size)
+            self._queue_handler = _NonBlockingQueueHandler(log_queue)
+            self._listener = QueueListener(log_queue, self.target,
+                                           respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def _stop(self) -> None:
+        """
+        Stop the queue listener and write the queued records.
+        """
+        if self._listener and self._pid == os.getpid():
+            try:
+                self._listener.stop()
+            except queue.Full:
+                pass
+        self._listener = None
+        self._queue_handler = None
+        self._pid = None
+
+    def flush(self) -> None:
+        with self._lock:
+            self._stop()
+        self.target.flush()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.queue_size is None:
+            self.target.handle(record)
+            return
+
+        self._start()
+        self._queue_handler.emit(record)
+
+
+handler = SharedHandler()
+
+
+def setup_logging(cfg: config.ConfigParser) -> None:
+    """
+    Configure the output of all DRUI loggers.
+
+    :param cfg: configuration
+    """
+    output = cfg.get('output', section='logging', default='text')
+    log_format = cfg.get('format', section='logging', default=DEFAULT_FORMAT)
+    formatter = JSONFormatter() if output == 'json' \
+        else RequestFormatter(log_format)
+
+    path = cfg.get('path', section='logging')
+    max_bytes = cfg.getint('max_bytes', section='logging', default=0)
+    if path and max_bytes > 0:
+        backup_count = cfg.getint('backup_count', section='logging',
+                                  default=5)
+        target = RotatingFileHandler(path, maxBytes=max_bytes,
+                                     backupCount=backup_count)
+    elif path:
+        # reopens the file after external rotation (e.g. logrotate)
+        target = WatchedFileHandler(path)
+    else:
+        target = logging.StreamHandler()
+    target.setLevel(logging.DEBUG)
+    target.setFormatter(formatter)
+
+    queue_size = None
+    if cfg.getboolean('queue', section='logging', default=False):
+        queue_size = cfg.getint('queue_size', section='logging',
+                                default=10000)
+    handler.configure(target, queue_size=queue_size)
+
+
 def disable_wsgi_logging(app: Flask) -> None:
     """
     Setting up logging parameters.
@@ -72,21 +262,18 @@ def get_logger(name: t.Optional[str] = None) -> logging.Logger:
     """
     Return an instance of the Logger class.
 
-    Simulates the behavior of logging.getLogger.
+    Simulates the behavior of logging.getLogger, the shared DRUI handler
+    is added to the logger once.
 
-    :param name: <ignoring>
-    :returns: logging handler
+    :param name: logger name
+    :returns: logger
     """
-    formatter = RequestFormatter('[%(asctime)s] %(levelname)s %(method)s'
-                                 ' %(status_code)s %(url)s %(message)s')
-
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    return logger
 
-    path = conf.get('path', section='logging')
-    handler = logging.FileHandler(path) if path else logging.StreamHandler()
-    handler.setLevel(logging.DEBUG)
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
-    return logger
+# default output (before the configuration is loaded)
+handler.target.setFormatter(RequestFormatter(DEFAULT_FORMAT))
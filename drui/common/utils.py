@@ -2,8 +2,14 @@
 
 import logging
 import typing as t
+from hashlib import sha256
+from json import dumps
+from threading import Lock
+from time import monotonic
+from time import sleep
 
 from flask import jsonify
+from flask import make_response
 from flask import request
 from requests.models import Response
 from werkzeug.exceptions import HTTPException
@@ -38,6 +44,50 @@ def json_answer(message: t.Any, status_code: int = 200) -> Response:
     return response
 
 
+def make_etag(*parts: t.Any) -> str:
+    """
+    Return strong ETag computed from the parts of a response.
+
+    :param parts: JSON serializable values the response depends on
+    :return: ETag
+    """
+    data = dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return sha256(data.encode('utf-8')).hexdigest()
+
+
+def not_modified(etag: str) -> t.Optional[Response]:
+    """
+    Return "304 Not Modified" if the client has the current version.
+
+    :param etag: ETag of the current version
+    :return: response or None
+    """
+    # weak comparison: compressed responses have weak ETags
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return make_response('', 304)
+
+
+def cache_headers(response: Response, etag: str,
+                  private: bool = False) -> Response:
+    """
+    Set ETag and Cache-Control headers: clients may store the response,
+    but revalidate it on every use.
+
+    :param response: response
+    :param etag: ETag
+    :param private: response must not be stored by shared caches
+    :return: response
+    """
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    response.cache_control.private = private or None
+    response.cache_control.public = not private or None
+    response.vary.add('Cookie')
+    response.vary.add('Accept')
+    return response
+
+
 class RequestParams:
     """
     Processing request parameters.
@@ -71,10 +121,83 @@ class RequestParams:
         """
         return self.params.get(key.lower(), default)
 
+    def getlist(self, key: str) -> t.List:
+        """
+        Return the value by key as list.
+
+        :param key: key
+        :return: list of values
+        """
+        value = self.get(key, default=[])
+        return value if isinstance(value, list) else [value]
+
+    def getint(self, key: str, default: t.Optional[int] = None):
+        """
+        Return the value by key converted to int or default.
+
+        :param key: key
+        :param default: default value if key does not exist or is not int
+        :return: value or default
+        """
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+
+def get_params() -> RequestParams:
+    """
+    Return parameters of the current request.
+
+    Parameters are parsed once per request and kept in the WSGI environment,
+    which is shared with copies of the request context (e.g. in threads).
+    """
+    params = request.environ.get('drui.params')
+    if params is None:
+        params = request.environ['drui.params'] = RequestParams()
+    return params
+
 
 def to_json() -> bool:
     """
-    Returns True if data is requested in JSON format.
+    Returns True if data is requested in JSON format: by the "format"
+    parameter or, without it, by the "Accept" header.
+    """
+    result = request.environ.get('drui.to_json')
+    if result is None:
+        data_format = get_params().get('format')
+        if data_format:
+            result = data_format == 'json'
+        else:
+            result = request.accept_mimetypes.best_match(
+                ['text/html', 'application/json']) == 'application/json'
+        request.environ['drui.to_json'] = result
+    return result
+
+
+class RateLimiter:
     """
-    params = RequestParams()
-    return params.get('format') == 'json'
+    Thread-safe limiter of the number of operations per second.
+    """
+
+    def __init__(self, rate: float) -> None:
+        """
+        :param rate: operations per second (0 - unlimited)
+        """
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        """
+        Wait until the next operation is allowed.
+        """
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        if start > now:
+            sleep(start - now)
@@ -0,0 +1,390 @@
+import json
+import os
+import typing as t
+from bisect import bisect_left
+from tempfile import gettempdir
+from tempfile import mkstemp
+from threading import Event
+from threading import Lock
+from threading import Thread
+from time import monotonic
+from time import time
+
+from flask import has_request_context
+from flask import session
+
+from drui.common.config import ConfigParser
+from drui.common.logging import get_logger
+from drui.registry import Registry
+
+try:
+    import fcntl
+except ImportError:
+    # not POSIX: every worker process refreshes its own index
+    fcntl = None
+
+log = get_logger(__name__)
+
+# sort orders of repository tables ("-" prefix: descending)
+SORT_KEYS = ('name', 'application')
+
+
+def application_name(name: str) -> str:
+    """
+    Return application name: the last component of the repository name.
+
+    :param name: repository name
+    :return: application name
+    """
+    return name.rsplit('/', 1)[-1]
+
+
+class Snapshot(t.NamedTuple):
+    """
+    Immutable state of the catalog index.
+    """
+    names: t.List[str]
+    lower_names: t.List[str]
+    updated_at: float
+    auth_required: bool
+
+
+def make_snapshot(names: t.List[str], auth_required: bool = False
+                  ) -> Snapshot:
+    """
+    Return snapshot of sorted repository names.
+
+    :param names: repository names
+    :param auth_required: registry catalog requires authentication
+    :return: snapshot
+    """
+    names = sorted(names)
+    return Snapshot(names=names,
+                    lower_names=[x.lower() for x in names],
+                    updated_at=monotonic(),
+                    auth_required=auth_required)
+
+
+class CatalogIndex:
+    """
+    Sorted in-memory index of repository names.
+
+    The index is refreshed by a background thread. If the index file is
+    set (see prepare()), only one worker process reads the catalog: the one
+    holding the lock of the file. It publishes each snapshot to the file,
+    other workers check the file with one stat() per request and load it
+    again when it changes. Readers always see a consistent snapshot:
+    a refresh builds a new one and swaps it in with a single assignment.
+    """
+
+    def __init__(self, registry: Registry, conf: ConfigParser) -> None:
+        """
+        :param registry: registry client
+        :param conf: configuration
+        """
+        self.registry = registry
+        self.enabled = conf.getboolean('enabled', 'index', default=False)
+        self.refresh_interval = conf.getint('refresh_interval', 'index',
+                                            default=60)
+        self.max_staleness = conf.getint('max_staleness', 'index',
+                                         default=300)
+
+        # credentials of the indexer (if registry requires authentication)
+        username = conf.get('username', 'index')
+        password = conf.get('password', 'index', default='')
+        self.auth = (username, password) if username else None
+        # every user sees the same catalog (no per-user access scopes)
+        self.shared = conf.getboolean('shared', 'index', default=False)
+        # snapshot file shared by worker processes (None: per process)
+        self.path = conf.get('path', 'index')
+
+        self.snapshot: t.Optional[Snapshot] = None
+        # positions of names ordered by application name (per snapshot)
+        self._application_order: t.Tuple[t.Optional[Snapshot],
+                                         t.List[int]] = (None, [])
+        self._thread: t.Optional[Thread] = None
+        self._pid: t.Optional[int] = None
+        self._lock = Lock()
+        self._stop = Event()
+        # stat() key of the loaded snapshot file and open lock file
+        self._key: t.Optional[t.Tuple] = None
+        self._lock_file: t.Optional[t.IO] = None
+
+    @staticmethod
+    def prepare(conf: ConfigParser) -> None:
+        """
+        Choose the snapshot file shared by worker processes (called once by
+        the server master process before workers are started).
+
+        The path is passed to the workers by the DRUI_INDEX_PATH environment
+        variable, so workers started later (restarted, SIGHUP) use the same
+        file.
+
+        :param conf: configuration
+        """
+        if not conf.getboolean('enabled', 'index', default=False):
+            return
+
+        default = os.path.join(gettempdir(), f'drui-index-{os.getpid()}.json')
+        path = conf.get('path', 'index', default=default)
+        os.environ['DRUI_INDEX_PATH'] = path
+
+    def start(self) -> None:
+        """
+        Start background refresh (once per worker process).
+        """
+        if not self.enabled or self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = Thread(target=self._run,
+                                  name='drui-catalog-index',
+                                  daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop background refresh (another worker takes over the refresh
+        of the shared snapshot).
+        """
+        self._stop.set()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._elected():
+                    self.refresh()
+            except Exception as error:
+                log.warning(f'Catalog index refresh failed: {error}')
+            self._stop.wait(self.refresh_interval)
+
+    def _elected(self) -> bool:
+        """
+        Return True if this process refreshes the index.
+
+        The first worker that locks the file keeps the lock until it exits,
+        other workers try again on each refresh interval and take over then.
+        """
+        if self.path is None or fcntl is None:
+            return True
+
+        if self._lock_file is None:
+            self._lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def refresh(self) -> None:
+        """
+        Read the catalog page by page, swap in a new snapshot and publish it
+        to the shared file.
+        """
+        resp = self.registry.request('GET', '/v2/', auth=None)
+        auth_required = resp.status_code == 401
+
+        old = self.snapshot
+        self.snapshot = make_snapshot(
+            list(self.registry.iter_repositories(auth=self.auth)),
+            auth_required)
+        names = self.snapshot.names
+        if self.path is not None:
+            self._save(self.snapshot)
+
+        if old is not None and old.names != names:
+            added = len(set(names) - set(old.names))
+            removed = len(set(old.names) - set(names))
+            log.info(f'Catalog index updated: {added} added,'
+                     f' {removed} removed, {len(names)} total')
+
+    def _save(self, snapshot: Snapshot) -> None:
+        """
+        Write the snapshot to the shared file (atomically renamed, so
+        readers never see a partially written snapshot).
+
+        :param snapshot: snapshot
+        """
+        # wall clock time of the refresh (monotonic time is per process)
+        updated = time() - (monotonic() - snapshot.updated_at)
+        fd, tmp_path = mkstemp(dir=os.path.dirname(self.path) or '.',
+                               prefix='.drui-index-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'names': snapshot.names,
+                           'auth_required': snapshot.auth_required,
+                           'updated': updated}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+
+        stat = os.stat(self.path)
+        self._key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def load(self) -> None:
+        """
+        Swap in the snapshot published by another worker process if the
+        shared file changed.
+        """
+        if self.path is None:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._key:
+            return
+        with self._lock:
+            if key == self._key:
+                return
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                snapshot = make_snapshot(data['names'], data['auth_required'])
+                # age of the snapshot in the refreshing process
+                age = max(0.0, time() - data['updated'])
+                self.snapshot = snapshot._replace(
+                    updated_at=snapshot.updated_at - age)
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                log.warning(f'Catalog index file is not loaded: {error}')
+            self._key = key
+
+    def available(self) -> bool:
+        """
+        Return True if the index may be used for the current request.
+
+        Stale snapshots (older than max_staleness) are never used. A catalog
+        that requires authentication is read with the indexer credentials,
+        so it is used only if it is shared by all users, and only for
+        logged-in users.
+        """
+        self.start()
+        self.load()
+
+        snapshot = self.snapshot
+        if snapshot is None:
+            return False
+        if monotonic() - snapshot.updated_at > self.max_staleness:
+            return False
+        if snapshot.auth_required:
+            return (self.shared and has_request_context()
+                    and 'auth' in session)
+        return True
+
+    @staticmethod
+    def _range(prefix: str, snapshot: Snapshot) -> t.Tuple[int, int]:
+        """
+        Return bounds of names starting with the prefix (binary search).
+
+        The caller passes the snapshot it reads names from: a refresh may
+        swap in a new snapshot at any time.
+
+        :param prefix: name prefix
+        :param snapshot: snapshot
+        :return: start and end index
+        """
+        names = snapshot.names
+        start = bisect_left(names, prefix)
+        end = bisect_left(names, prefix + '\U0010ffff', lo=start)
+        return start, end
+
+    def count(self, prefix: str = '') -> int:
+        """
+        Return the number of repositories starting with the prefix
+        (e.g. the number of images in a namespace).
+
+        :param prefix: name prefix
+        :return: number of repositories
+        """
+        start, end = self._range(prefix, self.snapshot)
+        return end - start
+
+    def find(self, prefix: str = '', query: t.Optional[str] = None,
+             offset: int = 0,
+             limit: t.Optional[int] = None) -> t.List[str]:
+        """
+        Return repositories starting with the prefix and containing
+        the query string (case-insensitive).
+
+        :param prefix: name prefix
+        :param query: substring of the name
+        :param offset: number of repositories to skip
+        :param limit: maximum number of repositories
+        :return: repository names
+        """
+        snapshot = self.snapshot
+        start, end = self._range(prefix, snapshot)
+
+        if not query:
+            stop = end if limit is None else min(start + offset + limit, end)
+            return snapshot.names[start + offset:stop]
+
+        query = query.lower()
+        found = [snapshot.names[i] for i in range(start, end)
+                 if query in snapshot.lower_names[i]]
+        stop = None if limit is None else offset + limit
+        return found[offset:stop]
+
+    def window(self, prefix: str = '', query: t.Optional[str] = None,
+               sort: str = 'name', offset: int = 0,
+               limit: t.Optional[int] = None) -> t.Tuple[int, t.List[str]]:
+        """
+        Return a window of the sorted repository table.
+
+        Without a query, a window of the name order is sliced without
+        looking at other names, so its cost does not depend on the size
+        of the catalog.
+
+        :param prefix: name prefix
+        :param query: substring of the name (case-insensitive)
+        :param sort: sort key (SORT_KEYS), "-" prefix for descending order
+        :param offset: number of repositories to skip
+        :param limit: maximum number of repositories
+        :return: number of matching repositories, repository names
+        """
+        snapshot = self.snapshot
+        key = sort.lstrip('-')
+        if key not in SORT_KEYS:
+            raise ValueError(f'Unknown sort key: {sort}')
+
+        start, end = self._range(prefix, snapshot)
+        positions: t.Sequence[int] = range(start, end)
+        if key == 'application':
+            order = self._application_positions(snapshot)
+            positions = order if end - start == len(order) else \
+                [i for i in order if start <= i < end]
+        if query:
+            query = query.lower()
+            positions = [i for i in positions
+                         if query in snapshot.lower_names[i]]
+        if sort.startswith('-'):
+            positions = positions[::-1]
+
+        stop = None if limit is None else offset + limit
+        return len(positions), [snapshot.names[i]
+                                for i in positions[offset:stop]]
+
+    def _application_positions(self, snapshot: Snapshot) -> t.List[int]:
+        """
+        Return positions of names ordered by application name
+        (sorted once per snapshot).
+
+        :param snapshot: snapshot
+        :return: positions
+        """
+        cached, order = self._application_order
+        if cached is not snapshot:
+            order = sorted(range(len(snapshot.names)), key=lambda i: (
+                application_name(snapshot.lower_names[i]), i))
+            self._application_order = (snapshot, order)
+        return order
@@ -1,15 +1,62 @@
 #!/usr/bin/env python3
 
 import argparse
+import signal
 import sys
+import typing as t
+from os import cpu_count
 from os.path import abspath
 
 import flask
 from gunicorn.app.base import BaseApplication
 
 from drui import __version__
+from drui.app import app
 from drui.app import init_app
+from drui.app import reload_config
 from drui.common.config import CONF
+from drui.common.config import ConfigParser
+from drui.index import CatalogIndex
+from drui.metrics import METRICS
+from drui.middleware.static import StaticFiles
+
+
+def server_options(conf: ConfigParser) -> t.Dict[str, t.Any]:
+    """
+    Return Gunicorn worker options from the configuration.
+
+    :param conf: configuration
+    :return: Gunicorn options
+    """
+    workers = min(2 * (cpu_count() or 1) + 1, 16)
+    return {
+        'workers': conf.getint('workers', default=workers),
+        'threads': conf.getint('threads', default=4),
+        'worker_class': conf.get('worker_class', default='gthread'),
+        'preload_app': conf.getboolean('preload_app', default=False),
+        'keepalive': conf.getint('keepalive', default=5),
+        'timeout': conf.getint('timeout', default=30),
+        'graceful_timeout': conf.getint('graceful_timeout', default=30),
+        'max_requests': conf.getint('max_requests', default=0),
+        'max_requests_jitter': conf.getint('max_requests_jitter', default=0),
+    }
+
+
+def check_server_options(conf: ConfigParser,
+                         options: t.Dict[str, t.Any]) -> t.Optional[str]:
+    """
+    Return an error if the options cannot be used with Gunicorn workers.
+
+    :param conf: configuration
+    :param options: Gunicorn worker options
+    :return: error message or None
+    """
+    # every worker would rotate the same file on its own
+    if options['workers'] > 1 and \
+            conf.getint('max_bytes', 'logging', default=0) > 0:
+        return ('log file rotation (max_bytes) requires a single worker,'
+                ' rotate the log file externally instead')
+    return None
 
 
 class WSGIApplication(BaseApplication):
@@ -17,11 +64,12 @@ class WSGIApplication(BaseApplication):
     Custom class for Gunicorn application.
     """
 
-    def __init__(self, app, host='0.0.0.0', port=8000):
+    def __init__(self, app=None, host='0.0.0.0', port=8000, options=None):
         self.options = {
             'bind': f'{host}:{port}',
             'workers': 1,
-            'loglevel': 'warning'
+            'loglevel': 'warning',
+            **(options or {})
         }
         self.application = app
         super().__init__()
@@ -31,8 +79,19 @@ class WSGIApplication(BaseApplication):
             self.cfg.set(key.lower(), value)
 
     def load(self):
+        # without preload_app each worker builds its own application
+        if self.application is None:
+            self.application = init_app(CONF)
         return self.application
 
+    def reload(self):
+        # SIGHUP: new workers are forked with the new settings
+        super().reload()
+        if self.application is None:
+            CONF.reload()
+        else:
+            reload_config()
+
 
 def parse_arguments() -> argparse.Namespace:
     """
@@ -58,6 +117,13 @@ def parse_arguments() -> argparse.Namespace:
                         dest='dev_mode',
                         default=False)
 
+    parser.add_argument('--build-static',
+                        help='write fingerprinted and precompressed static'
+                             ' files to the directory and exit',
+                        action='store',
+                        type=str,
+                        dest='build_static')
+
     parser.add_argument('-v',
                         '--version',
                         action='version',
@@ -81,7 +147,7 @@ def load_configuration(config_path: str) -> None:
 
 
 def print_startup_info(config_path: str, host: str, port: int,
-                       registry_endpoint: str) -> None:
+                       registry_endpoint: str, options: t.Dict) -> None:
     """
     Print startup information.
 
@@ -89,6 +155,7 @@ def print_startup_info(config_path: str, host: str, port: int,
     :param host: host for listening
     :param port: port for listening
     :param registry_endpoint:  Docker Registry endpoint
+    :param options: Gunicorn worker options
     :return:
     """
     print(
@@ -96,25 +163,32 @@ def print_startup_info(config_path: str, host: str, port: int,
         f'* Configuration file: {config_path}\n'
         f'* Listen address: {host}:{port}\n'
         f'* Registry endpoint: {registry_endpoint}\n'
+        f'* Workers: {options["workers"]} x {options["threads"]} threads'
+        f' ({options["worker_class"]})\n'
     )
 
 
-def run_application(server: flask.Flask, host: str, port: str,
-                    dev_mode: bool) -> None:
+def run_application(server: t.Optional[flask.Flask], host: str, port: str,
+                    dev_mode: bool,
+                    options: t.Optional[t.Dict] = None) -> None:
     """
     Run the application in either development or production mode.
 
-    :param server:
+    :param server: Flask app, or None to build it in each worker process
     :param host: host for listening
     :param port: port for listening
     :param dev_mode: start at development mode
+    :param options: Gunicorn worker options
     :return:
     """
     try:
         if dev_mode:
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda *_: reload_config())
             server.run(host=host, port=port, debug=True, threaded=True)
         else:
-            WSGIApplication(server, host=host, port=port).run()
+            WSGIApplication(server, host=host, port=port,
+                            options=options).run()
     except Exception as error:
         print(f'ERROR: {error}', file=sys.stderr)
         sys.exit(2)
@@ -125,15 +199,28 @@ def main() -> None:
     Main function to start the Registry UI application.
     """
     args = parse_arguments()
+    if args.build_static:
+        count = StaticFiles(None, app.static_folder).build(args.build_static)
+        print(f'* {count} static files written to {args.build_static}')
+        return
+
     load_configuration(args.config)
 
     host = CONF.get('host', default='0.0.0.0')
     port = CONF.getint('port', default=8000)
     registry_endpoint = CONF.get('endpoint', 'registry')
+    options = server_options(CONF)
+    error = None if args.dev_mode else check_server_options(CONF, options)
+    if error:
+        print(f'ERROR: {error}', file=sys.stderr)
+        sys.exit(2)
 
-    print_startup_info(args.config, host, port, registry_endpoint)
-    server = init_app(CONF)
-    run_application(server, host, port, args.dev_mode)
+    print_startup_info(args.config, host, port, registry_endpoint, options)
+    METRICS.prepare(CONF)
+    CatalogIndex.prepare(CONF)
+    server = (init_app(CONF) if args.dev_mode or options['preload_app']
+              else None)
+    run_application(server, host, port, args.dev_mode, options)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,394 @@
+import json
+import os
+import re
+import typing as t
+from bisect import bisect_left
+from contextlib import contextmanager
+from glob import glob
+from tempfile import gettempdir
+from tempfile import mkstemp
+from threading import Event
+from threading import Lock
+from threading import Thread
+from time import perf_counter
+
+from drui.common.config import ConfigParser
+from drui.common.logging import get_logger
+
+log = get_logger(__name__)
+
+# upper bounds of latency histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# registry API call types by URI
+CALL_TYPES = (
+    ('ping', re.compile(r'^/v2/?$')),
+    ('catalog', re.compile(r'^/v2/_catalog')),
+    ('tags', re.compile(r'^/v2/.+/tags/list')),
+    ('manifest', re.compile(r'^/v2/.+/manifests/')),
+    ('blob', re.compile(r'^/v2/.+/blobs/')),
+)
+
+HELP = {
+    'drui_http_requests_total': ('counter', 'HTTP requests by route'),
+    'drui_http_request_duration_seconds': (
+        'histogram', 'HTTP request latency by route'),
+    'drui_http_requests_in_flight': ('gauge', 'HTTP requests in progress'),
+    'drui_registry_requests_total': (
+        'counter', 'Registry API requests by call type and status'),
+    'drui_registry_request_duration_seconds': (
+        'histogram', 'Registry API request latency by call type'),
+    'drui_registry_requests_in_flight': (
+        'gauge', 'Registry API requests in progress'),
+    'drui_registry_request_header_bytes_total': (
+        'counter', 'Size of registry API request headers by call type'),
+    'drui_cache_hits_total': ('counter', 'Cache hits'),
+    'drui_cache_misses_total': ('counter', 'Cache misses'),
+    'drui_cache_hit_ratio': ('gauge', 'Cache hit ratio'),
+}
+
+Labels = t.Tuple[t.Tuple[str, str], ...]
+
+
+def escape(value: t.Any) -> str:
+    """
+    Escape label value for Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def call_type(method: str, uri: str) -> str:
+    """
+    Return registry API call type.
+
+    :param method: HTTP method
+    :param uri: registry URI
+    :return: catalog, tags, manifest, blob, delete, ping or other
+    """
+    path = uri.split('?', 1)[0]
+    for name, pattern in CALL_TYPES:
+        if pattern.match(path):
+            return 'delete' if method == 'DELETE' else name
+    return 'other'
+
+
+def header_size(headers: t.Mapping[str, str]) -> int:
+    """
+    Return size of HTTP/1.1 header lines (without the request line).
+
+    :param headers: request headers
+    :return: size (bytes)
+    """
+    return sum(len(k) + len(v) + 4 for k, v in headers.items())
+
+
+class RegistryCall:
+    """
+    Registry API call in progress.
+    """
+
+    def __init__(self) -> None:
+        self.status: t.Union[int, str] = 'error'
+        self.header_bytes = 0
+
+
+class Metrics:
+    """
+    Request counters and latency histograms of a worker process.
+
+    Every worker writes its metrics to a file of the shared directory
+    (periodically and before answering /metrics), the answer is the sum
+    of all files. Counters of exited workers are kept, their gauges
+    are not.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path = ''
+        self.flush_interval = 5.0
+        self.caches: t.Dict[str, t.Any] = {}
+
+        self._counters: t.Dict[t.Tuple[str, Labels], float] = {}
+        self._histograms: t.Dict[t.Tuple[str, Labels], t.List[float]] = {}
+        self._gauges: t.Dict[t.Tuple[str, Labels], float] = {}
+        self._lock = Lock()
+        self._pid: t.Optional[int] = None
+        self._stop = Event()
+
+    @staticmethod
+    def prepare(conf: ConfigParser) -> None:
+        """
+        Prepare the directory shared by worker processes (called once by
+        the server master process before workers are started).
+
+        Files of previous runs are removed. The directory is passed to the
+        workers by the DRUI_METRICS_PATH environment variable, so workers
+        started later (restarted, SIGHUP) write to the same directory.
+
+        :param conf: configuration
+        """
+        if not conf.getboolean('enabled', 'metrics', default=False):
+            return
+
+        path = conf.get(
+            'path', 'metrics',
+            default=os.path.join(gettempdir(), f'drui-metrics-{os.getpid()}'))
+        os.makedirs(path, exist_ok=True)
+        for name in glob(os.path.join(path, '*.json')):
+            os.remove(name)
+        os.environ['DRUI_METRICS_PATH'] = path
+
+    def configure(self, conf: ConfigParser) -> None:
+        """
+        Enable metrics of the worker process (files of other workers in
+        the directory are kept, see prepare()).
+
+        :param conf: configuration
+        """
+        self.enabled = conf.getboolean('enabled', 'metrics', default=False)
+        if not self.enabled:
+            return
+
+        self.path = conf.get(
+            'path', 'metrics',
+            default=os.path.join(gettempdir(), f'drui-metrics-{os.getpid()}'))
+        self.flush_interval = conf.getfloat('flush_interval', 'metrics',
+                                            default=5.0)
+        os.makedirs(self.path, exist_ok=True)
+
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def register_cache(self, name: str, cache: t.Any) -> None:
+        """
+        Add cache to metrics.
+
+        :param name: cache name
+        :param cache: object with stats() method (hits, misses)
+        """
+        self.caches[name] = cache
+
+    def inc(self, name: str, labels: t.Dict[str, t.Any],
+            value: float = 1) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        key = (name, ())
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, labels: t.Dict[str, t.Any],
+                value: float) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # bucket counters, sum, count
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            index = bisect_left(BUCKETS, value)
+            if index < len(BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+        self._start()
+
+    def request_started(self) -> float:
+        """
+        Count HTTP request in progress.
+
+        :return: start time
+        """
+        self.gauge('drui_http_requests_in_flight', 1)
+        return perf_counter()
+
+    def request_finished(self, route: str, method: str, status: int,
+                         start: float) -> None:
+        """
+        Count finished HTTP request.
+
+        :param route: URL rule
+        :param method: HTTP method
+        :param status: response status code
+        :param start: start time
+        """
+        self.gauge('drui_http_requests_in_flight', -1)
+        self.inc('drui_http_requests_total',
+                 {'route': route, 'method': method, 'status': status})
+        self.observe('drui_http_request_duration_seconds',
+                     {'route': route, 'method': method},
+                     perf_counter() - start)
+
+    @contextmanager
+    def registry_call(self, method: str, uri: str
+                      ) -> t.Iterator[RegistryCall]:
+        """
+        Measure registry API call, the caller sets the status.
+
+        :param method: HTTP method
+        :param uri: registry URI
+        """
+        call = RegistryCall()
+        if not self.enabled:
+            yield call
+            return
+
+        name = call_type(method, uri)
+        self.gauge('drui_registry_requests_in_flight', 1)
+        start = perf_counter()
+        try:
+            yield call
+        finally:
+            self.gauge('drui_registry_requests_in_flight', -1)
+            self.inc('drui_registry_requests_total',
+                     {'call': name, 'method': method, 'status': call.status})
+            self.observe('drui_registry_request_duration_seconds',
+                         {'call': name}, perf_counter() - start)
+            if call.header_bytes:
+                self.inc('drui_registry_request_header_bytes_total',
+                         {'call': name}, call.header_bytes)
+
+    def snapshot(self) -> t.Dict[str, t.Any]:
+        """
+        Return metrics of the worker process.
+        """
+        with self._lock:
+            counters = [[n, dict(x), v] for (n, x), v in self._counters.items()]
+            histograms = [[n, dict(x), list(v)]
+                          for (n, x), v in self._histograms.items()]
+            gauges = [[n, dict(x), v] for (n, x), v in self._gauges.items()]
+
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            counters.append(['drui_cache_hits_total', {'cache': name},
+                             stats['hits']])
+            counters.append(['drui_cache_misses_total', {'cache': name},
+                             stats['misses']])
+
+        return {'pid': os.getpid(), 'counters': counters,
+                'histograms': histograms, 'gauges': gauges}
+
+    def write(self) -> None:
+        """
+        Write metrics of the worker process to the shared directory.
+        """
+        fd, tmp_path = mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, os.path.join(self.path, f'{os.getpid()}.json'))
+
+    def _start(self) -> None:
+        """
+        Start periodic writing (once per worker process).
+        """
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        Thread(target=self._run, name='drui-metrics', daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.write()
+            except OSError as error:
+                log.warning(f'Metrics write failed: {error}')
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def collect(self) -> str:
+        """
+        Return metrics of all worker processes in Prometheus text format.
+        """
+        self.write()
+
+        counters: t.Dict[t.Tuple[str, Labels], float] = {}
+        histograms: t.Dict[t.Tuple[str, Labels], t.List[float]] = {}
+        for path in glob(os.path.join(self.path, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            alive = self._alive(data['pid'])
+            groups = [(counters, data['counters'])]
+            if alive:
+                groups.append((counters, data['gauges']))
+            for target, values in groups:
+                for name, labels, value in values:
+                    key = (name, tuple(sorted(labels.items())))
+                    target[key] = target.get(key, 0) + value
+
+            for name, labels, values in data['histograms']:
+                key = (name, tuple(sorted(labels.items())))
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+
+        for name in self.caches:
+            labels = (('cache', name),)
+            hits = counters.get(('drui_cache_hits_total', labels), 0)
+            misses = counters.get(('drui_cache_misses_total', labels), 0)
+            if hits + misses:
+                counters[('drui_cache_hit_ratio', labels)] = \
+                    hits / (hits + misses)
+
+        return self._format(counters, histograms)
+
+    @staticmethod
+    def _format(values: t.Dict[t.Tuple[str, Labels], float],
+                histograms: t.Dict[t.Tuple[str, Labels], t.List[float]]
+                ) -> str:
+        """
+        Format metrics in Prometheus text format.
+        """
+
+        def labels_text(labels: t.Iterable[t.Tuple[str, str]]) -> str:
+            text = ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+            return f'{{{text}}}' if text else ''
+
+        lines: t.List[str] = []
+        by_name: t.Dict[str, t.List[str]] = {}
+
+        for (name, labels), value in sorted(values.items()):
+            by_name.setdefault(name, []).append(
+                f'{name}{labels_text(labels)} {value}')
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            series = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram[:-2] +
+                                    [histogram[-1] - sum(histogram[:-2])]):
+                cumulative += count
+                series.append(f'{name}_bucket'
+                              f'{labels_text(labels + (("le", str(bound)),))}'
+                              f' {cumulative}')
+            series.append(f'{name}_sum{labels_text(labels)} {histogram[-2]}')
+            series.append(f'{name}_count{labels_text(labels)}'
+                          f' {histogram[-1]}')
+
+        for name, series in by_name.items():
+            kind, description = HELP.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(series)
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
@@ -1,19 +1,15 @@
 import typing as t
 
+from flask import Flask
 from flask import Response
-from flask import current_app
 from flask import render_template
 from flask import request
 from flask import session
 from requests.exceptions import ConnectionError
 from werkzeug.exceptions import HTTPException
 from werkzeug.exceptions import InternalServerError
-from werkzeug.exceptions import MethodNotAllowed
-from werkzeug.exceptions import NotFound
 from werkzeug.exceptions import ServiceUnavailable
 from werkzeug.exceptions import Unauthorized
-from werkzeug.routing import RequestRedirect
-from werkzeug.routing import Rule
 
 from drui.common.logging import get_logger
 from drui.common.utils import json_answer
@@ -38,48 +34,39 @@ def _prepare_error(error: Exception) -> t.Union[Response, t.Tuple[str, int]]:
     return render_template('core.html', error=error), error.code
 
 
-def _get_view_func(url: t.Union[Rule, str],
-                   method: str = 'GET') -> t.Optional[t.Tuple]:
+def handle_error(error: Exception
+                 ) -> t.Union[Response, t.Tuple[str, int]]:
     """
-    Return the function to call for the specified URL and method.
+    Display an error raised by a view in HTML or JSON.
 
-    :param url: URL
-    :param method: method
-    :returns: function, function parameters
+    :param error: error
     """
-    adapter = current_app.url_map.bind('localhost')
-
-    try:
-        match = adapter.match(url.rule, method=method)
-    except RequestRedirect as e:
-        return _get_view_func(e.new_url, method)
-    except (MethodNotAllowed, NotFound):
-        return None
+    if isinstance(error, Unauthorized):
+        session.clear()
+        if to_json():
+            return json_answer(Unauthorized())
+        return render_template('login.html', error=error), 401
 
-    try:
-        return current_app.view_functions[match[0]], match[1]
-    except KeyError:
-        return None
+    log.warning(error)
+    return _prepare_error(error)
 
 
-def middleware() -> t.Union[Response, t.Tuple[str, int], None]:
-    """
-    Intercept a request processing error and display it in HTML or JSON.
+def init_app(app: Flask, fallback: t.Callable) -> None:
     """
-    if request.path.startswith('/static/') or not request.url_rule:
-        return None
+    Register error handlers of the application.
 
-    func, params = _get_view_func(request.url_rule, request.method)
-    kwargs = request.view_args or {}
+    Errors raised by views are displayed by handle_error, other errors
+    (routing errors, static files) are passed to the fallback handler.
 
-    try:
-        return func(**kwargs) if func else None
-    except Unauthorized as error:
-        session.clear()
-        if to_json():
-            return json_answer(Unauthorized())
-        return render_template('login.html', error=error), 401
+    :param app: Flask application
+    :param fallback: error handler for errors outside views
+    """
+
+    def handler(error: Exception) -> t.Any:
+        if request.url_rule is None or request.endpoint == 'static':
+            return fallback(error)
+        return handle_error(error)
 
-    except Exception as error:
-        log.warning(error)
-        return _prepare_error(error)
+    for code in [400, 401, 403, 404, 405, 500, 503]:
+        app.register_error_handler(code, handler)
+    app.register_error_handler(Exception, handler)
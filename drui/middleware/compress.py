@@ -0,0 +1,118 @@
+import gzip
+import typing as t
+
+from werkzeug import Request
+from werkzeug import Response
+
+from drui.common.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# content types compressed by default
+MIMETYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+)
+
+
+class Compress:
+    """
+    WSGI middleware: compress responses with brotli or gzip.
+
+    The encoding is negotiated by the "Accept-Encoding" header. Streamed
+    responses (without Content-Length), small, partial and already encoded
+    responses are sent as is. Compressed bodies of responses with ETag
+    are cached, so an unchanged page is compressed only once.
+    """
+
+    def __init__(self, app: t.Callable, level: int = 6,
+                 brotli_quality: int = 4, min_size: int = 1024,
+                 mimetypes: t.Iterable[str] = MIMETYPES,
+                 use_brotli: bool = True, cache_size: int = 0) -> None:
+        """
+        :param app: WSGI application
+        :param level: gzip compression level (1-9)
+        :param brotli_quality: brotli compression quality (0-11)
+        :param min_size: minimum size of compressed responses (bytes)
+        :param mimetypes: compressed content types
+        :param use_brotli: use brotli if it is installed
+        :param cache_size: size of compressed bodies cache (bytes)
+        """
+        self.app = app
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.min_size = min_size
+        self.mimetypes = set(mimetypes)
+        self.encodings = ['br', 'gzip'] if use_brotli and brotli else ['gzip']
+        self.cache = LRUCache(cache_size) if cache_size > 0 else None
+
+    def __call__(self, environ: t.Dict, start_response: t.Callable
+                 ) -> t.Iterable[bytes]:
+        response = Response.from_app(self.app, environ)
+        if response.mimetype in self.mimetypes:
+            response.vary.add('Accept-Encoding')
+
+            encoding = Request(environ).accept_encodings.best_match(
+                self.encodings)
+            if encoding and self._compressible(environ, response):
+                self._compress(response, encoding)
+
+        return response(environ, start_response)
+
+    def _compressible(self, environ: t.Dict, response: Response) -> bool:
+        """
+        Return True if the response body may be compressed.
+
+        :param environ: WSGI environment
+        :param response: response
+        :return: True or False
+        """
+        return (environ.get('REQUEST_METHOD') != 'HEAD'
+                and response.status_code == 200
+                and 'Content-Encoding' not in response.headers
+                and not response.cache_control.no_transform
+                and (response.content_length or 0) >= self.min_size)
+
+    def _compress(self, response: Response, encoding: str) -> None:
+        """
+        Replace the response body with the compressed one.
+
+        :param response: response
+        :param encoding: content encoding
+        """
+        etag, _ = response.get_etag()
+        key = (etag, encoding)
+
+        cache = self.cache if etag else None
+        data = cache.get(key) if cache is not None else None
+        if data is None:
+            data = self._encode(response.get_data(), encoding)
+            if cache is not None:
+                cache.set(key, data)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+
+        # the compressed body differs from the original one byte by byte
+        if etag:
+            response.set_etag(etag, weak=True)
+
+    def _encode(self, data: bytes, encoding: str) -> bytes:
+        """
+        Compress data.
+
+        :param data: data
+        :param encoding: content encoding
+        :return: compressed data
+        """
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
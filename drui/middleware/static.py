@@ -0,0 +1,183 @@
+import gzip
+import mimetypes
+import os
+import typing as t
+from hashlib import sha256
+from threading import Lock
+
+from werkzeug import Request
+from werkzeug import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# content types of precompressed files
+COMPRESSED_MIMETYPES = (
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+    'image/svg+xml',
+)
+
+
+class StaticFile(t.NamedTuple):
+    """
+    Fingerprinted static file.
+    """
+    path: str
+    data: bytes
+    mimetype: str
+    etag: str
+
+
+class StaticFiles:
+    """
+    WSGI middleware: serve fingerprinted static files from memory.
+
+    Every file is available under a name with a content hash
+    (e.g. js/core.1a2b3c4d5e.js), so it may be cached forever: a new
+    version of the file gets a new name. The files are served before
+    the Flask application is called, compressed bodies are created once
+    per worker on the first request.
+    """
+
+    def __init__(self, app: t.Callable, root: str,
+                 prefix: str = '/static/', max_age: int = 31536000,
+                 brotli_quality: int = 9) -> None:
+        """
+        :param app: WSGI application
+        :param root: directory of static files
+        :param prefix: URL prefix of static files
+        :param max_age: lifetime of static files in browser cache (seconds)
+        :param brotli_quality: brotli quality of files compressed on request
+        """
+        self.app = app
+        self.prefix = prefix
+        self.max_age = max_age
+        self.brotli_quality = brotli_quality
+        self.encodings = ['br', 'gzip'] if brotli else ['gzip']
+
+        # original name -> fingerprinted name
+        self.names: t.Dict[str, str] = {}
+        # fingerprinted name -> file
+        self.files: t.Dict[str, StaticFile] = {}
+
+        self._compressed: t.Dict[t.Tuple[str, str], bytes] = {}
+        self._lock = Lock()
+
+        for path in self._walk(root):
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            digest = sha256(data).hexdigest()[:10]
+            base, ext = os.path.splitext(name)
+            fingerprinted = f'{base}.{digest}{ext}'
+            mimetype = mimetypes.guess_type(name)[0] or \
+                'application/octet-stream'
+
+            self.names[name] = fingerprinted
+            self.files[fingerprinted] = StaticFile(path, data, mimetype,
+                                                   digest)
+
+    @staticmethod
+    def _walk(root: str) -> t.Iterator[str]:
+        for directory, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                yield os.path.join(directory, filename)
+
+    def url(self, filename: str) -> str:
+        """
+        Return fingerprinted name of the static file.
+
+        :param filename: file name relative to the static directory
+        :return: fingerprinted name (or original name of unknown files)
+        """
+        return self.names.get(filename, filename)
+
+    def compress(self, name: str, encoding: str,
+                 quality: t.Optional[int] = None) -> bytes:
+        """
+        Return compressed content of the fingerprinted file.
+
+        :param name: fingerprinted name
+        :param encoding: content encoding (br or gzip)
+        :param quality: brotli quality
+        :return: compressed content
+        """
+        key = (name, encoding)
+        data = self._compressed.get(key)
+        if data is not None:
+            return data
+
+        content = self.files[name].data
+        if encoding == 'br':
+            data = brotli.compress(content,
+                                   quality=quality or self.brotli_quality)
+        else:
+            data = gzip.compress(content, compresslevel=9, mtime=0)
+
+        with self._lock:
+            self._compressed[key] = data
+        return data
+
+    def build(self, path: str) -> int:
+        """
+        Write fingerprinted and precompressed (.gz, .br) files
+        to the directory (e.g. to serve them by a reverse proxy).
+
+        :param path: output directory
+        :return: number of written files
+        """
+        count = 0
+        for name, file in self.files.items():
+            variants = [('', file.data)]
+            if file.mimetype in COMPRESSED_MIMETYPES:
+                variants += [(f'.{"gz" if x == "gzip" else x}',
+                              self.compress(name, x, quality=11))
+                             for x in self.encodings]
+
+            for suffix, data in variants:
+                target = os.path.join(path, *f'{name}{suffix}'.split('/'))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(data)
+                count += 1
+        return count
+
+    def __call__(self, environ: t.Dict, start_response: t.Callable
+                 ) -> t.Iterable[bytes]:
+        path = environ.get('PATH_INFO', '')
+        name = path[len(self.prefix):] if path.startswith(self.prefix) \
+            else None
+        if name not in self.files or \
+                environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
+
+        file = self.files[name]
+        request = Request(environ)
+        response = Response(mimetype=file.mimetype)
+        response.set_etag(file.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+
+        if file.mimetype in COMPRESSED_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+
+        if request.if_none_match.contains_weak(file.etag):
+            response.status_code = 304
+            return response(environ, start_response)
+
+        encoding = None
+        if file.mimetype in COMPRESSED_MIMETYPES:
+            encoding = request.accept_encodings.best_match(self.encodings)
+
+        if encoding:
+            response.set_data(self.compress(name, encoding))
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response.set_data(file.data)
+        return response(environ, start_response)
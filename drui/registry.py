@@ -1,56 +1,567 @@
+import os
+import re
 import typing as t
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from fnmatch import fnmatchcase
+from hashlib import sha1
 from hashlib import sha256
-from re import findall
+from http.cookiejar import DefaultCookiePolicy
+from itertools import islice
+from json import dumps
+from json import loads
+from threading import Lock
+from urllib.parse import urlsplit
 
 import requests
+from flask import copy_current_request_context
+from flask import has_request_context
 from flask import request
 from flask import session
-from hashlib import sha256
+from requests.adapters import HTTPAdapter
 from requests.models import Response
 from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
 from werkzeug.exceptions import NotFound
 from werkzeug.exceptions import Unauthorized
 
+from drui import __version__
+from drui.common.cache import ContentCache
+from drui.common.cache import LRUCache
+from drui.common.cache import ResponseCache
 from drui.common.config import ConfigParser
 from drui.common.logging import get_logger
-from drui.common.utils import RequestParams
+from drui.common.utils import RateLimiter
 from drui.common.utils import check_status
+from drui.metrics import METRICS
+from drui.metrics import call_type
+from drui.metrics import header_size
+from drui.tracing import TRACER
 
 log = get_logger(__name__)
 
+# User-Agent of registry requests
+USER_AGENT = f'drui/{__version__}'
+
+# status codes of cached registry responses ("not found" is not cached,
+# so a new tag is seen at once)
+CACHED_STATUSES = (200, 304)
+
+# user request headers that are never forwarded to the registry
+NOT_FORWARDED = ('content-length', 'cookie', 'host', 'user-agent')
+
 
 def union(*args) -> str:
     return ','.join(args)
 
 
-def semver_comparison(version: str) -> list:
+VERSION_RE = re.compile(
+    r'[vV]?(?P<release>\d+(?:\.\d+)*)'
+    r'(?:-(?P<pre>[0-9A-Za-z.-]+))?'
+    r'(?:\+[0-9A-Za-z.-]+)?'
+)
+CHUNK_RE = re.compile(r'(\d+)|([^\W\d_]+)')
+
+
+def _identifiers(text: str) -> t.List[t.Union[int, str]]:
     """
-    SemVer comparison.
+    Return comparable identifiers as flat (kind, value) pairs: numbers
+    are compared numerically and always sort before words.
+    """
+    key: t.List[t.Union[int, str]] = []
+    for number, word in CHUNK_RE.findall(text):
+        if number:
+            key += (0, int(number))
+        else:
+            key += (1, word.lower())
+    return key
+
+
+def semver_comparison(version: str) -> tuple:
+    """
+    SemVer sort key.
+
+    Versions are sorted by release numbers, a pre-release sorts before
+    the release (1.0.0-alpha < 1.0.0-beta.2 < 1.0.0-beta.11 < 1.0.0),
+    build metadata is ignored. Other tags are sorted after versions,
+    'latest' version in the end.
 
-    return 'latest' version in the end.
+    The key is a flat tuple; -1 ends the release numbers and the
+    identifiers, so shorter lists sort first and values of different
+    types are never compared.
     """
+    version = str(version)
+    match = VERSION_RE.fullmatch(version)
+    if match is None:
+        if version.lower() == 'latest':
+            return (2,)
+        return (1, *_identifiers(version), -1, version)
 
-    def to_number(text: str) -> list:
-        if text.isnumeric():
-            return [int(text)]
-        return [ord(char) for char in text.upper()]
+    release, pre = match.groups()
+    if pre is None:
+        return (0, *map(int, release.split('.')), -1, 1, -1, version)
+    return (0, *map(int, release.split('.')), -1, 0, *_identifiers(pre), -1,
+            version)
+
+
+def is_digest(reference: str) -> bool:
+    """
+    Return True if the reference is a content digest, not a tag.
+
+    :param reference: tag or digest
+    """
+    return ':' in reference
+
+
+TIME_RE = re.compile(
+    r'^(?P<time>\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2})(?:\.\d+)?'
+    r'(?:[Zz]|(?P<sign>[+-])(?P<hours>\d{2}):?(?P<minutes>\d{2}))?$'
+)
+
+
+def parse_time(value: t.Optional[str]) -> t.Optional[datetime]:
+    """
+    Parse image creation time (RFC 3339, fractional seconds are ignored,
+    time without offset is UTC).
 
-    if str(version).upper() == 'LATEST':
-        return [float('inf')]
+    :param value: time string
+    :return: time (UTC) or None
+    """
+    match = TIME_RE.match(value or '')
+    if not match:
+        return None
+    try:
+        time = datetime.strptime(match.group('time').replace('t', 'T')
+                                 .replace(' ', 'T'), '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
 
-    chars = findall('\\w+', str(version))
-    return sum(list(to_number(char) for char in chars), [])
+    offset = timedelta()
+    if match.group('sign'):
+        offset = timedelta(hours=int(match.group('hours')),
+                           minutes=int(match.group('minutes')))
+        if match.group('sign') == '-':
+            offset = -offset
+    return (time - offset).replace(tzinfo=timezone.utc)
 
 
-def auth_provider(response: Response) -> t.Optional[str]:
+def next_link(response: Response) -> t.Optional[str]:
     """
-    Return response authentication provider.
+    Return URI of the next page from the response Link header.
 
     :param response: HTTP response
-    :return: authentication provider
+    :return: URI (path and query) or None
+    """
+    url = response.links.get('next', {}).get('url')
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+CHALLENGE_RE = re.compile(r'(\w+)="([^"]*)"')
+REPOSITORY_RE = re.compile(r'^/v2/(?P<name>.+)/(?:tags|manifests|blobs)/')
+
+
+def parse_challenge(header: t.Optional[str]
+                    ) -> t.Tuple[t.Optional[str], t.Dict[str, str]]:
+    """
+    Parse authentication challenge (Www-Authenticate header).
+
+    :param header: header value
+    :return: authentication provider (basic, bearer, etc.), parameters
+    """
+    if not header:
+        return None, {}
+    scheme, _, params = header.strip().partition(' ')
+    return scheme.lower(), dict(CHALLENGE_RE.findall(params))
+
+
+def repository_name(uri: str) -> t.Optional[str]:
     """
-    auth_header = response.headers.get('Www-Authenticate')
-    return auth_header.lower().split()[0] if auth_header else None
+    Return the repository name of a registry request.
+
+    :param uri: URI
+    :return: name or None (catalog and base endpoint)
+    """
+    match = REPOSITORY_RE.match(uri.split('?', 1)[0])
+    return match.group('name') if match else None
+
+
+def token_scope(method: str, uri: str) -> str:
+    """
+    Return scope of the token required for a registry request.
+
+    :param method: HTTP method
+    :param uri: URI
+    :return: scope (empty for the base endpoint)
+    """
+    if uri.startswith('/v2/_catalog'):
+        return 'registry:catalog:*'
+    name = repository_name(uri)
+    if name is None:
+        return ''
+    actions = {'GET': 'pull', 'HEAD': 'pull', 'DELETE': 'delete'}
+    return f"repository:{name}:{actions.get(method, 'pull,push')}"
+
+
+T = t.TypeVar('T')
+
+
+class Call(t.NamedTuple):
+    """
+    Registry request of an operation. The status of the response is
+    checked (errors are raised) unless it is allowed.
+    """
+    method: str
+    uri: str
+    headers: t.Optional[t.Dict[str, str]] = None
+    params: t.Optional[t.Dict[str, t.Any]] = None
+    allow: t.Tuple[int, ...] = ()
+
+
+class Blocking(t.NamedTuple):
+    """
+    Blocking call of an operation (disk cache), asynchronous clients run
+    it in a thread.
+    """
+    func: t.Callable
+    args: t.Tuple = ()
+
+
+class Prefetch(t.NamedTuple):
+    """
+    Background load of platform manifests and configurations.
+    """
+    image: str
+    digests: t.List[str]
+
+
+# Registry operations are generators shared by the synchronous and
+# asynchronous clients: they yield Call, Blocking and Prefetch effects,
+# receive their results (or exceptions) and return the operation result.
+# Parsing and caching live here, the clients only perform the I/O.
+Operation = t.Generator[t.Union[Call, Blocking, Prefetch], t.Any, T]
+
+
+def run_operation(operation: Operation[T],
+                  perform: t.Callable[[t.Any], t.Any]) -> T:
+    """
+    Run operation, performing its effects by a blocking function.
+
+    :param operation: operation
+    :param perform: function that returns the result of an effect
+    :return: result of the operation
+    """
+    value, error = None, None
+    while True:
+        try:
+            effect = operation.send(value) if error is None \
+                else operation.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = perform(effect), None
+        except Exception as exc:
+            value, error = None, exc
+
+
+def read_cache(cache: ContentCache,
+               key: str) -> Operation[t.Optional[bytes]]:
+    """
+    Return content from the cache (the disk is read by a blocking call).
+    """
+    body = cache.memory.get(key)
+    if body is None and cache.disk:
+        body = yield Blocking(cache.read_disk, (key,))
+    return body
+
+
+def write_cache(cache: ContentCache, key: str, body: bytes) -> Operation[None]:
+    """
+    Save content to the cache (the disk is written by a blocking call).
+    """
+    cache.memory.set(key, body)
+    if cache.disk:
+        yield Blocking(cache.disk.set, (key, body))
+
+
+def check_access(registry: 'Registry', image: str) -> Operation[None]:
+    """
+    Check that the user may read the image before content cached by
+    digest is returned (the cache is shared between users).
+
+    The registry is asked with the user credentials, the answer is
+    cached per user as other tag list responses.
+
+    :param registry: registry client
+    :param image: image name
+    """
+    yield Call('GET', f'/v2/{image}/tags/list', params={'n': 1})
+
+
+def get_manifest(registry: 'Registry', image: str, reference: str,
+                 verified: bool = False) -> Operation[t.Tuple[t.Dict, str]]:
+    """
+    Return manifest and its digest.
+
+    Manifests requested by digest are immutable and served from cache.
+    Manifests requested by tag are revalidated with If-None-Match.
+
+    :param registry: registry client
+    :param image: image name
+    :param reference: tag or digest
+    :param verified: the user has already read the image (access is
+        not checked again)
+    :return: manifest, digest
+    """
+    uri = f'/v2/{image}/manifests/{reference}'
+
+    if is_digest(reference):
+        key = f'manifests/{image}@{reference}'
+        body = yield from read_cache(registry.cache, key)
+        if body is not None and not verified:
+            yield from check_access(registry, image)
+        if body is None:
+            resp = yield Call('GET', uri, registry.accept)
+            body = resp.content
+            yield from write_cache(registry.cache, key, body)
+        return loads(body), reference
+
+    headers = dict(registry.accept)
+    tag_key = f'{image}:{reference}'
+    digest = registry.tag_digests.get(tag_key)
+    body = None
+    if digest:
+        body = yield from read_cache(registry.cache,
+                                     f'manifests/{image}@{digest}')
+    if body is not None:
+        headers['If-None-Match'] = f'"{digest}"'
+
+    resp = yield Call('GET', uri, headers,
+                      allow=(304,) if body is not None else ())
+    if resp.status_code == 304:
+        return loads(body), digest
+
+    body = resp.content
+    digest = resp.headers.get(
+        'Docker-Content-Digest',
+        default=sha256(resp.text.encode('utf-8')).hexdigest()
+    )
+    yield from write_cache(registry.cache, f'manifests/{image}@{digest}', body)
+    registry.tag_digests.set(tag_key, digest, size=1)
+    return loads(body), digest
+
+
+def get_blob(registry: 'Registry', image: str, digest: str,
+             verified: bool = False) -> Operation[t.Dict]:
+    """
+    Return JSON blob (image configuration) from cache or registry.
+
+    :param registry: registry client
+    :param image: image name
+    :param digest: blob digest
+    :param verified: the user has already read the image
+    :return: blob
+    """
+    key = f'blobs/{image}@{digest}'
+    body = yield from read_cache(registry.cache, key)
+    if body is not None and not verified:
+        yield from check_access(registry, image)
+    if body is None:
+        resp = yield Call('GET', f'/v2/{image}/blobs/{digest}',
+                          registry.accept)
+        body = resp.content
+        yield from write_cache(registry.cache, key, body)
+    return loads(body)
+
+
+def get_image(registry: 'Registry', image: str, tag: str,
+              digest: t.Optional[str] = None) -> Operation[t.Optional[t.Dict]]:
+    """
+    Return image tag manifest with its configuration.
+
+    :param registry: registry client
+    :param image: image name
+    :param tag: image tag
+    :param digest: platform manifest digest (for multi-arch images)
+    :return: manifest
+    """
+    ref = digest or tag
+    manifest = {}
+
+    # get manifest list
+    data = None
+    verified = False
+    try:
+        data, manifest_digest = yield from get_manifest(registry, image, tag)
+        verified = True
+
+        manifest_list = data.get('manifests')
+        manifest['manifests'] = manifest_list
+
+        if manifest_list:
+            if not digest:
+                ref = manifest_list[0]['digest']
+            if registry.prefetch_platforms:
+                yield Prefetch(image, [x['digest'] for x in manifest_list
+                                       if x['digest'] != ref])
+    except NotFound:
+        pass
+
+    # get image manifest (reuse the tag manifest if it is not a list)
+    if data is None or ref != tag:
+        try:
+            data, manifest_digest = yield from get_manifest(
+                registry, image, ref, verified)
+        except NotFound:
+            return None
+    manifest.update(data)
+
+    # add image digest to manifest
+    manifest['digest'] = manifest_digest
+
+    # add image configuration to manifest
+    if 'config' not in manifest:
+        log.warning(f'Unknown manifest: {manifest}')
+        return None
+
+    config_digest = manifest['config'].get('digest')
+    manifest.update((yield from get_blob(registry, image, config_digest,
+                                         verified=True)))
+
+    # add image ID to manifest
+    manifest['id'] = config_digest
+    return manifest
+
+
+def get_summary(registry: 'Registry', image: str,
+                tag: str) -> Operation[t.Optional[t.Dict]]:
+    """
+    Return short information about image tag: digest, size,
+    creation time and platforms.
+
+    :param registry: registry client
+    :param image: image name
+    :param tag: image tag
+    :return: tag summary
+    """
+    try:
+        data, digest = yield from get_manifest(registry, image, tag)
+
+        platforms = [
+            f"{x['platform']['os']}/{x['platform']['architecture']}"
+            for x in data.get('manifests') or [] if 'platform' in x
+        ]
+        if data.get('manifests'):
+            data, _ = yield from get_manifest(
+                registry, image, data['manifests'][0]['digest'],
+                verified=True)
+
+        config = yield from get_blob(registry, image,
+                                     data['config']['digest'], verified=True)
+    except (NotFound, KeyError):
+        return None
+
+    return {
+        'tag': tag,
+        'digest': digest,
+        'size': sum(x.get('size', 0) for x in data.get('layers', [])),
+        'created': config.get('created'),
+        'platforms': platforms or [
+            f"{config.get('os')}/{config.get('architecture')}"
+        ],
+    }
+
+
+def prefetch(registry: 'Registry', image: str, digest: str) -> Operation[None]:
+    """
+    Load platform manifest and configuration into cache (errors are
+    logged only).
+
+    :param registry: registry client
+    :param image: image name
+    :param digest: platform manifest digest
+    """
+    try:
+        data, _ = yield from get_manifest(registry, image, digest,
+                                          verified=True)
+        config_digest = data.get('config', {}).get('digest')
+        if config_digest:
+            yield from get_blob(registry, image, config_digest,
+                                verified=True)
+    except Exception as error:
+        log.warning(f'Prefetch of {image}@{digest} failed: {error}')
+
+
+def get_pages(uri: str, key: str, page_size: int) -> Operation[t.List[str]]:
+    """
+    Return paginated API results following the Link header.
+
+    :param uri: URI of the first page
+    :param key: name of the list in the response
+    :param page_size: number of entries per page
+    :return: entries
+    """
+    result: t.List[str] = []
+    params: t.Optional[t.Dict] = {'n': page_size}
+    while uri:
+        resp = yield Call('GET', uri, params=params)
+        result.extend(resp.json().get(key) or [])
+
+        # next page URI already contains all query parameters
+        uri, params = next_link(resp), None
+    return result
+
+
+def get_tags(registry: 'Registry',
+             image: str) -> Operation[t.Optional[t.List[str]]]:
+    """
+    Return sorted image tag list (all pages).
+
+    :param registry: registry client
+    :param image: image name
+    :return: tags
+    """
+    try:
+        tags = yield from get_pages(f'/v2/{image}/tags/list', 'tags',
+                                    registry.tags_page_size)
+        return registry.sort_tags(image, tags)
+    except (NotFound, TypeError):
+        return None
+
+
+def completed_in_window(submit: t.Callable[[t.Any], Future],
+                        items: t.Iterable, window: int
+                        ) -> t.Iterator[t.Tuple[t.Any, Future]]:
+    """
+    Submit items keeping at most "window" of them running and yield
+    items with their futures as soon as they are completed.
+
+    :param submit: function that starts the work of an item
+    :param items: items
+    :param window: maximum number of running items
+    :return: item, completed future
+    """
+    queue = list(reversed(list(items)))
+    running: t.Dict[Future, t.Any] = {}
+    try:
+        while queue or running:
+            while queue and len(running) < window:
+                item = queue.pop()
+                running[submit(item)] = item
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future
+    finally:
+        for future in running:
+            future.cancel()
 
 
 class Registry:
@@ -62,7 +573,8 @@ class Registry:
 
         # supported authentication providers:
         #  - basic: apache htpasswd file
-        self.auth_providers = ('basic',)
+        #  - bearer: token service
+        self.auth_providers = ('basic', 'bearer')
 
         # registry endpoint
         self.registry_endpoint = self.conf.get('endpoint', 'registry',
@@ -81,6 +593,220 @@ class Registry:
             )
         }
 
+        # user request headers forwarded to the registry
+        self.forward_headers = tuple(
+            name for name in self.conf.getlist(
+                'forward_headers', 'registry',
+                default=['Authorization', 'X-Request-Id'])
+            if name.lower() not in NOT_FORWARDED
+        )
+
+        # connection pool parameters
+        self.pool_size = self.conf.getint('pool_size', 'registry', default=10)
+        self.keep_alive = self.conf.getboolean('keep_alive', 'registry',
+                                               default=True)
+        self.timeout = (
+            self.conf.getfloat('connect_timeout', 'registry', default=5.0),
+            self.conf.getfloat('read_timeout', 'registry', default=30.0),
+        )
+        self.retries = self.conf.getint('retries', 'registry', default=3)
+        self.backoff_factor = self.conf.getfloat('backoff_factor', 'registry',
+                                                 default=0.3)
+
+        # number of entries requested per page of paginated API
+        self.catalog_page_size = self.conf.getint('catalog_page_size',
+                                                  'registry', default=1000)
+        self.tags_page_size = self.conf.getint('tags_page_size', 'registry',
+                                               default=1000)
+
+        # maximum number of concurrent registry requests per worker
+        self.max_concurrency = self.conf.getint('max_concurrency', 'registry',
+                                                default=8)
+        self.prefetch_platforms = self.conf.getboolean(
+            'prefetch_platforms', 'registry', default=True)
+
+        # limit of DELETE requests per second made by bulk deletion
+        self.delete_limiter = RateLimiter(
+            self.conf.getfloat('delete_rate_limit', 'registry', default=10))
+
+        # HTTP session and thread pool are created lazily and re-created
+        # after fork, so gunicorn workers never share them with the master
+        self._session: t.Optional[requests.Session] = None
+        self._session_pid: t.Optional[int] = None
+        self._session_lock = Lock()
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._executor_pid: t.Optional[int] = None
+
+        # cache of manifests and config blobs addressed by digest
+        self.cache = ContentCache(
+            max_size=self.conf.getint('memory_size', 'cache',
+                                      default=64 * 1024 * 1024),
+            path=self.conf.get('path', 'cache'),
+            disk_size=self.conf.getint('disk_size', 'cache',
+                                       default=1024 * 1024 * 1024),
+        )
+
+        # last known digests of tags (used for revalidation only)
+        self.tag_digests = LRUCache(max_size=16384)
+
+        # sorted tag lists by image (size is the number of tags)
+        self.sorted_tags = LRUCache(max_size=262144)
+
+        # GET responses by call type: lifetime and stale-while-revalidate
+        # time (seconds), concurrent identical requests are coalesced
+        self.response_ttl = {
+            'catalog': self.conf.getfloat('catalog_ttl', 'cache', default=10),
+            'tags': self.conf.getfloat('tags_ttl', 'cache', default=5),
+            'manifest': self.conf.getfloat('manifest_ttl', 'cache',
+                                           default=5),
+        }
+        self.stale_ttl = self.conf.getfloat('stale_while_revalidate',
+                                            'cache', default=30)
+        self.responses = ResponseCache(
+            max_size=self.conf.getint('response_memory_size', 'cache',
+                                      default=16 * 1024 * 1024),
+            submit=lambda func: self.executor.submit(func),
+            on_error=lambda error: log.warning(
+                f'Background refresh failed: {error}'),
+        )
+
+        # authentication challenge of the registry (probed once) and
+        # Bearer tokens by user and scope, refreshed in background
+        # "token_refresh" seconds before they expire
+        self._challenge: t.Optional[
+            t.Tuple[t.Optional[str], t.Dict[str, str]]] = None
+        self.token_refresh = self.conf.getfloat('token_refresh', 'registry',
+                                                default=30)
+        self.tokens = ResponseCache(
+            max_size=4096,
+            submit=lambda func: self.executor.submit(func),
+            on_error=lambda error: log.warning(
+                f'Token refresh failed: {error}'),
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Return HTTP session with connection pool of the current process.
+        """
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or \
+                        self._session_pid != os.getpid():
+                    self._session = self._create_session()
+                    self._session_pid = os.getpid()
+        return self._session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Return thread pool for concurrent registry requests.
+        """
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._session_lock:
+                if self._executor is None or \
+                        self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency,
+                        thread_name_prefix='drui-registry')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def submit(self, func: t.Callable, *args: t.Any,
+               **kwargs: t.Any) -> Future:
+        """
+        Run function in the thread pool with a copy of the request context
+        (user headers and credentials are available to the function).
+
+        :param func: function
+        :param args: function arguments
+        :param kwargs: function keyword arguments
+        :return: future result
+        """
+        if has_request_context():
+            func = copy_current_request_context(func)
+        return self.executor.submit(func, *args, **kwargs)
+
+    def as_completed(self, func: t.Callable, items: t.Iterable,
+                     *args: t.Any) -> t.Iterator[t.Tuple[t.Any, Future]]:
+        """
+        Call func(*args, item) for each item in the thread pool and yield
+        items with their futures as soon as they are completed.
+
+        At most a half of the thread pool is used, so a large batch
+        never starves other requests.
+
+        :param func: function
+        :param items: function last argument values
+        :param args: function first arguments
+        :return: item, completed future
+        """
+        return completed_in_window(
+            lambda item: self.submit(func, *args, item), items,
+            max(self.max_concurrency // 2, 1))
+
+    def _create_session(self) -> requests.Session:
+        """
+        Create HTTP session with connection pool and retry policy.
+        """
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(('GET', 'HEAD')),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size,
+                              max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        # session is shared between users: never store registry cookies
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers['User-Agent'] = USER_AGENT
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def request_options(self, kwargs: t.Dict[str, t.Any]
+                        ) -> t.Dict[str, t.Any]:
+        """
+        Add user request headers and credentials to request parameters.
+
+        :param kwargs: request parameters
+        :return: request parameters
+        """
+        # # add user request headers to request
+        headers = CaseInsensitiveDict(self.forwarded_headers())
+        headers.update(kwargs.pop('headers', {}))
+        kwargs['headers'] = headers
+
+        # # add auth credentials to request
+        kwargs.setdefault('auth', session.get('auth')
+                          if has_request_context() else None)
+        kwargs.setdefault('timeout', self.timeout)
+        return kwargs
+
+    def forwarded_headers(self) -> t.Dict[str, str]:
+        """
+        Return headers of the user request forwarded to the registry
+        (selected once per user request).
+        """
+        if not has_request_context():
+            return {}
+
+        headers = request.environ.get('drui.registry.headers')
+        if headers is None:
+            headers = request.environ['drui.registry.headers'] = {
+                name: request.headers[name] for name in self.forward_headers
+                if name in request.headers
+            }
+        return headers
+
     def request(self, method: str, uri: str, **kwargs: t.Any) -> Response:
         """
         Send HTTP request and return result.
@@ -90,19 +816,206 @@ class Registry:
         :param kwargs: additional request parameters
         :return: result of request
         """
-        # # add user request headers to request
-        headers = CaseInsensitiveDict(request.headers)
-        headers.update(kwargs.pop('headers', {}))
-        headers.pop('Content-Length', None)
-        headers.pop('Cookie', None)
-        headers.pop('User-Agent', None)
-        headers.pop('Host', None)
-        kwargs['headers'] = headers
+        kwargs = self.request_options(kwargs)
+        ttl = self.response_ttl.get(call_type(method, uri)) \
+            if method == 'GET' else None
+        if not ttl:
+            if method not in ('GET', 'HEAD'):
+                self.invalidate(uri)
+            return self._request(method, uri, **kwargs)
 
-        # # add auth credentials to request
-        kwargs['auth'] = session.get('auth')
+        return self.responses.get(
+            self.response_key(method, uri, kwargs),
+            lambda: self._request(method, uri, **kwargs),
+            ttl, self.stale_ttl,
+            size=lambda x: len(x.content) + 1024,
+            cacheable=lambda x: x.status_code in CACHED_STATUSES,
+        )
+
+    def invalidate(self, uri: str) -> None:
+        """
+        Delete cached responses made outdated by a change of the registry.
+
+        Only the cache of this worker process is cleared, other workers
+        keep their responses until they expire.
+
+        :param uri: URI of the changing request
+        """
+        name = repository_name(uri)
+        if name is None:
+            self.responses.clear()
+        else:
+            self.responses.delete_matching(lambda key: key[0] == name)
+
+    @staticmethod
+    def response_key(method: str, uri: str, kwargs: t.Dict[str, t.Any],
+                     client: str = 'requests') -> t.Tuple[str, str]:
+        """
+        Return key of the response cache: the repository name (empty for
+        the catalog), the request and a hash of the user credentials, so
+        users never get responses of others.
+
+        :param method: HTTP method
+        :param uri: URI
+        :param kwargs: request parameters
+        :param client: HTTP client library (responses are not shared)
+        :return: key
+        """
+        headers = kwargs['headers']
+        data = dumps([
+            client, method, uri, kwargs.get('params'), kwargs.get('auth'),
+            [headers.get(x) for x in ('Accept', 'If-None-Match',
+                                      'Authorization')],
+        ], sort_keys=True, default=str)
+        return (repository_name(uri) or '',
+                sha256(data.encode('utf-8')).hexdigest())
+
+    def _request(self, method: str, uri: str, **kwargs: t.Any) -> Response:
+        """
+        Send HTTP request with the user credentials.
 
-        return requests.request(method, self.registry_endpoint + uri, **kwargs)
+        The request is repeated once with a new token if the registry
+        rejects the token or its token authentication was not known yet.
+
+        :param method: HTTP method
+        :param uri: URI
+        :param kwargs: request parameters
+        :return: result of request
+        """
+        def with_token(header: t.Optional[str]) -> t.Dict[str, t.Any]:
+            if header is None:
+                return kwargs
+            headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+            headers['Authorization'] = header
+            return dict(kwargs, headers=headers, auth=None)
+
+        auth = kwargs.get('auth')
+        resp = self._send(method, uri, **with_token(
+            self.authorization(method, uri, auth)))
+        if resp.status_code == 401:
+            header = self.authorization(
+                method, uri, auth, resp.headers.get('Www-Authenticate', ''))
+            if header is not None:
+                resp.close()
+                resp = self._send(method, uri, **with_token(header))
+        return resp
+
+    def _send(self, method: str, uri: str, **kwargs: t.Any) -> Response:
+        """
+        Send HTTP request to registry (measured and traced if enabled).
+
+        :param method: HTTP method
+        :param uri: URI (or URL of the token service)
+        :param kwargs: request parameters
+        :return: result of request
+        """
+        url = uri if '://' in uri else self.registry_endpoint + uri
+        if not METRICS.enabled and not TRACER.enabled:
+            return self.session.request(method, url, **kwargs)
+
+        with METRICS.registry_call(method, uri) as call, \
+                TRACER.span(call_type(method, uri), 'client',
+                            **{'http.request.method': method,
+                               'url.path': uri.split('?', 1)[0]}) as span:
+            resp = self.session.request(method, url, **kwargs)
+            call.status = resp.status_code
+            call.header_bytes = header_size(resp.request.headers)
+            span.attributes['http.response.status_code'] = resp.status_code
+        return resp
+
+    def challenge(self) -> t.Tuple[t.Optional[str], t.Dict[str, str]]:
+        """
+        Return authentication challenge of the registry: provider and its
+        parameters (probed once, updated by rejected requests).
+        """
+        if self._challenge is None:
+            resp = self._send('GET', '/v2/', timeout=self.timeout)
+            self._challenge = parse_challenge(
+                resp.headers.get('Www-Authenticate'))
+        return self._challenge
+
+    @property
+    def token_auth(self) -> bool:
+        """
+        Return True if the registry is known to use token authentication.
+        """
+        return self._challenge is not None and self._challenge[0] == 'bearer'
+
+    def authorization(self, method: str, uri: str,
+                      auth: t.Optional[t.Tuple[str, str]],
+                      rejected: t.Optional[str] = None) -> t.Optional[str]:
+        """
+        Return Authorization header with the Bearer token of the user for
+        a registry request, None if the registry does not use tokens.
+
+        :param method: HTTP method
+        :param uri: URI
+        :param auth: user credentials
+        :param rejected: challenge of a rejected request (a new token
+            is requested for its scope)
+        :return: header value
+        """
+        if not auth:
+            return None
+
+        if rejected is not None:
+            challenge = parse_challenge(rejected)
+            if challenge[0] != 'bearer' or 'realm' not in challenge[1]:
+                return None
+            self._challenge = challenge
+            scope = challenge[1].get('scope') or token_scope(method, uri)
+            self.tokens.delete(self._token_key(auth, scope))
+        elif self.token_auth:
+            scope = token_scope(method, uri)
+        else:
+            return None
+
+        token = self.tokens.get(
+            self._token_key(auth, scope),
+            lambda: self._fetch_token(auth, scope),
+            ttl=lambda x: max(x['expires_in'] - self.token_refresh, 0),
+            stale=self.token_refresh,
+            size=lambda x: 1,
+        )
+        return f"Bearer {token['token']}"
+
+    def _token_key(self, auth: t.Tuple[str, str], scope: str) -> str:
+        """
+        Return key of the token cache: token service, scope and a hash
+        of the user credentials.
+
+        :param auth: user credentials
+        :param scope: token scope
+        :return: key
+        """
+        _, params = self._challenge or (None, {})
+        data = dumps([params.get('realm'), params.get('service'),
+                      list(auth), scope])
+        return sha256(data.encode('utf-8')).hexdigest()
+
+    def _fetch_token(self, auth: t.Tuple[str, str],
+                     scope: str) -> t.Dict[str, t.Any]:
+        """
+        Request Bearer token from the token service of the registry.
+
+        :param auth: user credentials
+        :param scope: token scope
+        :return: token and its lifetime (seconds)
+        """
+        _, params = self._challenge or (None, {})
+        query = {'service': params.get('service')}
+        if scope:
+            query['scope'] = scope
+
+        resp = self._send('GET', params['realm'], params=query,
+                          auth=tuple(auth), timeout=self.timeout)
+        check_status(resp)
+        data = resp.json()
+        return {
+            'token': data.get('token') or data.get('access_token'),
+            # the token lifetime is 60 seconds if not specified
+            'expires_in': int(data.get('expires_in') or 60),
+        }
 
     def login(self, username: str, password: str) -> bool:
         """
@@ -114,8 +1027,7 @@ class Registry:
         """
         # get auth provider: basic, bearer, etc...
         # raise Unauthorized if provider not supported
-        resp = self.request('GET', '/v2/')
-        provider = auth_provider(resp)
+        provider, _ = self.challenge()
         if provider not in self.auth_providers:
             raise Unauthorized(f'Auth provider "{provider}" not supported.')
 
@@ -124,87 +1036,167 @@ class Registry:
         session['provider'] = provider
 
         # check connection to registry with auth credentials
+        # (a token of the user is requested first with bearer provider)
         resp = self.request('GET', '/v2/')
         check_status(resp)
         return True
 
-    def repositories(self) -> t.List[str]:
+    def _paginate(self, uri: str, key: str, page_size: int,
+                  params: t.Optional[t.Dict] = None,
+                  **kwargs: t.Any) -> t.Iterator[str]:
+        """
+        Iterate over paginated API results following the Link header.
+
+        :param uri: URI of the first page
+        :param key: name of the list in the response
+        :param page_size: number of entries per page
+        :param params: additional query parameters of the first page
+        :param kwargs: additional request parameters
+        :return: entries
+        """
+        params = {'n': page_size, **(params or {})}
+        while uri:
+            resp = self.request('GET', uri, params=params, **kwargs)
+            check_status(resp)
+            yield from resp.json().get(key) or []
+
+            # next page URI already contains all query parameters
+            uri, params = next_link(resp), None
+
+    def iter_repositories(self, prefix: str = '',
+                          **kwargs: t.Any) -> t.Iterator[str]:
+        """
+        Iterate over repository names page by page.
+
+        The catalog is lexically ordered, so iteration starts right before
+        the prefix and stops after the last matching name.
+
+        :param prefix: repository name prefix
+        :param kwargs: additional request parameters
+        :return: repository names
+        """
+        params = {'last': prefix[:-1]} if prefix[:-1] else {}
+        for name in self._paginate('/v2/_catalog', 'repositories',
+                                   self.catalog_page_size, params, **kwargs):
+            if name.startswith(prefix):
+                yield name
+            elif name > prefix:
+                return
+
+    def repositories(self, prefix: str = '', query: t.Optional[str] = None,
+                     offset: int = 0,
+                     limit: t.Optional[int] = None) -> t.List[str]:
         """
         Return repository list.
+
+        :param prefix: repository name prefix
+        :param query: substring of the name (case-insensitive)
+        :param offset: number of repositories to skip
+        :param limit: maximum number of repositories
+        :return: repository names
         """
-        resp = self.request('GET', '/v2/_catalog')
-        check_status(resp)
-        return resp.json().get('repositories', [])
+        names = self.iter_repositories(prefix)
+        if query:
+            query = query.lower()
+            names = (x for x in names if query in x.lower())
+
+        stop = offset + limit if limit is not None else None
+        return list(islice(names, offset, stop))
+
+    def run(self, operation: Operation[T]) -> T:
+        """
+        Run registry operation with blocking requests.
 
-    def manifest(self, image: str, tag: str) -> t.Optional[t.Dict]:
+        :param operation: operation
+        :return: result of the operation
+        """
+        return run_operation(operation, self._perform)
+
+    def _perform(self, effect: t.Union[Call, Blocking, Prefetch]) -> t.Any:
+        """
+        Perform effect of an operation and return its result.
+
+        :param effect: registry request, blocking call or prefetch
+        :return: result
+        """
+        if isinstance(effect, Call):
+            resp = self.request(effect.method, effect.uri,
+                                headers=effect.headers or {},
+                                params=effect.params)
+            if resp.status_code not in effect.allow:
+                check_status(resp)
+            return resp
+        if isinstance(effect, Prefetch):
+            for digest in effect.digests:
+                self.submit(self.run, prefetch(self, effect.image, digest))
+            return None
+        return effect.func(*effect.args)
+
+    def manifest(self, image: str, tag: str,
+                 digest: t.Optional[str] = None) -> t.Optional[t.Dict]:
         """
         Return image tag manifest.
 
         :param image: image name
         :param tag: image tag
+        :param digest: platform manifest digest (for multi-arch images)
         :return: manifest
         """
-        params = RequestParams()
-        ref = params.get('digest', default=tag)
-        manifest = {}
-
-        try:
-            # get manifest list
-            resp = self.request('GET', f'/v2/{image}/manifests/{tag}',
-                                headers=self.accept)
-            check_status(resp)
+        return self.run(get_image(self, image, tag, digest))
 
-            manifest_list = resp.json().get('manifests')
-            manifest['manifests'] = manifest_list
+    def summary(self, image: str, tag: str) -> t.Optional[t.Dict]:
+        """
+        Return short information about image tag: digest, size,
+        creation time and platforms.
 
-            if manifest_list:
-                ref = manifest_list[0]['digest']
-        except NotFound:
-            pass
+        :param image: image name
+        :param tag: image tag
+        :return: tag summary
+        """
+        return self.run(get_summary(self, image, tag))
 
-        # get image manifest
-        try:
-            resp = self.request('GET', f'/v2/{image}/manifests/{ref}',
-                                headers=self.accept)
-            check_status(resp)
-        except NotFound:
-            return None
-        manifest.update(resp.json())
+    def tags(self, image: str) -> t.Optional[t.List[str]]:
+        """
+        Return image tag list (all pages).
 
-        # add image digest to manifest
-        manifest['digest'] = resp.headers.get(
-            'Docker-Content-Digest',
-            default=sha256(resp.text.encode('utf-8')).hexdigest()
-        )
+        :param image: image name
+        :return: tags
+        """
+        return self.run(get_tags(self, image))
 
-        # add image configuration to manifest
-        if 'config' not in manifest:
-            log.warning(f'Unknown manifest: {manifest}')
-            return None
+    def sort_tags(self, image: str, tags: t.List[str]) -> t.List[str]:
+        """
+        Return sorted tags, unchanged tag lists are not sorted again.
 
-        config_digest = manifest['config'].get('digest')
-        resp = self.request('GET', f'/v2/{image}/blobs/{config_digest}',
-                            headers=self.accept)
-        check_status(resp)
-        manifest.update(resp.json())
+        :param image: image name
+        :param tags: tags in registry order
+        :return: sorted tags
+        """
+        key = sha1('\n'.join(tags).encode('utf-8')).hexdigest()
+        cached = self.sorted_tags.get(image)
+        if cached and cached[0] == key:
+            return list(cached[1])
 
-        # add image ID to manifest
-        manifest['id'] = resp.headers.get('Docker-Content-Digest')
-        return manifest
+        result = sorted(tags, key=semver_comparison)
+        self.sorted_tags.set(image, (key, tuple(result)),
+                             size=max(len(result), 1))
+        return result
 
-    def tags(self, image: str) -> t.Optional[t.List[str]]:
+    def digest(self, image: str, tag: str) -> t.Optional[str]:
         """
-        Return image tag list.
+        Return digest of image tag (HEAD request only).
 
         :param image: image name
-        :return: tags
+        :param tag: image tag
+        :return: digest or None if tag not found
         """
+        resp = self.request('HEAD', f'/v2/{image}/manifests/{tag}',
+                            headers=self.accept)
         try:
-            resp = self.request('GET', f'/v2/{image}/tags/list')
             check_status(resp)
-            return sorted(resp.json().get('tags', []), key=semver_comparison)
-        except (NotFound, TypeError):
+        except NotFound:
             return None
+        return resp.headers.get('Docker-Content-Digest')
 
     def delete(self, image: str, tag: str) -> bool:
         """
@@ -214,15 +1206,102 @@ class Registry:
         :param tag: image tag
         :return:
         """
-        manifest = self.manifest(image, tag)
-        if not manifest:
-            return False
-
-        digest = manifest.get('digest')
+        digest = self.digest(image, tag)
         if not digest:
             return False
 
+        self._delete_manifest(image, digest)
+        return True
+
+    def _delete_manifest(self, image: str, digest: str) -> None:
+        """
+        Delete manifest by digest (all tags referring to it are deleted).
+
+        :param image: image name
+        :param digest: manifest digest
+        """
         resp = self.request('DELETE', f'/v2/{image}/manifests/{digest}',
                             headers=self.accept)
         check_status(resp)
-        return True
+
+    def select_tags(self, image: str, tags: t.Optional[t.List[str]] = None,
+                    pattern: t.Optional[str] = None,
+                    older_than: t.Optional[int] = None) -> t.List[str]:
+        """
+        Return tags matching the filter.
+
+        :param image: image name
+        :param tags: tag names (default: all tags of image)
+        :param pattern: shell-style pattern of tag names (e.g. "ci-*")
+        :param older_than: minimum age of image (days)
+        :return: tags
+        """
+        if not tags:
+            tags = self.tags(image) or []
+        if pattern:
+            tags = [x for x in tags if fnmatchcase(x, pattern)]
+        if older_than is None:
+            return tags
+
+        # image age requires image configuration (served from cache)
+        try:
+            deadline = datetime.now(timezone.utc) - timedelta(days=older_than)
+        except OverflowError:
+            return []
+        selected = []
+        for tag, future in self.as_completed(self.summary, tags, image):
+            created = parse_time((future.result() or {}).get('created'))
+            if created and created < deadline:
+                selected.append(tag)
+        return selected
+
+    def delete_many(self, image: str, tags: t.List[str],
+                    dry_run: bool = False) -> t.Dict[str, t.Dict]:
+        """
+        Delete many image tags.
+
+        Tags are resolved to digests with HEAD requests, each digest is
+        deleted once. DELETE requests are made concurrently under the rate
+        limit. Note: the registry deletes every tag referring to a deleted
+        digest, including tags which are not in the list.
+
+        :param image: image name
+        :param tags: image tags
+        :param dry_run: resolve tags only, do not delete
+        :return: report: tag -> digest, status, error
+        """
+        report: t.Dict[str, t.Dict] = {}
+        digests: t.Dict[str, t.List[str]] = {}
+
+        for tag, future in self.as_completed(self.digest, tags, image):
+            try:
+                digest = future.result()
+            except Exception as error:
+                report[tag] = {'digest': None, 'status': 'error',
+                               'error': str(error)}
+                continue
+
+            if not digest:
+                report[tag] = {'digest': None, 'status': 'not found'}
+            else:
+                digests.setdefault(digest, []).append(tag)
+
+        def delete(digest: str) -> None:
+            self.delete_limiter.acquire()
+            self._delete_manifest(image, digest)
+
+        if dry_run:
+            results = ((x, None) for x in digests)
+        else:
+            results = self.as_completed(delete, digests)
+
+        for digest, future in results:
+            status, error = ('dry run', None) if dry_run else ('deleted', None)
+            if future is not None and future.exception():
+                status, error = 'error', str(future.exception())
+
+            for tag in digests[digest]:
+                report[tag] = {'digest': digest, 'status': status}
+                if error:
+                    report[tag]['error'] = error
+        return report
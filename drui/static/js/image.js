@@ -180,18 +180,110 @@ function setHistory() {
  * Set image tags.
  */
 function setTags() {
+    const pane = document.getElementById("tags-pane");
     const ul = document.createElement("ol");
     ul.className = "list-group text-decoration-underline link-offset-3";
-    tags.reverse().forEach(value => {
+    pane.appendChild(ul);
+
+    const summary_elements = appendTags(ul, tags);
+
+    // load the next window of older tags
+    if (tags_next) {
+        let cursor = tags_next;
+        const limit = tags.length;
+        const more = document.createElement("button");
+        more.className = "btn btn-sm btn-outline-secondary mt-2";
+        more.textContent = "Show more";
+        more.onclick = () => {
+            more.disabled = true;
+            $.getJSON(`/_/${image}/tags`, { limit: limit, cursor: cursor }, data => {
+                tags.unshift(...data.tags);
+                loadTagSummary(appendTags(ul, data.tags));
+                cursor = data.next;
+                more.disabled = false;
+                if (!cursor) more.remove();
+            });
+        };
+        pane.appendChild(more);
+    }
+
+    // load tags information when the tab is opened for the first time
+    document.getElementById("tags-tab").addEventListener(
+        "shown.bs.tab", () => loadTagSummary(summary_elements), { once: true }
+    );
+}
+
+
+/**
+ * Append tags to the list (newest first).
+ *
+ * @param {HTMLElement} ul - tag list
+ * @param {Array} values - tag names (oldest first)
+ * @return {Map} tag name to summary DOM element
+ */
+function appendTags(ul, values) {
+    const summary_elements = new Map();
+    values.slice().reverse().forEach(value => {
         const li = document.createElement("li");
         li.textContent = value;
         li.className = "list-group-item list-group-item-action text-monospace small text-truncate border-0";
         li.role = "button";
         li.onclick = () => window.location = `/_/${image}/tags/${value}`;
+
+        const summary = document.createElement("span");
+        summary.className = "float-end text-body-secondary";
+        li.appendChild(summary);
+        summary_elements.set(value, summary);
+
         ul.appendChild(li);
     });
+    return summary_elements;
+}
 
-    document.getElementById("tags-pane").appendChild(ul);
+
+/**
+ * Load short information about image tags (one streamed request).
+ *
+ * @param {Map} elements - tag name to DOM element
+ */
+async function loadTagSummary(elements) {
+    const body = new URLSearchParams();
+    elements.forEach((_, tag) => body.append("tags[]", tag));
+
+    const response = await fetch(`/_/${image}/summary`, { method: "POST", body: body });
+    if (!response.ok || !response.body) return;
+
+    // the answer is NDJSON: one tag per line, sent as soon as it is resolved
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += value;
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.map(line => JSON.parse(line)).forEach(summary => {
+            showTagSummary(elements.get(summary.tag), summary);
+        });
+    }
+}
+
+
+/**
+ * Show short information about image tag.
+ *
+ * @param {HTMLElement} element - DOM element
+ * @param {Object} summary - tag summary (size, created, platforms)
+ */
+function showTagSummary(element, summary) {
+    if (!element || summary.error) return;
+
+    element.textContent = [
+        sizeFormat(summary.size),
+        summary.created ? new Date(summary.created).format("%Y/%M/%D") : "",
+        summary.platforms.join(", ")
+    ].filter(x => x).join(" | ");
 }
 
 
@@ -261,8 +353,6 @@ function deleteImage(image) {
         },
         bind: function () {
             let deleted_tags = document.getTableById("deleted_tags").selected;
-            let delete_errors = [];
-            let delete_queue_count = deleted_tags.length;
 
             if (!deleted_tags.length) {
                 modal_error("Please select some tags.");
@@ -275,38 +365,32 @@ function deleteImage(image) {
             document.getElementById("modal_cancel").classList.add("visually-hidden");
             document.getElementById("gear").classList.remove("visually-hidden");
 
-            new RequestQueue(
-                deleted_tags,
-                (tag) => {
-                    return {
-                        url: `/_/${image}/tags/${tag}`,
-                        data: "format=json",
-                        type: "DELETE",
-                        async: true,
-                        complete: (XHR) => {
-                            delete_queue_count--;
-
-                            if (XHR.status !== 200) {
-                                delete_errors.push(`<b>${tag}</b>: ${XHR.responseText}`);
-                            }
-
-                            if (delete_queue_count === 0) {
-                                window.onbeforeunload = undefined;
-                                document.getElementById("modal_save").disabled = false;
-                                document.getElementById("modal_cancel").classList.remove("visually-hidden");
-                                document.getElementById("gear").classList.add("visually-hidden");
-
-                                if (delete_errors.length) {
-                                    modal_error(delete_errors.join("<br>"));
-                                } else {
-                                    alert("Delete finished.");
-                                }
-                            }
-                        }
-                    };
+            const finish = (errors) => {
+                window.onbeforeunload = undefined;
+                document.getElementById("modal_save").disabled = false;
+                document.getElementById("modal_cancel").classList.remove("visually-hidden");
+                document.getElementById("gear").classList.add("visually-hidden");
+
+                if (errors.length) {
+                    modal_error(errors.join("<br>"));
+                } else {
+                    alert("Delete finished.");
+                }
+            };
+
+            // delete all selected tags with one request
+            $.ajax({
+                url: `/_/${image}/tags`,
+                data: { "tags": deleted_tags, "format": "json" },
+                type: "DELETE",
+                async: true,
+                success: (report) => {
+                    finish(Object.entries(report)
+                        .filter(([, result]) => result.status !== "deleted")
+                        .map(([tag, result]) => `<b>${tag}</b>: ${result.error || result.status}`));
                 },
-                5
-            ).run();
+                error: (XHR) => finish([XHR.responseText])
+            });
 
             return false;
         }
@@ -317,7 +401,7 @@ function deleteImage(image) {
         headers: [
             { name: "tag" },
         ],
-        data: tags.map((x) => [x, x]),
+        data: tags.slice().reverse().map((x) => [x, x]),
         className: "table table-sm table-hover table-borderless",
         theadClassName: "table-sm",
         height: 200,
@@ -363,58 +447,3 @@ function viewJSON(json) {
     }).view();
 }
 
-
-/**
- * Parallel execution of ajax requests for a group of objects.
- *
- * @param {Array} queue - list of object names
- * @param {Object|Function} options - ajax-request parameters
- * @param {number} threads - number of simultaneously executing threads
- */
-class RequestQueue {
-    constructor(queue, options = {}, threads = 3) {
-        this.workers = 0;
-
-        // checking the passed parameters
-        if (!Array.isArray(queue)) {
-            throw new TypeError("Type of parameter 'queue' is not array");
-        }
-        this.queue = queue.slice();
-
-        if (!["function", "object"].includes(typeof options)) {
-            throw new TypeError("Type of parameter 'callback' is not function or object");
-        }
-        this.options = options;
-
-        if (!threads) {
-            throw new TypeError("Parameter 'threads' must be > 0");
-        }
-        this.threads = threads;
-    }
-
-    run() {
-        let that = this;
-
-        function next() {
-            if (that.workers < that.threads && that.queue.length) {
-                that.run()
-            }
-        }
-
-        that.workers++;
-        let unit = this.queue.shift();
-
-        return new Promise(() => {
-            let options = (typeof that.options === "function") ? that.options(unit) : that.options;
-            let complete = options.complete;
-            options.complete = (XDR, status) => {
-                complete(XDR, status);
-                that.workers--;
-                next();
-            };
-
-            $.ajax(options);
-            next();
-        });
-    }
-}
@@ -2,7 +2,9 @@
 
 $(function () {
     const filter_dom = document.getElementById("filter");
-    if (filter_dom) {
+    if (repositories === null) {
+        viewVirtualRepositories();
+    } else if (filter_dom) {
         filter_dom.onkeyup = () => {
             const filtered_data = filterRepositories();
             viewRepositories(filtered_data);
@@ -83,6 +85,181 @@ function viewRepositories(repositories) {
 }
 
 
+/**
+ * Displays the repository list as a virtual table: windows of rows are
+ * loaded from the server (sorted and filtered there) and only the rows
+ * in the visible part of the table are rendered.
+ */
+function viewVirtualRepositories() {
+    const repositories_dom = document.getElementById("repositories");
+    if (!repositories_dom) return;
+
+    const blockSize = 100;  // rows per /catalog request
+    const overscan = 10;    // rows rendered above and below the visible part
+    const marks = official_prefix.length + verified_prefix.length > 0;
+    const columns = marks ? 3 : 2;
+    const state = {
+        query: "",
+        sort: "name",
+        total: 0,
+        blocks: new Map(),  // block number => names (null while loading)
+        rowHeight: 0,
+        generation: 0,
+        range: null,
+        frame: null
+    };
+
+    repositories_dom.innerHTML = `
+        <div class="overflow-auto" style="height: 75vh">
+            <table class="table table-sm table-hover align-middle">
+                <thead class="thead-dark table-sm sticky-top">
+                    <tr>
+                        <th role="button" data-sort="application" style="width: 400px">application <i class="fa"></i></th>
+                        <th role="button" data-sort="name">repository <i class="fa"></i></th>
+                        ${marks ? '<th style="width: 200px">mark</th>' : ""}
+                    </tr>
+                </thead>
+                <tbody></tbody>
+            </table>
+        </div>`;
+    const scroll = repositories_dom.firstElementChild;
+    const tbody = repositories_dom.querySelector("tbody");
+
+    function spacer(rows) {
+        const tr = document.createElement("tr");
+        tr.className = "border-0";
+        tr.style.height = `${rows * (state.rowHeight || 50)}px`;
+        tr.innerHTML = `<td colspan="${columns}" class="p-0 border-0"></td>`;
+        return tr;
+    }
+
+    function row(image) {
+        const tr = document.createElement("tr");
+        if (image === undefined) {
+            tr.innerHTML = `<td colspan="${columns}" class="text-muted">&hellip;</td>`;
+            return tr;
+        }
+
+        const slash = image.lastIndexOf("/");
+        const repository = image.slice(0, Math.max(slash, 0));
+        tr.innerHTML = `
+            <td>
+                <a href="/_/${image}" class="text-decoration-none text-nowrap fw-bold">${image.slice(slash + 1)}</a>
+                <div class="small text-muted text-nowrap pe-none">${image}</div>
+            </td>
+            <td>${repository ? `<a href="/r/${repository}" class="text-body text-nowrap">${repository}</a>` : " "}</td>`;
+        if (marks) {
+            tr.insertCell().append(markToBadge(imageMark(image), {
+                tooltip: {
+                    "data-bs-placement": "right"
+                }
+            }));
+        }
+        return tr;
+    }
+
+    function load(block) {
+        if (state.blocks.has(block)) return;
+        state.blocks.set(block, null);
+
+        const generation = state.generation;
+        $.ajax({
+            url: "/catalog",
+            type: "GET",
+            data: {
+                repository: repository,
+                q: state.query,
+                sort: state.sort,
+                offset: block * blockSize,
+                limit: blockSize
+            },
+            success: function (data) {
+                if (generation !== state.generation) return;
+                state.total = data.total;
+                state.blocks.set(block, data.repositories);
+                state.range = null;
+                schedule();
+            },
+            error: function (xhr) {
+                // the catalog index is not available: the server shows the paged table
+                if (xhr.status === 503) return window.location.reload();
+                if (generation === state.generation) state.blocks.delete(block);
+            }
+        });
+    }
+
+    function render() {
+        state.frame = null;
+
+        const rowHeight = state.rowHeight || 50;
+        const first = Math.min(Math.max(Math.floor(scroll.scrollTop / rowHeight) - overscan, 0), state.total);
+        const last = Math.min(first + Math.ceil(scroll.clientHeight / rowHeight) + 2 * overscan, state.total);
+
+        for (let block = Math.floor(first / blockSize); block * blockSize < last; block++) load(block);
+        if (state.range === `${first}:${last}`) return;
+        state.range = `${first}:${last}`;
+
+        tbody.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(el => bootstrap.Tooltip.getInstance(el)?.dispose());
+        const rows = [spacer(first)];
+        for (let i = first; i < last; i++) {
+            const names = state.blocks.get(Math.floor(i / blockSize));
+            rows.push(row(names ? names[i % blockSize] : undefined));
+        }
+        rows.push(spacer(state.total - last));
+        tbody.replaceChildren(...rows);
+        tooltip();
+
+        // rows have the same height: measure it once and render again
+        if (!state.rowHeight && last > first && rows[1].offsetHeight) {
+            state.rowHeight = rows[1].offsetHeight;
+            state.range = null;
+            schedule();
+        }
+    }
+
+    function schedule() {
+        if (state.frame === null) state.frame = requestAnimationFrame(render);
+    }
+
+    function reset() {
+        state.generation++;
+        state.blocks.clear();
+        state.range = null;
+        scroll.scrollTop = 0;
+        repositories_dom.querySelectorAll("th[data-sort] i").forEach(icon => {
+            const key = icon.parentElement.dataset.sort;
+            icon.className = "fa" + (state.sort === key ? " fa-sort-up" : state.sort === `-${key}` ? " fa-sort-down" : "");
+        });
+        load(0);
+    }
+
+    repositories_dom.querySelectorAll("th[data-sort]").forEach(th => {
+        th.onclick = () => {
+            const key = th.dataset.sort;
+            state.sort = state.sort === key ? `-${key}` : key;
+            reset();
+        };
+    });
+
+    let timer;
+    const filter_dom = document.getElementById("filter");
+    if (filter_dom) {
+        filter_dom.onkeyup = () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                if (filter_dom.value === state.query) return;
+                state.query = filter_dom.value;
+                reset();
+            }, 250);
+        };
+    }
+
+    scroll.addEventListener("scroll", schedule, { passive: true });
+    window.addEventListener("resize", schedule);
+    reset();
+}
+
+
 /**
  * Fetches and displays the broadcast message.
  */
@@ -95,18 +272,21 @@ function viewBroadcast() {
     $.ajax({
         url: `/broadcast`,
         type: "GET",
-        cache: false,
         async: true,
-        success: function (raw) {
-            if (!raw) return;
+        success: function (data) {
+            if (!data || !data.markdown) return;
 
-            const converter = new showdown.Converter({
-                tables: true,
-                tasklists: true,
-                simplifiedAutoLink: true
-            });
-
-            broadcast.innerHTML = converter.makeHtml(raw);
+            // HTML is rendered by the server if the markdown package is installed
+            if (data.html) {
+                broadcast.innerHTML = data.html;
+            } else {
+                const converter = new showdown.Converter({
+                    tables: true,
+                    tasklists: true,
+                    simplifiedAutoLink: true
+                });
+                broadcast.innerHTML = converter.makeHtml(data.markdown);
+            }
             broadcastTitle.innerText = broadcast.innerText.split("\n")[0];
             hljs.highlightAll();
         }
@@ -0,0 +1,272 @@
+import json
+import os
+import re
+import secrets
+import typing as t
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter_ns
+from time import time_ns
+
+from flask import has_request_context
+from flask import request
+
+from drui import __version__
+from drui.common.config import ConfigParser
+from drui.common.logging import get_logger
+
+log = get_logger(__name__)
+
+# W3C trace context header
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+# OpenTelemetry span kinds
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+
+def attribute(key: str, value: t.Any) -> t.Dict[str, t.Any]:
+    """
+    Return span attribute in OTLP JSON format.
+    """
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Span:
+    """
+    Timed operation of a request.
+    """
+
+    def __init__(self, trace: t.Optional['Trace'], name: str,
+                 kind: str = 'internal',
+                 attributes: t.Optional[t.Dict[str, t.Any]] = None,
+                 span_id: t.Optional[str] = None) -> None:
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.span_id = span_id or secrets.token_hex(8)
+        self.error = False
+        self.start = trace.now() if trace else 0
+        self.end: t.Optional[int] = None
+
+    def finish(self) -> None:
+        """
+        Stop the span and add it to the trace.
+        """
+        if self.trace is None or self.end is not None:
+            return
+        self.end = self.trace.now()
+        self.trace.spans.append(self)
+
+    @property
+    def duration(self) -> float:
+        """
+        Return span duration in milliseconds.
+        """
+        return ((self.end or self.start) - self.start) / 1e6
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        """
+        Return span in OTLP JSON format.
+        """
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': SPAN_KINDS[self.kind],
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or self.start),
+            'attributes': [attribute(k, v)
+                           for k, v in self.attributes.items()],
+            'status': {'code': 2 if self.error else 0},
+        }
+        parent = self.trace.parent_id if self.kind == 'server' \
+            else self.trace.root.span_id
+        if parent:
+            data['parentSpanId'] = parent
+        return data
+
+
+class Trace:
+    """
+    Spans of a request: the request span and its children
+    (registry calls, template rendering).
+    """
+
+    def __init__(self, name: str, traceparent: t.Optional[str] = None,
+                 attributes: t.Optional[t.Dict[str, t.Any]] = None) -> None:
+        match = TRACEPARENT_RE.match(traceparent or '')
+        self.trace_id = match.group(1) if match else secrets.token_hex(16)
+        self.parent_id = match.group(2) if match else None
+        self.spans: t.List[Span] = []
+
+        # wall clock start, monotonic durations
+        self._start_ns = time_ns()
+        self._start_counter = perf_counter_ns()
+        self.root = Span(self, name, 'server', attributes)
+
+    def now(self) -> int:
+        """
+        Return current time in nanoseconds since the epoch.
+        """
+        return self._start_ns + perf_counter_ns() - self._start_counter
+
+    def timings(self) -> t.Dict[str, t.Tuple[float, int]]:
+        """
+        Return total duration (ms) and number of spans by name.
+        """
+        result: t.Dict[str, t.Tuple[float, int]] = {}
+        for span in self.spans:
+            if span is self.root:
+                continue
+            duration, count = result.get(span.name, (0.0, 0))
+            result[span.name] = (duration + span.duration, count + 1)
+        return result
+
+    def server_timing(self) -> str:
+        """
+        Return value of the Server-Timing header.
+        """
+        items = [
+            f'{name};dur={duration:.1f}' +
+            (f';desc="{count} calls"' if count > 1 else '')
+            for name, (duration, count) in self.timings().items()
+        ]
+        items.append(f'total;dur={self.root.duration:.1f}')
+        return ', '.join(items)
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        """
+        Return trace in OTLP JSON format (ExportTraceServiceRequest).
+        """
+        return {'resourceSpans': [{
+            'resource': {'attributes': [attribute('service.name', 'drui')]},
+            'scopeSpans': [{
+                'scope': {'name': 'drui', 'version': __version__},
+                'spans': [x.to_dict() for x in self.spans],
+            }],
+        }]}
+
+
+class Tracer:
+    """
+    Recorder of request spans.
+
+    Spans are kept in the WSGI environment of the request (shared with
+    copies of the request context in threads). Traces are returned in
+    the Server-Timing header, optionally as the JSON answer of a request
+    (debug) and written as OTLP JSON lines to a file.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.server_timing = True
+        self.debug = False
+        self.path: t.Optional[str] = None
+        self._fd: t.Optional[int] = None
+        self._pid: t.Optional[int] = None
+        self._lock = Lock()
+
+    def configure(self, conf: ConfigParser) -> None:
+        """
+        Read tracing options.
+
+        :param conf: configuration
+        """
+        self.enabled = conf.getboolean('enabled', 'tracing', default=False)
+        self.server_timing = conf.getboolean('server_timing', 'tracing',
+                                             default=True)
+        self.debug = conf.getboolean('debug', 'tracing', default=False)
+        self.path = conf.get('path', 'tracing')
+        self._pid = None
+
+    @staticmethod
+    def current() -> t.Optional[Trace]:
+        """
+        Return trace of the current request.
+        """
+        if not has_request_context():
+            return None
+        return request.environ.get('drui.trace')
+
+    def start(self) -> t.Optional[Trace]:
+        """
+        Start trace of the current request.
+        """
+        if not self.enabled:
+            return None
+
+        rule = request.url_rule
+        trace = request.environ['drui.trace'] = Trace(
+            f'{request.method} {rule.rule if rule else request.path}',
+            request.headers.get('traceparent'),
+            {'http.request.method': request.method,
+             'url.path': request.path})
+        return trace
+
+    def start_span(self, name: str, kind: str = 'internal',
+                   trace: t.Optional[Trace] = None,
+                   **attributes: t.Any) -> Span:
+        """
+        Start span of the current request (not recorded without trace).
+
+        :param name: span name
+        :param kind: internal, server or client
+        :param trace: trace of the request outside of its context
+            (e.g. in an event loop), default: trace of the current request
+        :param attributes: span attributes
+        """
+        if not self.enabled:
+            trace = None
+        elif trace is None:
+            trace = self.current()
+        return Span(trace, name, kind, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal',
+             trace: t.Optional[Trace] = None,
+             **attributes: t.Any) -> t.Iterator[Span]:
+        """
+        Record span of the current request.
+
+        :param name: span name
+        :param kind: internal, server or client
+        :param trace: trace of the request (see start_span())
+        :param attributes: span attributes
+        """
+        span = self.start_span(name, kind, trace, **attributes)
+        try:
+            yield span
+        except Exception:
+            span.error = True
+            raise
+        finally:
+            span.finish()
+
+    def export(self, trace: Trace) -> None:
+        """
+        Append trace to the export file as an OTLP JSON line.
+
+        :param trace: finished trace
+        """
+        if not self.path:
+            return
+
+        line = json.dumps(trace.to_dict(), separators=(',', ':')) + '\n'
+        try:
+            with self._lock:
+                if self._pid != os.getpid():
+                    # one append-only descriptor per worker process
+                    self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND |
+                                       os.O_CREAT, 0o644)
+                    self._pid = os.getpid()
+            os.write(self._fd, line.encode('utf-8'))
+        except OSError as error:
+            log.warning(f'Trace export failed: {error}')
+
+
+TRACER = Tracer()
@@ -3,7 +3,9 @@
 # https://distribution.github.io/distribution/spec/api/
 
 import typing as t
+from hashlib import sha256
 from json import loads
+from glob import glob
 from multiprocessing import Process
 from os.path import exists
 from time import sleep
@@ -15,10 +17,12 @@ from requests.exceptions import ConnectionError
 
 
 class RegistryServer:
-    def __init__(self, port: int = 5432, auth: bool = False):
+    def __init__(self, port: int = 5432, auth: t.Union[bool, str] = False,
+                 repositories: t.Optional[t.List[str]] = None):
         """
         :param port: port for listening
-        :param auth: enable authentication
+        :param auth: enable authentication ('bearer': token authentication)
+        :param repositories: catalog content
         """
         self.process = None
         self.protocol = 'http'
@@ -26,11 +30,14 @@ class RegistryServer:
         self.port = port
         self.endpoint = f'{self.protocol}://{self.host}:{self.port}'
         self.auth = auth
+        self.repositories = sorted(repositories or ['docker.io/distribution'])
+        self.tokens = set()
         self.app = flask.Flask(__name__)
 
         # API rules
         self.app.before_request(self.check_auth)
 
+        self.app.add_url_rule('/token', view_func=self.token)
         self.app.add_url_rule('/v2/', view_func=self.base)
         self.app.add_url_rule('/v2/_catalog', view_func=self.catalog)
         self.app.add_url_rule('/v2/<path:image>/tags/list', view_func=self.tags)
@@ -92,21 +99,56 @@ class RegistryServer:
         """
         Check request for auth credentials.
         """
-        if self.auth and 'Authorization' not in flask.request.headers:
+        if self.auth == 'bearer' and flask.request.path != '/token':
+            header = flask.request.headers.get('Authorization', '')
+            if header.split(' ')[-1] not in self.tokens:
+                challenge = f'Bearer realm="{self.endpoint}/token",service="mock"'
+                return self.response(status_code=401, headers={'Www-Authenticate': challenge})
+        elif self.auth and 'Authorization' not in flask.request.headers:
             return self.response(status_code=401, headers={'Www-Authenticate': 'Basic realm=""'})
         return None
 
+    def token(self):
+        """
+        Token service: issue a token to a user with credentials.
+        """
+        auth = flask.request.authorization
+        if auth is None or not auth.password:
+            return self.response(status_code=401, headers={'Www-Authenticate': 'Basic realm="token"'})
+        token = sha256(f'{auth.username}:{len(self.tokens)}'.encode()).hexdigest()
+        self.tokens.add(token)
+        return self.response({'token': token, 'expires_in': 300})
+
     def base(self):
         """
         API version check.
         """
         return self.response()
 
+    def paginate(self, uri: str, key: str, entries: t.List[str]) -> flask.Response:
+        """
+        Return page of entries (n, last parameters and Link header).
+
+        :param uri: URI of list
+        :param key: name of the list in the response
+        :param entries: sorted entries
+        :return: page of entries
+        """
+        last = flask.request.args.get('last', '')
+        n = flask.request.args.get('n', type=int)
+
+        entries = [x for x in entries if x > last]
+        headers = {}
+        if n is not None and len(entries) > n:
+            entries = entries[:n]
+            headers['Link'] = f'<{uri}?last={entries[-1]}&n={n}>; rel="next"'
+        return self.response({key: entries}, headers=headers)
+
     def catalog(self) -> flask.Response:
         """
         Return list of repositories.
         """
-        return self.response({'repositories': ['docker.io/distribution']})
+        return self.paginate('/v2/_catalog', 'repositories', self.repositories)
 
     def tags(self, image: str) -> flask.Response:
         """
@@ -118,7 +160,9 @@ class RegistryServer:
         path = f'tests/data/repositories/{image}/tags.json'
         if not exists(path):
             return self.response(status_code=404)
-        return self._read_json_file(path)
+        with open(path, 'r') as file:
+            tags = sorted(loads(file.read()).get('tags', []))
+        return self.paginate(f'/v2/{image}/tags/list', 'tags', tags)
 
     def manifest(self, image: str, digest: str) -> flask.Response:
         """
@@ -139,13 +183,37 @@ class RegistryServer:
             path = f'tests/data/repositories/{image}/{digest}/v1.json'
         if m_v2 in accept:
             path = f'tests/data/repositories/{image}/{digest}/v2.json'
+        if m_index in accept and exists(f'tests/data/repositories/{image}/{digest}/index.json'):
+            path = f'tests/data/repositories/{image}/{digest}/index.json'
+
+        data = self.find_by_digest(image, digest)
+        if data is None:
+            if not exists(path):
+                return self.response(status_code=404)
+            with open(path, 'rb') as file:
+                data = file.read()
+
+        digest = 'sha256:' + sha256(data).hexdigest()
+        headers = {'Docker-Content-Digest': digest, 'Etag': f'"{digest}"'}
+        if flask.request.headers.get('If-None-Match') == f'"{digest}"':
+            return flask.Response(status=304, headers=headers)
+        return flask.Response(data, headers=headers, content_type='application/json')
 
-        if not exists(path):
-            return self.response(status_code=404)
+    @staticmethod
+    def find_by_digest(image: str, digest: str) -> t.Optional[bytes]:
+        """
+        Return manifest content by digest.
 
-        data = self._read_json_file(path).json
-        digest = data.get('config', {}).get('digest')
-        return self.response(data, headers={'Docker-Content-Digest': digest})
+        :param image: image name
+        :param digest: content digest
+        :return: manifest content or None
+        """
+        for path in glob(f'tests/data/repositories/{image}/*/*.json'):
+            with open(path, 'rb') as file:
+                data = file.read()
+            if digest == 'sha256:' + sha256(data).hexdigest():
+                return data
+        return None
 
     def blob(self, image: str, digest: str):
         """
@@ -169,9 +237,7 @@ class RegistryServer:
         :param digest: content digest
         :return:
         """
-        short_digest = digest.replace('sha256:', '')[:12]
-        path = f'tests/data/blobs/{short_digest}.json'
-        if not exists(path):
+        if self.find_by_digest(image, digest) is None:
             return self.response(status_code=404)
         return self.response(f'{image}:{digest} successfully deleted')
     
\ No newline at end of file
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+pytest.importorskip('httpx')
+
+# configuration with the asynchronous registry client
+async_config = {'DRUI_REGISTRY_ASYNC': 'true'}
+
+
+@pytest.mark.parametrize('config', [async_config], indirect=True)
+@pytest.mark.parametrize('image', ['docker.io/distribution',
+                                   'docker.io/multiarch'])
+def test_async_image_tag(config, app, client, image):
+    """
+    Test that the image page is the same with the asynchronous client.
+    """
+    url = f'/_/{image}/tags/latest'
+    response = client.get(url, query_string={'format': 'json'})
+    assert response.status_code == 200
+
+    expected = app.registry.manifest(image, 'latest')
+    assert response.json['manifest'] == expected
+    assert response.json['tags'] == app.registry.tags(image)
+
+
+@pytest.mark.parametrize('config', [async_config], indirect=True)
+def test_async_image_summary(config, client):
+    """
+    Test the batch tag summary endpoint with the asynchronous client.
+    """
+    response = client.post('/_/docker.io/distribution/summary',
+                           data={'tags[]': ['latest', 'missing']})
+    lines = {x['tag']: x for x in map(json.loads, response.text.splitlines())}
+
+    assert lines['missing'] == {'tag': 'missing', 'error': 'not found'}
+    assert lines['latest']['size'] == 10421143
+    assert lines['latest']['platforms'] == ['linux/amd64']
+
+
+@pytest.mark.parametrize('config', [async_config], indirect=True)
+def test_async_engine(config, app, client):
+    """
+    Test that coroutines of all requests run in one event loop.
+    """
+    async_registry = app.async_registry
+    loop = async_registry.engine.loop
+    client.get('/_/docker.io/distribution/tags/latest').close()
+    assert async_registry.engine.loop is loop
+    assert list(async_registry._clients) == [loop]
+
+
+@pytest.mark.parametrize('config', [async_config], indirect=True)
+@pytest.mark.parametrize('client', [{'auth': 'bearer'}], indirect=True)
+def test_async_token_auth(config, client):
+    """
+    Test that the asynchronous client sends Bearer tokens of the user.
+    """
+    client.post('/login', data={'username': 'u', 'password': 'p'}).close()
+    response = client.post('/_/docker.io/distribution/summary',
+                           data={'tags[]': ['latest']})
+    line = json.loads(response.text)
+    assert line['size'] == 10421143
+
+
+@pytest.mark.parametrize('config', [async_config], indirect=True)
+def test_async_response_cache(config, app, client):
+    """
+    Test that responses of the asynchronous client are cached.
+    """
+    client.get('/_/docker.io/distribution/tags/latest').close()
+    hits = app.registry.responses.stats()['hits']
+    client.get('/_/docker.io/distribution/tags/latest').close()
+    assert app.registry.responses.stats()['hits'] > hits
+
+
+@pytest.mark.parametrize('config', [{**async_config,
+                                     'DRUI_TRACING_ENABLED': 'true',
+                                     'DRUI_TRACING_DEBUG': 'true'}],
+                         indirect=True)
+def test_async_tracing(config, client):
+    """
+    Test that registry calls of the asynchronous client are traced.
+    """
+    response = client.get('/_/docker.io/distribution/tags/latest?trace')
+    spans = response.json['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert {'tags', 'manifest'} <= {x['name'] for x in spans}
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import sleep
+
+from drui.common.cache import ContentCache
+from drui.common.cache import DiskCache
+from drui.common.cache import LRUCache
+from drui.common.cache import ResponseCache
+
+
+def test_lru_get_set():
+    """
+    Test the LRU cache get/set functionality.
+    """
+    cache = LRUCache(max_size=10)
+    assert cache.get('key') is None
+    cache.set('key', b'value')
+    assert cache.get('key') == b'value'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_lru_eviction():
+    """
+    Test that the LRU cache is bounded by the size of values.
+    """
+    cache = LRUCache(max_size=10)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    cache.get('a')
+    cache.set('c', b'12345')
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.size == 10
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_too_large():
+    """
+    Test that values larger than the cache are not saved.
+    """
+    cache = LRUCache(max_size=1)
+    cache.set('key', b'value')
+    assert 'key' not in cache
+
+
+def test_lru_delete_matching():
+    """
+    Test deletion of the values of matching keys.
+    """
+    cache = LRUCache(max_size=100)
+    cache.set(('a', 1), b'12345')
+    cache.set(('a', 2), b'12345')
+    cache.set(('b', 1), b'12345')
+
+    assert cache.delete_matching(lambda key: key[0] == 'a') == 2
+    assert ('b', 1) in cache
+    assert len(cache) == 1
+    assert cache.size == 5
+
+
+def test_disk_cache(tmp_path):
+    """
+    Test the on-disk cache shared between instances.
+    """
+    DiskCache(str(tmp_path)).set('key', b'value')
+    assert DiskCache(str(tmp_path)).get('key') == b'value'
+    assert DiskCache(str(tmp_path)).get('missing') is None
+
+
+def test_disk_cache_eviction(tmp_path):
+    """
+    Test that the least recently used values are removed from the overfilled
+    on-disk cache.
+    """
+    cache = DiskCache(str(tmp_path), max_size=100)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.set(key, b'x' * 30)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    assert cache.evictions == 0
+
+    assert cache.get('a') == b'x' * 30
+    cache.set('d', b'x' * 30)
+    assert cache.evictions == 1
+    assert cache.get('b') is None
+    assert all(cache.get(key) for key in ['a', 'c', 'd'])
+
+    # overfilled by other processes
+    for i, key in enumerate(['a', 'c', 'd']):
+        os.utime(cache._path(key), (2000 + i, 2000 + i))
+    cache.max_size = 40
+    assert cache.evict() == 2
+    assert cache.get('d') == b'x' * 30
+
+
+def test_content_cache_disk_tier(tmp_path):
+    """
+    Test that the in-memory tier is filled from the on-disk tier.
+    """
+    ContentCache(max_size=100, path=str(tmp_path)).set('key', b'value')
+
+    cache = ContentCache(max_size=100, path=str(tmp_path))
+    assert cache.get('key') == b'value'
+    assert cache.get('key') == b'value'
+    assert cache.get('missing') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['disk_hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_response_cache_stale():
+    """
+    Test that stale values are returned and refreshed in background.
+    """
+    refreshes = []
+    cache = ResponseCache(max_size=100, submit=refreshes.append)
+
+    assert cache.get('key', lambda: b'1', ttl=0, stale=60) == b'1'
+    assert cache.get('key', lambda: b'2', ttl=0, stale=60) == b'1'
+    assert len(refreshes) == 1 and cache.stats()['stale_hits'] == 1
+
+    refreshes.pop()()
+    assert cache.get('key', lambda: b'3', ttl=0, stale=60) == b'2'
+    assert cache.get('key', lambda: b'4', ttl=0, stale=0) == b'4'
+
+
+def test_response_cache_coalescing():
+    """
+    Test that concurrent loads of the same key are coalesced.
+    """
+    cache = ResponseCache(max_size=100, submit=lambda func: func())
+    release = Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return b'value'
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get, 'key', load, 60)
+                   for _ in range(8)]
+        sleep(0.2)
+        release.set()
+        assert [x.result() for x in futures] == [b'value'] * 8
+
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 7
+
+
+def test_response_cache_async():
+    """
+    Test that concurrent loads by coroutines are coalesced and stale
+    values are refreshed by a task of the event loop.
+    """
+    cache = ResponseCache(max_size=100, submit=lambda func: func())
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return b'%d' % len(calls)
+
+    async def main():
+        values = await asyncio.gather(*[
+            cache.get_async('key', load, ttl=0, stale=60) for _ in range(4)])
+        assert values == [b'1'] * 4
+        assert await cache.get_async('key', load, ttl=0, stale=60) == b'1'
+        await asyncio.sleep(0.2)
+        assert await cache.get_async('key', load, ttl=0, stale=60) == b'2'
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert len(calls) == 3
+    assert cache.stats()['coalesced'] == 3
+    assert cache.stats()['stale_hits'] == 2
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+
+import pytest
+from werkzeug import Response
+from werkzeug.test import Client
+
+from drui.middleware.compress import Compress
+
+# body of the test WSGI application
+body = b'{"tags": ["latest"]}' * 100
+
+
+def wsgi_app(environ, start_response):
+    response = Response(body, mimetype='application/json')
+    response.set_etag('etag')
+    return response(environ, start_response)
+
+
+def test_compress_gzip(client):
+    """
+    Test gzip compression of HTML pages.
+    """
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].startswith('W/')
+    assert b'<html' in gzip.decompress(response.data)
+
+
+def test_compress_brotli(client):
+    """
+    Test that brotli is preferred if it is installed.
+    """
+    brotli = pytest.importorskip('brotli')
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert b'<html' in brotli.decompress(response.data)
+
+
+def test_compress_not_accepted(client):
+    """
+    Test responses to clients without compression support.
+    """
+    response = client.get('/')
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    response = client.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_not_modified(client):
+    """
+    Test revalidation of compressed responses.
+    """
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.get('/', headers=headers)
+    headers['If-None-Match'] = response.headers['ETag']
+
+    response = client.get('/', headers=headers)
+    assert response.status_code == 304
+
+
+def test_compress_stream(client):
+    """
+    Test that streamed responses are not compressed.
+    """
+    response = client.post('/_/docker.io/distribution/summary',
+                           data={'tags[]': ['latest']},
+                           headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data)['tag'] == 'latest'
+
+
+@pytest.mark.parametrize('config', [{'DRUI_COMPRESSION_ENABLED': 'false'}],
+                         indirect=True)
+def test_compress_disabled(config, client):
+    """
+    Test disabling compression.
+    """
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_min_size():
+    """
+    Test that small responses are not compressed.
+    """
+    client = Client(Compress(wsgi_app, min_size=len(body) + 1))
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == body
+
+
+def test_compress_cache(monkeypatch):
+    """
+    Test that compressed bodies are reused by ETag.
+    """
+    app = Compress(wsgi_app, use_brotli=False, cache_size=1024)
+    calls = []
+    encode = app._encode
+    monkeypatch.setattr(app, '_encode',
+                        lambda *args: calls.append(args) or encode(*args))
+
+    client = Client(app)
+    for _ in range(3):
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert gzip.decompress(response.data) == body
+
+    assert len(calls) == 1
+    assert app.cache.stats()['hits'] == 2
@@ -103,6 +103,33 @@ def test_test_getint_default(config):
     assert value == 123
 
 
+def test_getfloat(config):
+    """
+    Test the getfloat functionality.
+    """
+    config.set('option', '1.5', 'section')
+    value = config.getfloat('option', 'section')
+    assert value == 1.5
+
+
+@pytest.mark.parametrize('set_value', ['string', 'true', '1.5_string'])
+def test_getfloat_filtered(config, set_value):
+    """
+    Test the getfloat functionality with non-float values.
+    """
+    config.set('option', set_value, 'section')
+    value = config.getfloat('option', 'section')
+    assert value is None
+
+
+def test_getfloat_default(config):
+    """
+    Test the getfloat functionality with a default value.
+    """
+    value = config.getfloat('option', 'section', default=1.5)
+    assert value == 1.5
+
+
 def test_getlist(config):
     """
     Test the getlist functionality.
@@ -137,3 +164,68 @@ def test_getlist_multiline(config):
     config.set('option', '1, 2,\n3, 4', 'section')
     value = config.getlist('option', 'section')
     assert value == ['1', '2', '3', '4']
+
+
+def test_digest(config, monkeypatch):
+    """
+    Test that the digest changes with options and environment variables.
+    """
+    digest = config.digest()
+    assert digest == config.digest()
+
+    config.set('option', 'value', 'section')
+    assert config.digest() != digest
+
+    digest = config.digest()
+    monkeypatch.setenv('DRUI_SECTION_OPTION', 'other')
+    assert config.digest() != digest
+
+
+@pytest.mark.parametrize('method, value', [
+    ('get', 'value'), ('getboolean', 'yes'), ('getboolean', 'string'),
+    ('getint', '123'), ('getint', 'string'), ('getfloat', '1.5'),
+    ('getlist', '1, 2,\n3'), ('getlist', ''),
+])
+def test_snapshot(config, method, value):
+    """
+    Test that the snapshot returns the same values as the parser.
+    """
+    config.set('option', value, 'section')
+    settings = config.snapshot()
+
+    for default in (None, 'default'):
+        assert getattr(settings, method)('option', 'section', default) == \
+            getattr(config, method)('option', 'section', default)
+    assert getattr(settings, method)('missing', 'section', 'default') == \
+        getattr(config, method)('missing', 'section', 'default')
+
+
+def test_snapshot_immutable(config, monkeypatch):
+    """
+    Test that the snapshot does not change with the environment.
+    """
+    monkeypatch.setenv('DRUI_SECTION_OPTION', 'value')
+    settings = config.snapshot()
+    assert settings.get('option', 'section') == 'value'
+    assert settings.digest() == config.digest()
+
+    monkeypatch.setenv('DRUI_SECTION_OPTION', 'other')
+    assert settings.get('option', 'section') == 'value'
+    assert config.snapshot().get('option', 'section') == 'other'
+
+    with pytest.raises(TypeError):
+        settings.set('option', 'value', 'section')
+
+
+def test_reload(config, tmp_path):
+    """
+    Test reading the configuration files again.
+    """
+    path = tmp_path / 'config.cfg'
+    path.write_text('[section]\noption = first\n')
+    config.read(str(path))
+    assert config.get('option', 'section') == 'first'
+
+    path.write_text('[section]\noption = second\n')
+    assert config.reload() == [str(path)]
+    assert config.snapshot().get('option', 'section') == 'second'
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from drui.index import CatalogIndex
+
+catalog = [f'docker.io/app{i}' for i in range(5)] + ['quay.io/app']
+
+index_config = {
+    'DRUI_INDEX_ENABLED': 'true',
+    'DRUI_INDEX_REFRESH_INTERVAL': '3600',
+    'DRUI_REGISTRY_CATALOG_PAGE_SIZE': '2',
+}
+
+
+@pytest.fixture
+def index(app, client):
+    """
+    Return refreshed catalog index.
+    """
+    app.index.refresh()
+    yield app.index
+    app.index.stop()
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_find(config, client, index):
+    """
+    Test prefix lookups and substring search.
+    """
+    assert index.available()
+    assert index.find() == catalog
+    assert index.find('docker.io/', offset=1, limit=2) == catalog[1:3]
+    assert index.find('quay') == ['quay.io/app']
+    assert index.find('', 'APP4') == ['docker.io/app4']
+    assert index.find('missing') == []
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_count(config, client, index):
+    """
+    Test per-namespace counts.
+    """
+    assert index.count() == 6
+    assert index.count('docker.io/') == 5
+    assert index.count('quay.io/') == 1
+    assert index.count('gcr.io/') == 0
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_window(config, client, index):
+    """
+    Test sorted and filtered windows of the repository table.
+    """
+    assert index.window(offset=1, limit=2) == (6, catalog[1:3])
+    assert index.window(sort='-name', limit=2) == \
+        (6, ['quay.io/app', 'docker.io/app4'])
+    assert index.window(sort='application', limit=2) == \
+        (6, ['quay.io/app', 'docker.io/app0'])
+    assert index.window('docker.io/', sort='-application', limit=1) == \
+        (5, ['docker.io/app4'])
+    assert index.window(query='APP1') == (1, ['docker.io/app1'])
+    with pytest.raises(ValueError):
+        index.window(sort='size')
+
+
+@pytest.mark.parametrize('config', [{**index_config,
+                                     'DRUI_VIRTUAL_TABLE': 'true'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_virtual_table(config, client, index):
+    """
+    Test that the virtual table page has no image list and its rows
+    are loaded from the catalog endpoint.
+    """
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'const repositories = null;' in response.text
+    assert 'docker.io/app1' not in response.text
+
+    response = client.get('/catalog', query_string={
+        'repository': 'docker.io/', 'sort': '-name', 'offset': 1,
+        'limit': 2})
+    assert response.json == {'total': 5, 'offset': 1,
+                             'repositories': catalog[3:1:-1]}
+
+    response = client.get('/catalog', query_string={'sort': 'size'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('config', [{'DRUI_VIRTUAL_TABLE': 'true'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_catalog_window(config, client):
+    """
+    Test that the virtual table is not used without the index.
+    """
+    response = client.get('/catalog', query_string={'q': 'app'})
+    assert response.status_code == 503
+
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'const repositories = null;' not in response.text
+    assert 'docker.io/app1' in response.text
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_repository_view(config, client, index):
+    """
+    Test the repository endpoint served from the index.
+    """
+    response = client.get('/r/docker.io', query_string={'format': 'json',
+                                                        'limit': 2})
+    assert response.json == catalog[:2]
+    assert response.headers['X-Total-Count'] == '5'
+
+    response = client.get('/', query_string={'format': 'json', 'q': 'app3'})
+    assert response.json == ['docker.io/app3']
+
+
+@pytest.mark.parametrize('config', [{**index_config,
+                                     'DRUI_INDEX_MAX_STALENESS': '0'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_stale_index(config, client, index):
+    """
+    Test that the stale index is not used.
+    """
+    assert not index.available()
+
+    response = client.get('/', query_string={'format': 'json'})
+    assert response.json == catalog
+    assert 'X-Total-Count' not in response.headers
+
+    response = client.get('/catalog')
+    assert response.status_code == 503
+
+
+@pytest.mark.parametrize('config', [{**index_config,
+                                     'DRUI_INDEX_USERNAME': 'u',
+                                     'DRUI_INDEX_PASSWORD': 'p',
+                                     'DRUI_INDEX_SHARED': 'true'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'auth': True}], indirect=True)
+def test_index_auth(config, client, index):
+    """
+    Test that anonymous users never see the catalog requiring auth.
+    """
+    assert index.snapshot.auth_required
+
+    response = client.get('/')
+    assert response.status_code == 401
+
+    client.post('/login', data={'username': 'u', 'password': 'p'})
+    with client:
+        response = client.get('/', query_string={'format': 'json'})
+        assert index.available()
+    assert response.headers['X-Total-Count'] == '1'
+
+
+@pytest.mark.parametrize('config', [{**index_config,
+                                     'DRUI_INDEX_USERNAME': 'u',
+                                     'DRUI_INDEX_PASSWORD': 'p'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'auth': True}], indirect=True)
+def test_index_not_shared(config, client, index):
+    """
+    Test that the catalog requiring auth is not used unless it is shared.
+    """
+    assert index.snapshot.auth_required
+    assert not index.shared
+
+    client.post('/login', data={'username': 'u', 'password': 'p'})
+    with client:
+        response = client.get('/', query_string={'format': 'json'})
+        assert not index.available()
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_shared_index(config, client, app, tmp_path, monkeypatch):
+    """
+    Test that one worker refreshes the index and the others load its
+    snapshot from the shared file.
+    """
+    monkeypatch.setenv('DRUI_INDEX_PATH', str(tmp_path / 'index.json'))
+    first = CatalogIndex(app.registry, config)
+    second = CatalogIndex(app.registry, config)
+
+    assert first._elected()
+    assert not second._elected()
+    assert not second.available()
+
+    first.refresh()
+    with app.test_request_context():
+        assert second.available()
+    assert second.find() == catalog
+    assert second.snapshot.updated_at <= first.snapshot.updated_at
+
+    # the refreshing worker exits, another one takes over
+    first.stop()
+    assert second._elected()
+    second.stop()
+
+
+@pytest.mark.parametrize('config', [index_config], indirect=True)
+def test_index_prepare(config):
+    """
+    Test that the master process passes the index file to the workers.
+    """
+    CatalogIndex.prepare(config)
+    assert os.environ['DRUI_INDEX_PATH'].endswith(
+        f'drui-index-{os.getpid()}.json')
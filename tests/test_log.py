@@ -1,2 +1,89 @@
+import json
+import logging as _logging
+from threading import Event
+
+import pytest
+
+from drui.common import logging
+
+
+@pytest.fixture
+def shared_handler():
+    """
+    Return the shared handler and restore its default output after test.
+    """
+    yield logging.handler
+    target = _logging.StreamHandler()
+    target.setFormatter(logging.RequestFormatter(logging.DEFAULT_FORMAT))
+    logging.handler.configure(target)
+
+
 def test_log_without_ctx(log):
     log.info('')
+
+
+def test_get_logger_once():
+    """
+    Test that the shared handler is added to the logger once.
+    """
+    logger = logging.get_logger('drui.test')
+    assert logging.get_logger('drui.test') is logger
+    assert logger.handlers.count(logging.handler) == 1
+
+
+def test_json_lines(config, shared_handler, tmp_path, monkeypatch):
+    """
+    Test queued JSON-lines output to a file.
+    """
+    path = tmp_path / 'drui.log'
+    monkeypatch.setenv('DRUI_LOGGING_PATH', str(path))
+    monkeypatch.setenv('DRUI_LOGGING_OUTPUT', 'json')
+    monkeypatch.setenv('DRUI_LOGGING_QUEUE', 'true')
+    logging.setup_logging(config)
+
+    log = logging.get_logger('drui.test')
+    log.info('first')
+    log.warning('second')
+    shared_handler.flush()
+
+    lines = [json.loads(x) for x in path.read_text().splitlines()]
+    assert [x['message'] for x in lines] == ['first', 'second']
+    assert lines[1]['level'] == 'WARNING'
+
+
+def test_rotation(config, shared_handler, tmp_path, monkeypatch):
+    """
+    Test log file rotation by size.
+    """
+    path = tmp_path / 'drui.log'
+    monkeypatch.setenv('DRUI_LOGGING_PATH', str(path))
+    monkeypatch.setenv('DRUI_LOGGING_MAX_BYTES', '10')
+    monkeypatch.setenv('DRUI_LOGGING_FORMAT', '%(message)s')
+    monkeypatch.setenv('DRUI_LOGGING_BACKUP_COUNT', '2')
+    logging.setup_logging(config)
+
+    log = logging.get_logger('drui.test')
+    for _ in range(10):
+        log.info('x' * 50)
+
+    assert sorted(x.name for x in tmp_path.iterdir()) == \
+        ['drui.log', 'drui.log.1', 'drui.log.2']
+
+
+def test_queue_full(shared_handler):
+    """
+    Test that records are dropped instead of blocking if the queue is full.
+    """
+    release = Event()
+
+    class SlowHandler(_logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+
+    shared_handler.configure(SlowHandler(), queue_size=1)
+    log = logging.get_logger('drui.test')
+    for _ in range(5):
+        log.info('message')
+
+    assert shared_handler.dropped >= 3
+    release.set()
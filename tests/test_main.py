@@ -0,0 +1,86 @@
+import pytest
+
+from drui import main
+
+
+def test_server_options(config, monkeypatch):
+    """
+    Test default Gunicorn worker options.
+    """
+    monkeypatch.setattr(main, 'cpu_count', lambda: 2)
+    options = main.server_options(config)
+    assert options == {
+        'workers': 5,
+        'threads': 4,
+        'worker_class': 'gthread',
+        'preload_app': False,
+        'keepalive': 5,
+        'timeout': 30,
+        'graceful_timeout': 30,
+        'max_requests': 0,
+        'max_requests_jitter': 0,
+    }
+
+
+@pytest.mark.parametrize('cpus, workers', [(None, 3), (7, 15), (64, 16)])
+def test_server_options_workers(config, monkeypatch, cpus, workers):
+    """
+    Test that the default number of workers is capped.
+    """
+    monkeypatch.setattr(main, 'cpu_count', lambda: cpus)
+    assert main.server_options(config)['workers'] == workers
+
+
+@pytest.mark.parametrize('config', [{
+    'DRUI_WORKERS': '32',
+    'DRUI_THREADS': '1',
+    'DRUI_WORKER_CLASS': 'sync',
+    'DRUI_PRELOAD_APP': 'true',
+    'DRUI_MAX_REQUESTS': '1000',
+}], indirect=True)
+def test_server_options_config(config, monkeypatch):
+    """
+    Test that the configuration overrides the defaults and the cap.
+    """
+    monkeypatch.setattr(main, 'cpu_count', lambda: 64)
+    options = main.server_options(config)
+    assert options['workers'] == 32
+    assert options['threads'] == 1
+    assert options['worker_class'] == 'sync'
+    assert options['preload_app'] is True
+    assert options['max_requests'] == 1000
+
+
+def test_load(config, monkeypatch):
+    """
+    Test that each worker builds the application unless it is preloaded.
+    """
+    built = []
+    monkeypatch.setattr(main, 'init_app',
+                        lambda conf: built.append(conf) or main.app)
+
+    application = main.WSGIApplication(None)
+    assert application.load() is main.app
+    assert application.load() is main.app
+    assert built == [main.CONF]
+
+    application = main.WSGIApplication(main.app)
+    assert application.load() is main.app
+    assert len(built) == 1
+
+
+@pytest.mark.parametrize('config', [{'DRUI_LOGGING_MAX_BYTES': '1024'}],
+                         indirect=True)
+def test_check_server_options(config):
+    """
+    Test that log file rotation is rejected with several workers.
+    """
+    assert main.check_server_options(config, {'workers': 2})
+    assert main.check_server_options(config, {'workers': 1}) is None
+
+
+def test_check_server_options_default(config):
+    """
+    Test that several workers are allowed without log file rotation.
+    """
+    assert main.check_server_options(config, {'workers': 16}) is None
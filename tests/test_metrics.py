@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+from glob import glob
+
+import pytest
+
+from drui.metrics import METRICS
+from drui.metrics import Metrics
+from drui.metrics import call_type
+
+# configuration with enabled metrics
+metrics_config = {'DRUI_METRICS_ENABLED': 'true'}
+
+
+@pytest.mark.parametrize('method, uri, expected', [
+    ('GET', '/v2/', 'ping'),
+    ('GET', '/v2/_catalog?n=100', 'catalog'),
+    ('GET', '/v2/docker.io/app/tags/list', 'tags'),
+    ('HEAD', '/v2/docker.io/app/manifests/latest', 'manifest'),
+    ('DELETE', '/v2/docker.io/app/manifests/sha256:0', 'delete'),
+    ('GET', '/v2/docker.io/app/blobs/sha256:0', 'blob'),
+    ('GET', '/unknown', 'other'),
+])
+def test_call_type(method, uri, expected):
+    """
+    Test classification of registry API calls.
+    """
+    assert call_type(method, uri) == expected
+
+
+def test_metrics_disabled(client):
+    """
+    Test that the metrics endpoint is disabled by default.
+    """
+    response = client.get('/metrics')
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('config', [metrics_config], indirect=True)
+def test_metrics(config, client):
+    """
+    Test request, registry call and cache metrics.
+    """
+    client.get('/').close()
+    client.get('/_/docker.io/distribution/tags/latest').close()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.text
+
+    assert 'drui_http_requests_total{method="GET",route="/",status="200"} 1' \
+        in text
+    assert 'drui_http_request_duration_seconds_count' \
+           '{method="GET",route="/"} 1' in text
+    assert 'drui_registry_requests_total' \
+           '{call="catalog",method="GET",status="200"}' in text
+    assert 'drui_registry_request_duration_seconds_bucket' \
+           '{call="manifest",le="+Inf"}' in text
+    assert 'drui_cache_hit_ratio{cache="content"}' in text
+    assert 'drui_registry_request_header_bytes_total{call="tags"}' in text
+    assert 'drui_http_requests_in_flight 1' in text
+
+
+def worker(config):
+    """
+    Serve one request in a forked worker process and exit.
+    """
+    METRICS.configure(config)
+    METRICS.inc('drui_http_requests_total',
+                {'method': 'GET', 'route': '/', 'status': '200'})
+    METRICS.write()
+
+
+@pytest.mark.parametrize('config', [metrics_config], indirect=True)
+def test_metrics_workers(config, client):
+    """
+    Test aggregation of metrics of several worker processes: workers
+    configured after the master prepared the directory share it and
+    never remove files of other workers.
+    """
+    Metrics.prepare(config)
+    assert os.environ['DRUI_METRICS_PATH'] == METRICS.path
+
+    context = multiprocessing.get_context('fork')
+    for _ in range(2):
+        process = context.Process(target=worker, args=(config,))
+        process.start()
+        process.join(10)
+        assert process.exitcode == 0
+    assert len(glob(os.path.join(METRICS.path, '*.json'))) == 2
+
+    client.get('/').close()
+    text = client.get('/metrics').text
+    assert 'drui_http_requests_total{method="GET",route="/",status="200"} 3' \
+        in text
+    assert 'drui_http_requests_in_flight 1' in text
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import datetime
+from datetime import timezone
+from concurrent.futures import Future
+from time import monotonic
+from time import sleep
+
+import pytest
+from requests import Request
+from requests.cookies import MockRequest
+from requests.cookies import create_cookie
+
+from drui.common.utils import RateLimiter
+from drui.registry import Registry
+from drui.registry import completed_in_window
+from drui.registry import parse_time
+from drui.registry import semver_comparison
+from drui.registry import token_scope
+
+
+@pytest.fixture
+def registry(config):
+    """
+    Return Registry instance.
+
+    :param config: configuration file
+    :return: Registry
+    """
+    yield Registry(config)
+
+
+def test_session_reuse(registry):
+    """
+    Test that the HTTP session is reused between calls.
+    """
+    assert registry.session is registry.session
+
+
+def test_session_after_fork(registry, monkeypatch):
+    """
+    Test that the HTTP session is re-created in a forked process.
+    """
+    session = registry.session
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert registry.session is not session
+
+
+@pytest.mark.parametrize('config', [{
+    'DRUI_REGISTRY_POOL_SIZE': '2',
+    'DRUI_REGISTRY_RETRIES': '0',
+    'DRUI_REGISTRY_CONNECT_TIMEOUT': '1',
+    'DRUI_REGISTRY_READ_TIMEOUT': '2.5',
+    'DRUI_REGISTRY_KEEP_ALIVE': 'false',
+}], indirect=True)
+def test_session_options(config, registry):
+    """
+    Test the connection pool configuration.
+    """
+    adapter = registry.session.get_adapter(registry.registry_endpoint)
+    assert adapter._pool_maxsize == 2
+    assert adapter.max_retries.total == 0
+    assert registry.timeout == (1.0, 2.5)
+    assert registry.session.headers['Connection'] == 'close'
+
+
+def test_session_ignores_cookies(registry):
+    """
+    Test that registry cookies are not shared between users.
+    """
+    request = MockRequest(Request('GET', registry.registry_endpoint).prepare())
+    cookie = create_cookie('name', 'value', domain='localhost')
+    registry.session.cookies.set_cookie_if_ok(cookie, request)
+    assert not registry.session.cookies
+
+
+def test_manifest_cache(app, client):
+    """
+    Test that manifests and config blobs are served from cache.
+    """
+    client.get('/_/docker.io/distribution/tags/latest')
+    stats = app.registry.cache.stats()
+    assert stats['items'] == 2
+
+    client.get('/_/docker.io/distribution/tags/latest')
+    assert app.registry.cache.stats()['hits'] == stats['hits'] + 2
+    assert app.registry.cache.stats()['items'] == 2
+
+
+def test_prefetch_platforms(app, client):
+    """
+    Test that manifests of other platforms are loaded into cache.
+    """
+    response = client.get('/_/docker.io/multiarch/tags/latest',
+                          query_string={'format': 'json'})
+    digest = response.json['manifest']['manifests'][1]['digest']
+
+    key = f'manifests/docker.io/multiarch@{digest}'
+    for _ in range(50):
+        if key in app.registry.cache.memory:
+            break
+        sleep(0.1)
+    assert key in app.registry.cache.memory
+
+
+def test_rate_limiter():
+    """
+    Test the limit of operations per second.
+    """
+    limiter = RateLimiter(rate=100)
+    start = monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert monotonic() - start >= 0.05
+
+
+def test_parse_time():
+    """
+    Test parsing of image creation time.
+    """
+    assert parse_time('2023-10-02T18:09:53.341850461Z') == \
+        datetime(2023, 10, 2, 18, 9, 53, tzinfo=timezone.utc)
+    assert parse_time('2023-10-02T20:09:53+02:00') == \
+        datetime(2023, 10, 2, 18, 9, 53, tzinfo=timezone.utc)
+    assert parse_time('2023-10-02T13:39:53.5-0430') == \
+        datetime(2023, 10, 2, 18, 9, 53, tzinfo=timezone.utc)
+    assert parse_time('2023-10-02T18:09:53') == \
+        datetime(2023, 10, 2, 18, 9, 53, tzinfo=timezone.utc)
+    assert parse_time('2023-10-02') is None
+    assert parse_time('') is None
+    assert parse_time(None) is None
+
+
+def test_semver_comparison():
+    """
+    Test version-aware tag ordering.
+    """
+    expected = [
+        '0.1.0', 'v0.9', '0.10.0', '1.0', '1.0.0-alpha', '1.0.0-alpha.1',
+        '1.0.0-alpha.beta', '1.0.0-beta.2', '1.0.0-beta.11', '1.0.0-rc.1',
+        '1.0.0', '1.0.0+build.5', '2.0.0', 'alpine', 'alpine3',
+        'alpine3.18', 'dev', 'stable', 'latest',
+    ]
+    assert sorted(reversed(expected), key=semver_comparison) == expected
+
+    # sort keys are flat tuples (no allocation per identifier)
+    for version in expected:
+        assert not any(isinstance(value, (tuple, list))
+                       for value in semver_comparison(version))
+
+
+def test_sort_tags_cache(registry, monkeypatch):
+    """
+    Test that unchanged tag lists are not sorted again.
+    """
+    calls = []
+    key = semver_comparison
+
+    def counted(version):
+        calls.append(version)
+        return key(version)
+
+    monkeypatch.setattr('drui.registry.semver_comparison', counted)
+    tags = ['latest', '1.0.0', '0.1.0']
+
+    assert registry.sort_tags('image', tags) == ['0.1.0', '1.0.0', 'latest']
+    assert registry.sort_tags('image', list(tags)) == \
+        ['0.1.0', '1.0.0', 'latest']
+    assert len(calls) == 3
+
+    registry.sort_tags('image', tags + ['2.0.0'])
+    assert len(calls) == 7
+
+
+def test_completed_in_window():
+    """
+    Test that at most "window" items are running at once.
+    """
+    running = []
+
+    def submit(item):
+        running.append(item)
+        assert len(running) <= 2
+        future = Future()
+        future.set_result(item * 2)
+        return future
+
+    results = []
+    for item, future in completed_in_window(submit, range(5), 2):
+        running.remove(item)
+        results.append(future.result())
+    assert sorted(results) == [0, 2, 4, 6, 8]
+
+
+def test_response_cache(registry, client):
+    """
+    Test that registry responses are cached per user and dropped
+    after changes of the image.
+    """
+    registry.request('GET', '/v2/_catalog', auth=('user', 'password'))
+    registry.request('GET', '/v2/_catalog', auth=('user', 'password'))
+    assert registry.responses.stats()['hits'] == 1
+
+    registry.request('GET', '/v2/_catalog', auth=('other', 'password'))
+    assert registry.responses.stats()['items'] == 2
+
+    registry.request('GET', '/v2/docker.io/distribution/tags/list')
+    registry.request('GET', '/v2/docker.io/multiarch/tags/list')
+    assert registry.responses.stats()['items'] == 4
+
+    # "not found" answers are not cached
+    resp = registry.request('GET', '/v2/docker.io/missing/tags/list')
+    assert resp.status_code == 404
+    assert registry.responses.stats()['items'] == 4
+
+    registry.request('DELETE', '/v2/docker.io/distribution/manifests/'
+                               'sha256:0')
+    assert registry.responses.stats()['items'] == 3
+
+
+def test_token_scope():
+    """
+    Test scopes of tokens required for registry requests.
+    """
+    assert token_scope('GET', '/v2/') == ''
+    assert token_scope('GET', '/v2/_catalog?n=10') == 'registry:catalog:*'
+    assert token_scope('GET', '/v2/a/b/tags/list') == 'repository:a/b:pull'
+    assert token_scope('DELETE', '/v2/a/manifests/sha256:0') == \
+        'repository:a:delete'
+
+
+@pytest.mark.parametrize('client', [{'auth': 'bearer'}], indirect=True)
+def test_bearer_token(registry, client):
+    """
+    Test that Bearer tokens are requested once per user and scope.
+    """
+    auth = ('user', 'password')
+    assert registry.challenge()[0] == 'bearer'
+
+    for _ in range(3):
+        resp = registry.request('HEAD', '/v2/docker.io/distribution/'
+                                        'manifests/latest',
+                                headers=registry.accept, auth=auth)
+        assert resp.status_code == 200
+        resp = registry.request('GET', '/v2/', auth=auth)
+        assert resp.status_code == 200
+    assert registry.tokens.stats()['misses'] == 2
+    assert registry.tokens.stats()['hits'] == 4
+
+    resp = registry.request('GET', '/v2/', auth=None)
+    assert resp.status_code == 401
+
+
+@pytest.mark.parametrize('client', [{'auth': 'bearer'}], indirect=True)
+def test_bearer_challenge(registry, client):
+    """
+    Test that token authentication is discovered by a rejected request
+    and a rejected token is replaced.
+    """
+    auth = ('user', 'password')
+    resp = registry.request('GET', '/v2/', auth=auth)
+    assert resp.status_code == 200
+    assert registry.token_auth
+
+    key = registry._token_key(auth, '')
+    registry.tokens.memory.set(key, ({'token': 'revoked', 'expires_in': 300},
+                                     monotonic() + 300), size=1)
+    resp = registry.request('GET', '/v2/', auth=auth)
+    assert resp.status_code == 200
+    assert registry.tokens.get(key, None, 0)['token'] != 'revoked'
+
+
+def test_forwarded_headers(app, registry, monkeypatch):
+    """
+    Test that only whitelisted user request headers are forwarded.
+    """
+    headers = {'Cookie': 'session=1', 'Accept': 'text/html',
+               'X-Request-Id': '42', 'Authorization': 'Basic dTpw',
+               'User-Agent': 'browser'}
+    with app.test_request_context('/', headers=headers):
+        options = registry.request_options({'headers': {'Accept': 'json'}})
+        assert dict(options['headers']) == {
+            'Accept': 'json', 'X-Request-Id': '42',
+            'Authorization': 'Basic dTpw'}
+        assert registry.forwarded_headers() is registry.forwarded_headers()
+
+    monkeypatch.setenv('DRUI_REGISTRY_FORWARD_HEADERS', 'X-Trace, Cookie')
+    registry = Registry(app.config_parser.snapshot())
+    assert registry.forward_headers == ('X-Trace',)
+    assert registry.session.headers['User-Agent'].startswith('drui/')
@@ -1,17 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import json
 import re
 from collections import defaultdict
 
 import pytest
 from bs4 import BeautifulSoup
 
+from drui.common import utils
+
 # snapshot for URL rules and their corresponding methods
 url_map_snapshot = {
     '/': {'GET', 'HEAD', 'OPTIONS'},
     '/r/<path:name>': {'GET', 'HEAD', 'OPTIONS'},
+    '/catalog': {'GET', 'HEAD', 'OPTIONS'},
     '/_/<path:image>': {'GET', 'HEAD', 'OPTIONS'},
     '/_/<path:image>/tags/<tag>': {'GET', 'HEAD', 'OPTIONS', 'DELETE'},
+    '/_/<path:image>/summary': {'GET', 'HEAD', 'OPTIONS', 'POST'},
+    '/_/<path:image>/tags': {'GET', 'HEAD', 'OPTIONS', 'DELETE'},
+    '/metrics': {'GET', 'HEAD', 'OPTIONS'},
     '/login': {'POST', 'OPTIONS'},
     '/logout': {'GET', 'HEAD', 'OPTIONS'},
     '/broadcast': {'GET', 'HEAD', 'OPTIONS'},
@@ -143,6 +150,73 @@ def test_delete_image_tag(client):
     assert_response(response)
 
 
+def test_delete_image_tags(client):
+    """
+    Test deleting many image tags.
+    """
+    response = client.delete('/_/docker.io/distribution/tags',
+                             data={'tags[]': ['latest', 'missing']})
+    assert_response(response, json_check=True)
+    assert response.json['latest']['status'] == 'deleted'
+    assert response.json['latest']['digest'].startswith('sha256:')
+    assert response.json['missing'] == {'digest': None, 'status': 'not found'}
+
+
+@pytest.mark.parametrize('data, expected', [
+    ({'pattern': 'lat*'}, {'latest'}),
+    ({'pattern': '*.*'}, {'1.0.0-alpha', '0.1.0'}),
+    ({'older_than': 1}, {'latest'}),
+    ({'older_than': 10000}, set()),
+    ({'older_than': 1000000}, set()),
+    ({'pattern': '*.*', 'older_than': 1}, set()),
+])
+def test_delete_image_tags_filter(client, data, expected):
+    """
+    Test selecting image tags for deletion by pattern and age (dry run).
+
+    Only "latest" has a manifest (created 2023-10-02), other tags are
+    selected by the pattern but are not found.
+    """
+    response = client.delete('/_/docker.io/distribution/tags',
+                             data={'dry_run': 'true', **data})
+    assert_response(response, json_check=False)
+    assert set(response.json) == expected
+    for tag, report in response.json.items():
+        assert report['status'] == \
+            ('dry run' if tag == 'latest' else 'not found')
+
+
+def test_delete_image_tags_negative_age(client):
+    """
+    Test that a negative age is rejected (it would select every tag).
+    """
+    response = client.delete('/_/docker.io/distribution/tags',
+                             data={'older_than': -1})
+    assert_response(response, status_code=400)
+    response = client.get('/_/docker.io/distribution/tags/latest')
+    assert response.status_code == 200
+
+
+def test_delete_image_tags_without_filter(client):
+    """
+    Test deleting many image tags without selected tags.
+    """
+    response = client.delete('/_/docker.io/distribution/tags')
+    assert_response(response, status_code=400)
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_DISABLE_DELETE': 'true'}],
+                         indirect=True)
+def test_disable_delete_image_tags(config, client):
+    """
+    Test disabling the deletion of many image tags.
+    """
+    response = client.delete('/_/docker.io/distribution/tags',
+                             data={'tags[]': ['latest']})
+    assert_response(response, status_code=405)
+
+
 @pytest.mark.parametrize('config',
                          [{'DRUI_DISABLE_DELETE': 'true'}],
                          indirect=True)
@@ -172,6 +246,42 @@ def test_login(client):
     assert_response(response, status_code=302)
 
 
+@pytest.mark.parametrize('client', [{'auth': 'bearer'}], indirect=True)
+def test_token_login(client):
+    """
+    Test login to a registry with token authentication.
+    """
+    response = client.get('/')
+    assert_response(response, status_code=401)
+
+    response = client.post('/login', data={'username': 'u', 'password': 'p'})
+    assert_response(response, status_code=302)
+
+    response = client.get('/_/docker.io/distribution/tags/latest')
+    assert_response(response)
+
+
+@pytest.mark.parametrize('client', [{'auth': True}], indirect=True)
+def test_cached_content_access(app, client):
+    """
+    Test that content cached by digest is not served to users who may
+    not read the image.
+    """
+    client.post('/login', data={'username': 'u', 'password': 'p'}).close()
+    response = client.get('/_/docker.io/distribution/tags/latest',
+                          query_string={'format': 'json'})
+    digest = response.json['manifest']['digest']
+
+    def summary(test_client, image):
+        response = test_client.post(f'/_/{image}/summary',
+                                    data={'tags[]': [digest]})
+        return json.loads(response.text)
+
+    assert 'size' in summary(client, 'docker.io/distribution')
+    assert 'size' not in summary(client, 'docker.io/other')
+    assert 'size' not in summary(app.test_client(), 'docker.io/distribution')
+
+
 @pytest.mark.parametrize('client', [{'auth': True}], indirect=True)
 def test_bad_login(client):
     """
@@ -203,6 +313,47 @@ def test_broadcast(config, client):
     """
     response = client.get('/broadcast')
     assert_response(response, json_check=True)
+    assert response.json['markdown'] == 'test broadcast message'
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    etag = response.headers['ETag']
+    response = client.get('/broadcast', headers={'If-None-Match': etag})
+    assert_response(response, status_code=304)
+
+
+def test_broadcast_change(client, tmp_path, monkeypatch):
+    """
+    Test that the cached broadcast message is updated with its file.
+    """
+    from drui.app import reload_config
+
+    path = tmp_path / 'broadcast.md'
+    path.write_text('first message')
+    monkeypatch.setenv('DRUI_BROADCAST_PATH', str(path))
+    reload_config()
+
+    first = client.get('/broadcast')
+    assert first.json['markdown'] == 'first message'
+
+    path.write_text('second message')
+    second = client.get('/broadcast',
+                        headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['markdown'] == 'second message'
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_BROADCAST_PATH': broadcast_path}],
+                         indirect=True)
+def test_broadcast_html(config, client):
+    """
+    Test server-side rendering of the broadcast message.
+    """
+    pytest.importorskip('markdown')
+    response = client.get('/broadcast')
+    assert response.json['html'] == '<p>test broadcast message</p>'
 
 
 @pytest.mark.parametrize('config',
@@ -235,3 +386,215 @@ def test_404_page_json(client):
     """
     response = client.get('/test', data={'format': 'json'})
     assert_response(response, status_code=404, json_check=True)
+
+
+catalog = [f'docker.io/app{i}' for i in range(5)] + ['quay.io/app']
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_REGISTRY_CATALOG_PAGE_SIZE': '2'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_catalog_pagination(config, client):
+    """
+    Test the catalog endpoint with server-side pages.
+    """
+    response = client.get('/', query_string={'format': 'json', 'limit': 4})
+    assert response.json == catalog[:4]
+    assert 'page=2' in response.headers['Link']
+
+    response = client.get('/', query_string={'format': 'json', 'limit': 4,
+                                             'page': 2})
+    assert response.json == catalog[4:]
+    assert 'Link' not in response.headers
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_REGISTRY_CATALOG_PAGE_SIZE': '2',
+                           'DRUI_IMAGES_PER_PAGE': '2'}],
+                         indirect=True)
+@pytest.mark.parametrize('client', [{'repositories': catalog}], indirect=True)
+def test_repository_pagination(config, client):
+    """
+    Test the repository endpoint with server-side pages.
+    """
+    response = client.get('/r/docker.io', query_string={'format': 'json',
+                                                        'page': 3})
+    assert response.json == catalog[4:5]
+
+    response = client.get('/r/quay.io', query_string={'format': 'json'})
+    assert response.json == ['quay.io/app']
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_REGISTRY_TAGS_PAGE_SIZE': '1'}],
+                         indirect=True)
+def test_image_tags_pagination(config, client):
+    """
+    Test reading image tags page by page.
+    """
+    response = client.get('/_/docker.io/distribution/tags/latest',
+                          query_string={'format': 'json'})
+    assert response.json['tags'] == ['0.1.0', '1.0.0-alpha', 'latest']
+    assert response.json['next'] is None
+
+
+def test_image_tags_window(client):
+    """
+    Test windows of the newest image tags.
+    """
+    uri = '/_/docker.io/distribution/tags'
+    response = client.get(uri, query_string={'limit': 2})
+    assert response.json == {'tags': ['1.0.0-alpha', 'latest'],
+                             'next': '1.0.0-alpha'}
+
+    response = client.get(uri, query_string={'limit': 2,
+                                             'cursor': '1.0.0-alpha'})
+    assert response.json == {'tags': ['0.1.0'], 'next': None}
+
+    response = client.get(uri, query_string={'cursor': 'missing'})
+    assert_response(response, status_code=400)
+
+    response = client.get('/_/non-exist/tags')
+    assert_response(response, status_code=404)
+
+
+@pytest.mark.parametrize('uri', ['/', '/_/docker.io/distribution/tags/latest'])
+def test_not_modified(uri, client):
+    """
+    Test conditional requests with ETag.
+    """
+    response = client.get(uri)
+    etag = response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert_response(response)
+
+    response = client.get(uri, headers={'If-None-Match': etag})
+    assert response.headers['ETag'] == etag
+    assert not response.data
+    assert_response(response, status_code=304)
+
+    response = client.get(uri, query_string={'format': 'json'},
+                          headers={'If-None-Match': etag})
+    assert response.headers['ETag'] != etag
+    assert_response(response, json_check=True)
+
+
+@pytest.mark.parametrize('config',
+                         [{'DRUI_REGISTRY_ENDPOINT': 'http://127.0.0.1:1',
+                           'DRUI_REGISTRY_RETRIES': '0'}],
+                         indirect=True)
+def test_registry_unavailable(config, app):
+    """
+    Test errors raised by views when the registry is unavailable.
+    """
+    client = app.test_client()
+    response = client.get('/', query_string={'format': 'json'})
+    assert_response(response, status_code=503, json_check=True)
+
+    response = client.get('/_/docker.io/distribution/tags/latest')
+    assert_response(response, status_code=503)
+
+
+def test_accept_json(client):
+    """
+    Test format negotiation with the Accept header.
+    """
+    headers = {'Accept': 'application/json'}
+    response = client.get('/', headers=headers)
+    assert response.is_json
+
+    response = client.get('/', headers=headers,
+                          query_string={'format': 'html'})
+    assert not response.is_json
+
+    response = client.get('/', headers={'Accept': 'text/html,*/*;q=0.8'})
+    assert not response.is_json
+
+
+def test_request_params_once(app, monkeypatch):
+    """
+    Test that request parameters are parsed once per request.
+    """
+    calls = []
+    init = utils.RequestParams.__init__
+
+    def counted(self):
+        calls.append(self)
+        init(self)
+
+    monkeypatch.setattr(utils.RequestParams, '__init__', counted)
+    with app.test_request_context('/?format=json&q=app'):
+        assert utils.to_json()
+        assert utils.get_params().get('q') == 'app'
+        assert utils.get_params() is utils.get_params()
+    assert len(calls) == 1
+
+    with app.test_request_context('/'):
+        assert utils.get_params().get('q') is None
+    assert len(calls) == 2
+
+
+def test_image_multiarch(client):
+    """
+    Test the image endpoint with multi-arch image.
+    """
+    uri = '/_/docker.io/multiarch/tags/latest'
+    response = client.get(uri, query_string={'format': 'json'})
+    manifest = response.json['manifest']
+    assert len(manifest['manifests']) == 2
+    assert manifest['digest'] == manifest['manifests'][0]['digest']
+
+    digest = manifest['manifests'][1]['digest']
+    response = client.get(uri, query_string={'format': 'json',
+                                             'digest': digest})
+    assert response.json['manifest']['digest'] == digest
+    assert len(response.json['manifest']['layers']) == 2
+
+
+def test_image_summary(client):
+    """
+    Test the batch tag summary endpoint.
+    """
+    response = client.post('/_/docker.io/distribution/summary',
+                           data={'tags[]': ['latest', 'missing']})
+    lines = {x['tag']: x for x in map(json.loads, response.text.splitlines())}
+    assert response.mimetype == 'application/x-ndjson'
+    assert_response(response)
+
+    assert lines['missing'] == {'tag': 'missing', 'error': 'not found'}
+    assert lines['latest']['size'] == 10421143
+    assert lines['latest']['platforms'] == ['linux/amd64']
+    assert lines['latest']['digest'].startswith('sha256:')
+
+
+def test_image_summary_multiarch(client):
+    """
+    Test the batch tag summary endpoint with multi-arch image.
+    """
+    response = client.get('/_/docker.io/multiarch/summary',
+                          query_string={'tags': 'latest'})
+    summary = json.loads(response.text)
+    assert summary['platforms'] == ['linux/amd64', 'linux/arm64']
+
+
+def test_reload_config(client, monkeypatch):
+    """
+    Test that settings change on reload only.
+    """
+    from drui.app import reload_config
+
+    uri = '/_/docker.io/distribution/tags/latest'
+    response = client.get(uri, query_string={'format': 'json'})
+    etag = response.headers['ETag']
+    count = len(response.json['tags'])
+    assert count > 1
+
+    monkeypatch.setenv('DRUI_TAGS_PER_PAGE', '1')
+    response = client.get(uri, query_string={'format': 'json'})
+    assert len(response.json['tags']) == count
+
+    reload_config()
+    response = client.get(uri, query_string={'format': 'json'})
+    assert len(response.json['tags']) == 1
+    assert response.headers['ETag'] != etag
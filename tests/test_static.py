@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import re
+
+import pytest
+
+from drui.middleware.static import StaticFiles
+
+# path to static files
+static_path = 'drui/static'
+
+
+def get_static_url(client, filename):
+    response = client.get('/')
+    match = re.search(rf'/static/{re.escape(filename)}[^"]*', response.text)
+    return match.group(0)
+
+
+def test_static_fingerprint(client):
+    """
+    Test fingerprinted static file URLs in pages.
+    """
+    url = get_static_url(client, 'js/core.')
+    assert re.fullmatch(r'/static/js/core\.[0-9a-f]{10}\.js', url)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    with open(f'{static_path}/js/core.js', 'rb') as f:
+        assert response.data == f.read()
+
+
+def test_static_compressed(client):
+    """
+    Test precompressed static files.
+    """
+    url = get_static_url(client, 'js/core.')
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    with open(f'{static_path}/js/core.js', 'rb') as f:
+        assert gzip.decompress(response.data) == f.read()
+
+    response = client.get(url, headers={'If-None-Match':
+                                        response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_static_original_names(client):
+    """
+    Test that static files are still available by original names.
+    """
+    response = client.get('/static/js/core.js')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    response.close()
+
+    response = client.get('/static/js/core.0000000000.js')
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('config', [{'DRUI_STATIC_FINGERPRINT': 'false'}],
+                         indirect=True)
+def test_static_fingerprint_disabled(config, client):
+    """
+    Test disabling static file fingerprints.
+    """
+    assert get_static_url(client, 'js/core.') == '/static/js/core.js'
+
+
+def test_static_build(tmp_path):
+    """
+    Test writing fingerprinted and precompressed static files.
+    """
+    static_files = StaticFiles(None, static_path)
+    assert static_files.build(str(tmp_path))
+
+    name = static_files.url('js/core.js')
+    for suffix in ('', '.gz'):
+        assert os.path.exists(tmp_path / f'{name}{suffix}')
+    name = static_files.url('images/dark.png')
+    assert not os.path.exists(tmp_path / f'{name}.gz')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from drui.tracing import TRACER
+
+# configuration with enabled tracing
+tracing_config = {'DRUI_TRACING_ENABLED': 'true', 'DRUI_TRACING_DEBUG': 'true'}
+
+# page of the image tag
+image_url = '/_/docker.io/distribution/tags/latest'
+
+
+def span_names(data):
+    spans = data['resourceSpans'][0]['scopeSpans'][0]['spans']
+    return [x['name'] for x in spans]
+
+
+def test_tracing_disabled(client):
+    """
+    Test that tracing is disabled by default.
+    """
+    response = client.get(image_url)
+    assert 'Server-Timing' not in response.headers
+
+
+@pytest.mark.parametrize('config', [tracing_config], indirect=True)
+def test_server_timing(config, client):
+    """
+    Test the Server-Timing header of a page.
+    """
+    response = client.get(image_url)
+    timing = response.headers['Server-Timing']
+    for name in ('tags', 'manifest', 'render', 'total'):
+        assert f'{name};dur=' in timing
+
+
+@pytest.mark.parametrize('config', [tracing_config], indirect=True)
+def test_debug_trace(config, client):
+    """
+    Test the JSON trace of a request and the trace context header.
+    """
+    trace_id = '0af7651916cd43dd8448eb211c80319c'
+    response = client.get(f'{image_url}?trace', headers={
+        'traceparent': f'00-{trace_id}-b7ad6b7169203331-01'})
+    data = response.json
+
+    spans = data['resourceSpans'][0]['scopeSpans'][0]['spans']
+    root = spans[-1]
+    assert root['name'] == 'GET /_/<path:image>/tags/<tag>'
+    assert root['parentSpanId'] == 'b7ad6b7169203331'
+    assert {x['traceId'] for x in spans} == {trace_id}
+    assert {x['parentSpanId'] for x in spans[:-1]} == {root['spanId']}
+    assert {'tags', 'manifest', 'render'} <= set(span_names(data))
+
+
+@pytest.mark.parametrize('config', [tracing_config], indirect=True)
+def test_trace_export(config, client, tmp_path, monkeypatch):
+    """
+    Test export of traces as OTLP JSON lines.
+    """
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setenv('DRUI_TRACING_PATH', str(path))
+    TRACER.configure(config)
+
+    client.get('/').close()
+    client.get(image_url).close()
+
+    lines = [json.loads(x) for x in path.read_text().splitlines()]
+    assert [span_names(x)[-1] for x in lines] == \
+        ['GET /', 'GET /_/<path:image>/tags/<tag>']